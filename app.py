@@ -39,7 +39,7 @@ def trends():
         cursor = conn.cursor()
         
         viral_trends = cursor.execute(
-            'SELECT id, platform, text, engagement_score, anomaly_score, sentiment_label, sentiment_score FROM trends ORDER BY anomaly_score DESC LIMIT 10'
+            'SELECT id, platform, text, engagement_score, anomaly_score, sentiment_label, sentiment_score, partition_label, trend_id, state, velocity FROM trends_view ORDER BY anomaly_score ASC LIMIT 10'
         ).fetchall()
         
         conn.close()
@@ -56,7 +56,7 @@ def posts():
         cursor = conn.cursor()
         
         posts_list = cursor.execute(
-            'SELECT id, platform, text, engagement_score, sentiment_label, sentiment_score FROM posts_processed ORDER BY engagement_score DESC LIMIT 20'
+            'SELECT id, platform, text, engagement_score, sentiment_label, sentiment_score FROM posts_view ORDER BY engagement_score DESC LIMIT 20'
         ).fetchall()
         
         conn.close()
@@ -5,11 +5,25 @@ Extended version with sentiment analysis, pagination, filtering, and monitoring.
 
 from flask import Flask, jsonify, request, render_template, send_from_directory
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+import hmac
 import sqlite3
 import logging
+import os
+import re
+import threading
 from datetime import datetime
+from config import Config
 from sentiment_analyzer import SentimentAnalyzer
 from export_utils import DataExporter
+from pipeline_daemon import read_pipeline_status
+from nlp_resources import preload
+from vector_index import VectorIndex
+from rollups import query_timeseries
+from trend_lifecycle import TrendTracker
+from sharding import create_global_tables, read_global_view
+from bulk_ingest import BulkIngestor, format_for, open_records
+from topic_model import TopicModeler
 
 # Configure logging
 logging.basicConfig(
@@ -19,26 +33,84 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = Config.INGEST_MAX_BYTES
 CORS(app)  # Enable CORS for all routes
 
-# Initialize components
-sentiment_analyzer = SentimentAnalyzer()
+# Initialize components (the sentiment analyzer and vector index load lazily)
+_sentiment_analyzer = None
+_vector_index = None
 data_exporter = DataExporter()
 
-DATABASE = 'trends.db'
+DATABASE = Config.DATABASE_PATH
+
+# One connection per worker process/thread, opened lazily after any fork
+_db_local = threading.local()
+
+
+def get_sentiment_analyzer():
+    """Return the shared sentiment analyzer, building it on first use."""
+    global _sentiment_analyzer
+    if _sentiment_analyzer is None:
+        _sentiment_analyzer = SentimentAnalyzer()
+    return _sentiment_analyzer
+
+
+def get_vector_index():
+    """Return this worker's vector index, picking up newly written chunks."""
+    global _vector_index
+    if _vector_index is None:
+        _vector_index = VectorIndex()
+    return _vector_index.load()
 
 
 def get_db_connection():
-    """Create database connection."""
+    """Return this worker's database connection, opening it on first use."""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is not None and _db_local.pid == os.getpid():
+        return conn
     try:
         conn = sqlite3.connect(DATABASE)
         conn.row_factory = sqlite3.Row
+        _db_local.conn = conn
+        _db_local.pid = os.getpid()
+        _db_local.has_search = False
         return conn
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         return None
 
 
+def search_available(conn):
+    """Whether the FTS5 index exists; cached per connection once it does."""
+    if not getattr(_db_local, 'has_search', False):
+        _db_local.has_search = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'"
+        ).fetchone() is not None
+    return _db_local.has_search
+
+
+# Quoted phrases, parentheses, or bare terms (optionally prefix*)
+_FTS_TOKEN = re.compile(r'"[^"]*"?|[()]|[^\s()"]+')
+
+
+def fts_query(text):
+    """Rewrite a user query so every bare term is an FTS5 phrase.
+
+    Quoted phrases, AND/OR/NOT, parentheses and trailing-* prefixes keep
+    their meaning; anything else (``foo:bar``, ``^term``, ``{col}``) is
+    searched literally instead of being parsed as a column filter.
+    """
+    parts = []
+    for token in _FTS_TOKEN.findall(text):
+        if token.startswith('"') or token in ('(', ')', 'AND', 'OR', 'NOT'):
+            parts.append(token)
+        elif token.endswith('*') and token.rstrip('*'):
+            parts.append(f'"{token.rstrip("*")}"*')
+        else:
+            parts.append(f'"{token}"')
+    return ' '.join(parts)
+
+
 @app.route('/')
 def index():
     """Serve the dashboard HTML page."""
@@ -50,16 +122,21 @@ def health_check():
     """Health check endpoint for monitoring."""
     try:
         conn = get_db_connection()
+        pipeline = {}
         if conn:
-            conn.close()
+            pipeline = read_pipeline_status(conn)
             status = 'healthy'
         else:
             status = 'degraded'
         
+        if any(stage['status'] in ('error', 'stale') for stage in pipeline.values()):
+            status = 'degraded'
+        
         return jsonify({
             'status': status,
             'timestamp': datetime.now().isoformat(),
-            'version': '2.0.0'
+            'version': '2.0.0',
+            'pipeline': pipeline
         }), 200
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -87,8 +164,9 @@ def get_trends():
         if not conn:
             return jsonify({'error': 'Database connection failed'}), 500
         
-        # Build query
-        query = "SELECT * FROM posts"
+        # Build query; ``content`` keeps the field name the dashboard reads
+        query = ("SELECT id, platform, text AS content, created_at, likes, retweets, score, "
+                 "num_comments, engagement_score, sentiment_label, sentiment_score FROM posts_view")
         conditions = []
         params = []
         
@@ -103,12 +181,13 @@ def get_trends():
         
         # Calculate offset
         offset = (page - 1) * per_page
-        query += f" LIMIT {per_page} OFFSET {offset}"
+        query += " LIMIT ? OFFSET ?"
         
-        cursor = conn.execute(query, params)
+        cursor = conn.execute(query, params + [per_page, offset])
         posts = [dict(row) for row in cursor.fetchall()]
         
         # Add sentiment analysis
+        sentiment_analyzer = get_sentiment_analyzer()
         for post in posts:
             if post.get('content'):
                 sentiment_scores = sentiment_analyzer.analyze_sentiment(post['content'])
@@ -122,12 +201,11 @@ def get_trends():
             posts = [p for p in posts if p.get('sentiment') == sentiment_filter]
         
         # Get total count
-        count_query = "SELECT COUNT(*) as count FROM posts"
+        count_query = "SELECT COUNT(*) as count FROM posts_processed"
         if conditions:
             count_query += " WHERE " + " AND ".join(conditions)
         
         total_count = conn.execute(count_query, params).fetchone()['count']
-        conn.close()
         
         return jsonify({
             'trends': posts,
@@ -144,48 +222,173 @@ def get_trends():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/topics', methods=['GET'])
-def get_topics():
-    """Get discovered topics from LDA analysis."""
+@app.route('/api/trends/<int:trend_id>/similar', methods=['GET'])
+def get_similar_posts(trend_id):
+    """Get posts similar to a viral trend, via the approximate nearest-neighbor index.
+    
+    ``trend_id`` is the lifecycle entity id, as for /history: stable across
+    detection runs, unlike the per-run rows of the trends table.
+    
+    Query params:
+        - k: Number of similar posts (default: 10, max: 100)
+    """
     try:
+        k = min(max(request.args.get('k', 10, type=int), 1), 100)
+        
         conn = get_db_connection()
         if not conn:
             return jsonify({'error': 'Database connection failed'}), 500
         
-        # Get unique topics
-        cursor = conn.execute(
-            "SELECT DISTINCT topic_id, processed_text FROM posts WHERE topic_id IS NOT NULL"
-        )
-        topics_data = cursor.fetchall()
-        conn.close()
-        
-        # Organize topics
-        topics = {}
-        for row in topics_data:
-            topic_id = row['topic_id']
-            if topic_id not in topics:
-                topics[topic_id] = []
-            if row['processed_text']:
-                topics[topic_id].append(row['processed_text'])
-        
-        # Format response
-        topic_list = []
-        for topic_id, texts in topics.items():
-            # Get top keywords (simplified)
-            all_words = ' '.join(texts).split()
-            word_freq = {}
-            for word in all_words:
-                word_freq[word] = word_freq.get(word, 0) + 1
-            
-            top_keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:5]
-            
-            topic_list.append({
-                'topic_id': topic_id,
-                'keywords': [word for word, _ in top_keywords],
-                'post_count': len(texts)
-            })
+        trend = conn.execute(
+            "SELECT id, post_id FROM trend_entities WHERE id = ?", (trend_id,)
+        ).fetchone()
+        if not trend or trend['post_id'] is None:
+            return jsonify({'error': 'Trend not found'}), 404
+        
+        index = get_vector_index()
+        vector = index.vector_for(trend['post_id'])
+        if vector is None:
+            return jsonify({'error': 'Trend post is not indexed yet'}), 404
+        
+        start = datetime.now()
+        neighbors = index.query(vector, k=k, exclude_id=trend['post_id'])
+        took_ms = (datetime.now() - start).total_seconds() * 1000
+        
+        similarity = dict(neighbors)
+        rows = []
+        if neighbors:
+            placeholders = ','.join('?' * len(neighbors))
+            rows = conn.execute(
+                f"SELECT id, platform, text, created_at, engagement_score, sentiment_label "
+                f"FROM posts_view WHERE id IN ({placeholders})",
+                list(similarity)
+            ).fetchall()
+        
+        similar = [dict(row, similarity=similarity[row['id']]) for row in rows]
+        similar.sort(key=lambda post: post['similarity'], reverse=True)
+        
+        return jsonify({
+            'trend_id': trend_id,
+            'post_id': trend['post_id'],
+            'similar': similar,
+            'took_ms': round(took_ms, 3)
+        })
+    
+    except Exception as e:
+        logger.error(f"Error finding similar posts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/trends/<int:trend_id>/history', methods=['GET'])
+def get_trend_history(trend_id):
+    """Get a tracked trend's lifecycle state and its per-run history.
+    
+    ``trend_id`` is the lifecycle entity id (``trend_id`` in trends_view),
+    which stays the same across detection runs.
+    
+    Query params:
+        - limit: Most recent runs returned (default: 500, max: 5000)
+    """
+    try:
+        limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Database connection failed'}), 500
+        
+        trend = TrendTracker(conn).history(trend_id, limit=limit)
+        if trend is None:
+            return jsonify({'error': 'Trend not found'}), 404
+        return jsonify(trend)
+    
+    except Exception as e:
+        logger.error(f"Error fetching trend history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/global', methods=['GET'])
+def get_global_view():
+    """Get the merged view of sharded processing (see sharding.py).
+    
+    Query params:
+        - limit: Top terms and trends returned (default: 10, max: 100)
+    """
+    try:
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
         
-        return jsonify({'topics': topic_list})
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Database connection failed'}), 500
+        
+        return jsonify(read_global_view(conn, limit))
+    
+    except Exception as e:
+        logger.error(f"Error fetching global view: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/timeseries', methods=['GET'])
+def get_timeseries():
+    """Get pre-aggregated post counts, engagement and sentiment over time.
+    
+    Query params:
+        - granularity: minute, hour or day (default: hour)
+        - platform: Filter by platform (twitter/reddit)
+        - since / until: ISO timestamps bounding the range
+        - limit: Maximum buckets returned (default: 500, max: 5000)
+        - scope: local (this database's posts, default) or global (the
+          last shard merge, including this database's posts)
+    """
+    try:
+        granularity = request.args.get('granularity', 'hour')
+        scope = request.args.get('scope', 'local')
+        if scope not in ('local', 'global'):
+            return jsonify({'error': 'scope must be local or global'}), 400
+        limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Database connection failed'}), 500
+        
+        if scope == 'global':
+            create_global_tables(conn.cursor())
+        try:
+            series = query_timeseries(
+                conn, granularity,
+                platform=request.args.get('platform', None),
+                since=request.args.get('since', None),
+                until=request.args.get('until', None),
+                limit=limit,
+                prefix='global_rollup' if scope == 'global' else 'rollup'
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'granularity': granularity,
+            'scope': scope,
+            'series': series,
+            'count': len(series)
+        })
+    
+    except Exception as e:
+        logger.error(f"Error fetching timeseries: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/topics', methods=['GET'])
+def get_topics():
+    """Get the topics of the last trained LDA model (see topic_model.py)."""
+    try:
+        saved = TopicModeler().load_topics()
+        if saved is None:
+            return jsonify({'topics': [], 'num_topics': 0})
+        
+        topics = [
+            dict(topic, keywords=[entry['term'] for entry in topic['terms'][:5]])
+            for topic in saved['topics']
+        ]
+        return jsonify(dict(saved, topics=topics))
     
     except Exception as e:
         logger.error(f"Error fetching topics: {e}")
@@ -201,11 +404,13 @@ def get_anomalies():
             return jsonify({'error': 'Database connection failed'}), 500
         
         cursor = conn.execute(
-            "SELECT * FROM posts WHERE is_anomaly = 1 ORDER BY engagement_score DESC"
+            "SELECT post_id AS id, trend_id, platform, text AS content, engagement_score, anomaly_score, "
+            "partition_label, state, velocity FROM trends_view ORDER BY engagement_score DESC"
         )
         anomalies = [dict(row) for row in cursor.fetchall()]
         
         # Add sentiment analysis
+        sentiment_analyzer = get_sentiment_analyzer()
         for anomaly in anomalies:
             if anomaly.get('content'):
                 sentiment_scores = sentiment_analyzer.analyze_sentiment(anomaly['content'])
@@ -213,8 +418,6 @@ def get_anomalies():
                     sentiment_scores['compound']
                 )
         
-        conn.close()
-        
         return jsonify({
             'anomalies': anomalies,
             'count': len(anomalies)
@@ -233,14 +436,14 @@ def get_sentiment_stats():
         if not conn:
             return jsonify({'error': 'Database connection failed'}), 500
         
-        cursor = conn.execute("SELECT content FROM posts WHERE content IS NOT NULL")
-        texts = [row['content'] for row in cursor.fetchall()]
-        conn.close()
+        cursor = conn.execute("SELECT text FROM posts_view WHERE text IS NOT NULL")
+        texts = [row['text'] for row in cursor.fetchall()]
         
         if not texts:
             return jsonify({'error': 'No data available'}), 404
         
         # Get emotion statistics
+        sentiment_analyzer = get_sentiment_analyzer()
         stats = sentiment_analyzer.get_emotion_stats(texts)
         avg_sentiment = sentiment_analyzer.get_average_sentiment(texts)
         
@@ -255,6 +458,140 @@ def get_sentiment_stats():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/search', methods=['GET'])
+def search_posts():
+    """Full-text search over processed posts, ranked by BM25.
+    
+    Query params:
+        - q: Terms, "quoted phrases", AND/OR/NOT, parentheses and
+          prefix* terms, e.g. 'python AND release' or '"new model"' (required)
+        - platform: Filter by platform (twitter/reddit)
+        - since / until: ISO timestamps bounding created_at
+        - limit: Results per page (default: 20, max: 100)
+        - cursor: next_cursor from the previous page
+    """
+    try:
+        query_text = request.args.get('q', '').strip()
+        if not query_text:
+            return jsonify({'error': 'Missing query parameter q'}), 400
+        
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        platform = request.args.get('platform', None)
+        since = request.args.get('since', None)
+        until = request.args.get('until', None)
+        cursor_token = request.args.get('cursor', None)
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Database connection failed'}), 500
+        
+        # Checked apart from the query, so any MATCH error below is the user's
+        if not search_available(conn):
+            return jsonify({'error': 'Full-text search is unavailable (SQLite without FTS5)'}), 503
+        
+        conditions = ["posts_fts MATCH ?"]
+        params = [fts_query(query_text)]
+        
+        if platform:
+            conditions.append("p.platform = ?")
+            params.append(platform)
+        if since:
+            conditions.append("p.created_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("p.created_at < ?")
+            params.append(until)
+        
+        # Keyset pagination on (rank, id): no OFFSET scan on deep pages
+        if cursor_token:
+            try:
+                last_rank, last_id = cursor_token.rsplit(':', 1)
+                params.extend([float(last_rank), int(last_id)])
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            conditions.append("(posts_fts.rank, p.id) > (?, ?)")
+        
+        query = (
+            "SELECT p.id, p.platform, p.text, p.created_at, p.engagement_score, "
+            "p.sentiment_label, p.sentiment_score, posts_fts.rank AS rank "
+            "FROM posts_fts JOIN posts_view p ON p.id = posts_fts.rowid "
+            "WHERE " + " AND ".join(conditions) +
+            " ORDER BY posts_fts.rank, p.id LIMIT ?"
+        )
+        params.append(limit)
+        
+        try:
+            results = [dict(row) for row in conn.execute(query, params).fetchall()]
+        except sqlite3.OperationalError as e:
+            # The index exists, so this is a malformed MATCH expression
+            return jsonify({'error': f'Invalid search query: {e}'}), 400
+        
+        next_cursor = None
+        if len(results) == limit:
+            last = results[-1]
+            next_cursor = f"{last['rank']!r}:{last['id']}"
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'next_cursor': next_cursor
+        })
+    
+    except Exception as e:
+        logger.error(f"Error searching posts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_posts():
+    """Bulk-load posts from the request body into posts_raw (see bulk_ingest.py).
+    
+    Requires ``Authorization: Bearer <INGEST_API_TOKEN>``; without a
+    configured token the endpoint is disabled. The body is streamed, up to
+    INGEST_MAX_BYTES, in transactions of INGEST_TRANSACTION_ROWS. Format
+    follows the Content-Type: JSONL (application/x-ndjson) and CSV
+    (text/csv) are parsed incrementally; JSON (one object or a list) is
+    parsed whole. Gzipped bodies are detected; a corrupt one is a 400.
+    
+    Query params:
+        - platform: Platform for records without one
+        - strict: 1 to stop at the first invalid record
+    """
+    if not Config.INGEST_API_TOKEN:
+        return jsonify({'error': 'Ingestion is disabled (INGEST_API_TOKEN is not set)'}), 403
+    # Compared as bytes: compare_digest rejects non-ASCII str with TypeError
+    supplied = request.headers.get('Authorization', '').encode('utf-8')
+    if not hmac.compare_digest(supplied, f'Bearer {Config.INGEST_API_TOKEN}'.encode('utf-8')):
+        return jsonify({'error': 'Invalid or missing ingest token'}), 401
+    
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Database connection failed'}), 500
+        
+        stats = {}
+        try:
+            BulkIngestor(conn).load(
+                open_records(request.stream, format_for(mimetype=request.mimetype)),
+                default_platform=request.args.get('platform', None),
+                strict=request.args.get('strict', '0') == '1',
+                transaction_rows=Config.INGEST_TRANSACTION_ROWS,
+                stats=stats
+            )
+        except ValueError as e:
+            # Transactions committed before the failure stay committed
+            return jsonify({'error': str(e), 'inserted': stats.get('inserted', 0),
+                            'run_ids': stats.get('run_ids', [])}), 400
+        
+        return jsonify(stats)
+    
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Request body exceeds {Config.INGEST_MAX_BYTES} bytes'}), 413
+    except Exception as e:
+        logger.error(f"Error ingesting posts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/export', methods=['GET'])
 def export_data():
     """Export trend data in specified format.
@@ -269,9 +606,8 @@ def export_data():
         if not conn:
             return jsonify({'error': 'Database connection failed'}), 500
         
-        cursor = conn.execute("SELECT * FROM posts")
+        cursor = conn.execute("SELECT * FROM posts_view")
         trends = [dict(row) for row in cursor.fetchall()]
-        conn.close()
         
         if format_type == 'json':
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -316,5 +652,8 @@ def internal_error(error):
 
 if __name__ == '__main__':
     logger.info("Starting Enhanced Social Trend Detector API...")
+    if os.getenv('PRELOAD_MODELS', '0') == '1':
+        preload()
+        get_sentiment_analyzer()
     logger.info("Dashboard available at: http://localhost:5000")
     app.run(host='0.0.0.0', port=5000, debug=False)
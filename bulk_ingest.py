@@ -0,0 +1,320 @@
+"""Bulk Ingestion for Social Trend Detector
+
+Loads external feeds into ``posts_raw``. Input is JSONL, CSV or JSON,
+optionally gzipped. It can come from files, stdin or a streamed request
+body (``POST /api/ingest``). JSONL and CSV records are parsed one at a
+time; a JSON document is parsed whole with ``json.load``, so it is held in
+memory and large feeds should be sent as JSONL. Records are validated and
+mapped to the posts_raw columns. They are inserted through one
+prepared statement, in transactions of ``Config.BULK_TRANSACTION_ROWS``
+rows. Each transaction is an 'ingest' ledger run, so processing picks the
+rows up like any other ingest.
+
+Record fields (JSON keys or CSV headers):
+
+- ``text`` (required; also read from ``content`` or ``data``)
+- ``platform`` (also read from ``source``; otherwise the default platform)
+- ``created_at``: ISO 8601 or Unix seconds (default: ingest time)
+- ``likes``, ``retweets``, ``score``, ``num_comments`` (or ``comments``):
+  non-negative integers (default: 0)
+
+Invalid records are skipped and reported, unless the load is strict.
+
+Run with: python bulk_ingest.py posts.jsonl.gz [more files, or - for stdin] [--platform twitter]
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, IO, Iterable, Iterator, Optional, Tuple
+
+from config import Config
+from ingestor import create_tables
+from profiling import profile_stage
+from run_ledger import RunLedger
+
+FORMATS = ('auto', 'jsonl', 'csv', 'json')
+
+FORMATS_BY_MIMETYPE = {
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json': 'json',
+    'text/csv': 'csv',
+}
+
+FIELD_ALIASES = {
+    'text': ('content', 'data'),
+    'platform': ('source',),
+    'num_comments': ('comments',),
+}
+
+INSERT_SQL = '''INSERT INTO posts_raw
+    (platform, text, created_at, timestamp, likes, retweets, score, num_comments, processed)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)'''
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class _ReadAdapter(io.RawIOBase):
+    """Raw stream over anything with read(n), so it can be buffered and peeked."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def format_for(name: Optional[str] = None, mimetype: Optional[str] = None) -> str:
+    """Input format from a file name (``.jsonl``, ``.csv.gz``, ...) or a MIME type."""
+    if mimetype:
+        return FORMATS_BY_MIMETYPE.get(mimetype, 'auto')
+    name = (name or '').lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for extension, fmt in (('.jsonl', 'jsonl'), ('.ndjson', 'jsonl'), ('.csv', 'csv'), ('.json', 'json')):
+        if name.endswith(extension):
+            return fmt
+    return 'auto'
+
+
+def open_records(stream: IO[bytes], fmt: str = 'auto') -> Iterator[Tuple[int, object]]:
+    """Parse records from a binary stream, gunzipping if needed.
+
+    JSONL and CSV are parsed incrementally. JSON is read whole by
+    ``json.load`` before the first record is yielded.
+
+    Args:
+        stream: Binary file, stdin buffer or request stream
+        fmt: jsonl, csv, json (one object or a list) or auto (sniffed)
+
+    Yields:
+        (line number, record) pairs; a JSONL line that does not parse is
+        yielded as its ValueError so the loader can report and skip it
+
+    Raises:
+        ValueError: For an unknown format, undecodable or truncated/corrupt
+            gzip input, or malformed CSV/JSON
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (expected one of {', '.join(FORMATS)})")
+    try:
+        yield from _parse_records(stream, fmt)
+    except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+        raise ValueError(f"corrupt gzip input: {e}") from e
+
+
+def _parse_records(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(_ReadAdapter(stream))
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = io.BufferedReader(gzip.GzipFile(fileobj=stream, mode='rb'))
+    if fmt == 'auto':
+        start = stream.peek(64).lstrip()[:1]
+        fmt = {b'{': 'jsonl', b'[': 'json'}.get(start, 'csv')
+
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'json':
+        data = json.load(text)
+        yield from enumerate(data if isinstance(data, list) else [data], 1)
+    elif fmt == 'jsonl':
+        for number, line in enumerate(text, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, e
+    else:
+        reader = csv.DictReader(text)
+        try:
+            for record in reader:
+                yield reader.line_num, record
+        except csv.Error as e:
+            raise ValueError(f"line {reader.line_num}: {e}") from e
+
+
+def _field(record: Dict, name: str):
+    value = record.get(name)
+    if value is None or value == '':
+        for alias in FIELD_ALIASES.get(name, ()):
+            value = record.get(alias)
+            if value is not None and value != '':
+                break
+    return value
+
+
+def _count(record: Dict, name: str) -> int:
+    value = _field(record, name)
+    # Fast paths for the common JSON int and CSV digit-string cases
+    if type(value) is int and value >= 0:
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    if value is None or value == '':
+        return 0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} is not a number: {value!r}")
+    if number < 0 or not number.is_integer():
+        raise ValueError(f"{name} must be a non-negative integer: {value!r}")
+    return int(number)
+
+
+def _timestamp(value, default: str) -> str:
+    """ISO 8601 or Unix seconds -> naive local ISO timestamp, like datetime.now()."""
+    if value is None or value == '':
+        return default
+    try:
+        if isinstance(value, str):
+            try:
+                moment = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+            except ValueError:
+                moment = datetime.fromtimestamp(float(value))
+        else:
+            moment = datetime.fromtimestamp(float(value))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError(f"created_at is not ISO 8601 or Unix seconds: {value!r}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+
+def to_row(record, default_platform: Optional[str] = None, ingested_at: str = None) -> Tuple:
+    """Validate one record and map it to an INSERT_SQL parameter tuple.
+
+    Raises:
+        ValueError: If the record is not an object or a field is missing/invalid
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"record is not an object: {type(record).__name__}")
+    ingested_at = ingested_at or datetime.now().isoformat()
+    text = _field(record, 'text')
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("missing text")
+    platform = _field(record, 'platform') or default_platform
+    if not platform:
+        raise ValueError("missing platform")
+    return (str(platform).strip().lower(), text, _timestamp(_field(record, 'created_at'), ingested_at),
+            ingested_at, _count(record, 'likes'), _count(record, 'retweets'), _count(record, 'score'),
+            _count(record, 'num_comments'))
+
+
+class BulkIngestor:
+    """Loads parsed records into posts_raw in large ledger-recorded transactions."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.ledger = RunLedger(conn)
+
+    def _rows(self, records: Iterable[Tuple[int, object]], default_platform: Optional[str],
+              ingested_at: str, stats: Dict, strict: bool) -> Iterator[Tuple]:
+        for number, record in records:
+            stats['read'] += 1
+            try:
+                if isinstance(record, Exception):
+                    raise ValueError(f"invalid JSON: {record}")
+                yield to_row(record, default_platform, ingested_at)
+            except ValueError as e:
+                if strict:
+                    raise ValueError(f"line {number}: {e}") from e
+                stats['rejected'] += 1
+                if len(stats['errors']) < Config.BULK_MAX_ERRORS:
+                    stats['errors'].append({'line': number, 'error': str(e)})
+
+    @profile_stage('ingest')
+    def load(self, records: Iterable[Tuple[int, object]], default_platform: Optional[str] = None,
+             strict: bool = False, transaction_rows: Optional[int] = None,
+             stats: Optional[Dict] = None) -> Dict:
+        """Insert records from open_records() into posts_raw.
+
+        Each transaction of up to ``transaction_rows`` rows is one 'ingest'
+        ledger run; transactions committed before a failure stay committed.
+        Pass ``stats`` to see their counts and run ids after a failure.
+
+        Args:
+            records: (line number, record) pairs
+            default_platform: Platform for records without one
+            strict: Abort on the first invalid record instead of skipping it
+            transaction_rows: Rows per transaction (default: ``Config.BULK_TRANSACTION_ROWS``)
+            stats: Dictionary to fill in place of a new one
+
+        Returns:
+            Dictionary with read/inserted/rejected counts, the first
+            ``Config.BULK_MAX_ERRORS`` errors, ledger run ids and rows/sec
+
+        Raises:
+            ValueError: Malformed input, or an invalid record when strict
+        """
+        transaction_rows = transaction_rows or Config.BULK_TRANSACTION_ROWS
+        stats = stats if stats is not None else {}
+        stats.update(read=0, inserted=0, rejected=0, errors=[], run_ids=[])
+        rows = self._rows(records, default_platform, datetime.now().isoformat(), stats, strict)
+        cursor = self.conn.cursor()
+        started = time.perf_counter()
+
+        while True:
+            read_before = stats['read']
+            first = next(rows, None)
+            if first is None:
+                break
+            with self.ledger.run('ingest') as run:
+                cursor.executemany(
+                    INSERT_SQL,
+                    itertools.chain([first], itertools.islice(rows, transaction_rows - 1))
+                )
+                run.input_count = stats['read'] - read_before
+                run.output_count = cursor.rowcount
+                run.watermark_end = cursor.execute('SELECT MAX(id) FROM posts_raw').fetchone()[0]
+            stats['inserted'] += run.output_count
+            stats['run_ids'].append(run.id)
+
+        stats['seconds'] = round(time.perf_counter() - started, 6)
+        stats['rows_per_sec'] = round(stats['inserted'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+        return stats
+
+    def load_file(self, path: str, fmt: str = None, **options) -> Dict:
+        """Load one file ('-' for stdin); the format defaults to the file extension."""
+        fmt = fmt or format_for(path)
+        if path == '-':
+            return self.load(open_records(sys.stdin.buffer, fmt), **options)
+        with open(path, 'rb') as f:
+            return self.load(open_records(f, fmt), **options)
+
+
+def print_stats(label: str, stats: Dict):
+    print(f"📥 {label}: {stats['inserted']} posts loaded, {stats['rejected']} rejected "
+          f"in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/s)")
+    for error in stats['errors'][:10]:
+        print(f"   ⚠️ line {error['line']}: {error['error']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-load JSONL/CSV/JSON (optionally gzipped) posts into posts_raw')
+    parser.add_argument('paths', nargs='+', help="Input files, or - for stdin")
+    parser.add_argument('--db', default=None, help='Database path (default: DATABASE_PATH)')
+    parser.add_argument('--format', choices=FORMATS, default=None, help='Input format (default: from the extension)')
+    parser.add_argument('--platform', default=None, help='Platform for records without one')
+    parser.add_argument('--strict', action='store_true', help='Stop at the first invalid record')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db or Config.DATABASE_PATH)
+    create_tables(conn)
+    ingestor = BulkIngestor(conn)
+    for path in args.paths:
+        print_stats(path, ingestor.load_file(path, args.format, default_platform=args.platform,
+                                             strict=args.strict))
+    conn.close()
@@ -10,3 +10,96 @@ class Config:
     REDDIT_AGENT = 'TrendDetector/1.0'
     
     KEYWORDS = ['AI', 'ML', 'data science', 'python', 'tech']
+
+    DATABASE_PATH = os.getenv('DATABASE_PATH', 'trends.db')
+
+    # Bulk ingestion (bulk_ingest.py): rows per transaction, errors reported
+    BULK_TRANSACTION_ROWS = int(os.getenv('BULK_TRANSACTION_ROWS', '100000'))
+    BULK_MAX_ERRORS = int(os.getenv('BULK_MAX_ERRORS', '100'))
+    # POST /api/ingest: bearer token (unset = endpoint disabled), body cap, rows per transaction
+    INGEST_API_TOKEN = os.getenv('INGEST_API_TOKEN')
+    INGEST_MAX_BYTES = int(os.getenv('INGEST_MAX_BYTES', str(64 * 1024 * 1024)))
+    INGEST_TRANSACTION_ROWS = int(os.getenv('INGEST_TRANSACTION_ROWS', '5000'))
+
+    # Pipeline daemon: seconds between stage runs and rows per batch
+    INGEST_INTERVAL = float(os.getenv('INGEST_INTERVAL', '60'))
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '50'))
+    PROCESS_INTERVAL = float(os.getenv('PROCESS_INTERVAL', '30'))
+    PROCESS_BATCH_SIZE = int(os.getenv('PROCESS_BATCH_SIZE', '500'))
+    DETECT_INTERVAL = float(os.getenv('DETECT_INTERVAL', '300'))
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '10'))
+    # Generate mock posts in the daemon's ingest stage (leave off when real feeds or bulk ingest supply posts)
+    MOCK_INGEST = os.getenv('MOCK_INGEST', '0') == '1'
+    # Milliseconds a stage connection waits for another writer's lock before failing
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+
+    # Near-duplicate clustering before text processing
+    DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', '1') == '1'
+    DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.7'))
+    DEDUP_NUM_PERM = int(os.getenv('DEDUP_NUM_PERM', '64'))
+    DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', '16'))
+
+    # Sentiment engine shared by processing and the API: vader, textblob or lexicon
+    SENTIMENT_BACKEND = os.getenv('SENTIMENT_BACKEND', 'vader')
+
+    # Multivariate anomaly model
+    ANOMALY_MODEL_PATH = os.getenv('ANOMALY_MODEL_PATH', 'models/anomaly_model.joblib')
+    ANOMALY_N_JOBS = int(os.getenv('ANOMALY_N_JOBS', '-1'))
+    ANOMALY_BATCH_SIZE = int(os.getenv('ANOMALY_BATCH_SIZE', '100000'))
+    # Refit a partition's model once it is this old (hours) or its row count has grown this
+    # many times since the fit (0 disables either check); other runs only score changed rows
+    ANOMALY_REFIT_HOURS = float(os.getenv('ANOMALY_REFIT_HOURS', '24'))
+    ANOMALY_REFIT_GROWTH = float(os.getenv('ANOMALY_REFIT_GROWTH', '2'))
+
+    # Partitioned detection: one model per platform/keyword segment
+    DETECT_WORKERS = int(os.getenv('DETECT_WORKERS', str(os.cpu_count() or 1)))
+    PARTITION_MIN_ROWS = int(os.getenv('PARTITION_MIN_ROWS', '5'))
+
+    # Trend lifecycle: consecutive missed detection runs before a trend expires
+    TREND_EXPIRY_RUNS = int(os.getenv('TREND_EXPIRY_RUNS', '3'))
+
+    # Sharded processing: raw posts hashed across SHARD_COUNT shard workspaces
+    SHARD_COUNT = int(os.getenv('SHARD_COUNT', '4'))
+    SHARD_DIR = os.getenv('SHARD_DIR', 'shards')
+    SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', str(os.cpu_count() or 1)))
+    SHARD_CANDIDATES = int(os.getenv('SHARD_CANDIDATES', '100'))
+
+    # Opt-in stage profiling: cpu, memory or cpu,memory (unset = off)
+    PROFILE = os.getenv('PROFILE', '')
+    PROFILE_MODES = frozenset()  # parsed from PROFILE by profiling.configure() at import
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_TOP = int(os.getenv('PROFILE_TOP', '10'))
+    PROFILE_FRAMES = int(os.getenv('PROFILE_FRAMES', '1'))
+
+    # Topic model: topic count chosen by a coherence sweep, trained with LdaMulticore
+    LDA_MODEL_DIR = os.getenv('LDA_MODEL_DIR', 'models/lda')
+    LDA_TOPIC_CANDIDATES = [int(k) for k in os.getenv('LDA_TOPIC_CANDIDATES', '3,5,8,12').split(',')]
+    LDA_WORKERS = int(os.getenv('LDA_WORKERS', str(max((os.cpu_count() or 1) - 1, 1))))
+    LDA_SWEEP_WORKERS = int(os.getenv('LDA_SWEEP_WORKERS', str(max(LDA_WORKERS // 2, 1))))
+    LDA_PASSES = int(os.getenv('LDA_PASSES', '5'))
+    LDA_CHUNKSIZE = int(os.getenv('LDA_CHUNKSIZE', '2000'))
+    LDA_TOP_TERMS = int(os.getenv('LDA_TOP_TERMS', '10'))
+    # The daemon retrains topics once the saved model is this old or the corpus has grown this much
+    LDA_RETRAIN_HOURS = float(os.getenv('LDA_RETRAIN_HOURS', '6'))
+    LDA_RETRAIN_GROWTH = float(os.getenv('LDA_RETRAIN_GROWTH', '1.5'))
+
+    # Shared hashed document-term matrix
+    DOC_MATRIX_DIR = os.getenv('DOC_MATRIX_DIR', 'models/doc_matrix')
+    DOC_MATRIX_FEATURES = int(os.getenv('DOC_MATRIX_FEATURES', str(2 ** 18)))
+    DOC_MATRIX_MAX_SEGMENTS = int(os.getenv('DOC_MATRIX_MAX_SEGMENTS', '16'))
+
+    # Approximate nearest-neighbour index over post embeddings
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', 'models/vector_index')
+    VECTOR_DIM = int(os.getenv('VECTOR_DIM', '128'))
+    VECTOR_TABLES = int(os.getenv('VECTOR_TABLES', '16'))
+    VECTOR_BITS = int(os.getenv('VECTOR_BITS', '12'))
+    VECTOR_INDEX_MAX_CHUNKS = int(os.getenv('VECTOR_INDEX_MAX_CHUNKS', '16'))
+
+    # Retention: days kept in the hot tables (0 = forever), then archived
+    RETENTION_POSTS_RAW_DAYS = int(os.getenv('RETENTION_POSTS_RAW_DAYS', '7'))
+    RETENTION_POSTS_PROCESSED_DAYS = int(os.getenv('RETENTION_POSTS_PROCESSED_DAYS', '30'))
+    RETENTION_RUNS_DAYS = int(os.getenv('RETENTION_RUNS_DAYS', '30'))
+    RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', '3600'))
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '10000'))
+    RETENTION_VACUUM_PAGES = int(os.getenv('RETENTION_VACUUM_PAGES', '0'))
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
@@ -0,0 +1,360 @@
+"""Shared Sparse Document-Term Matrix for Social Trend Detector
+
+Processed posts are hashed into a scipy CSR matrix once, by the processing
+stage, and appended to disk as uncompressed ``.npz`` segments. Consumers
+(LDA, keyword extraction, similarity) memory-map the segments instead of
+re-tokenizing cleaned text. A HashingVectorizer means no fitted
+vocabulary is needed, and segments store none: feature ids are turned
+back into words for display through the shared ``vocabulary`` table.
+
+Every processed batch adds a segment, so ``sync`` compacts the newest
+segments into one once there are more than ``DOC_MATRIX_MAX_SEGMENTS``.
+A merged segment replaces the oldest segment it absorbed, and readers
+skip ids they have already yielded, so a read that overlaps a compaction
+still sees every document exactly once. Retention drops archived
+documents the same way, rewriting only the segments that held them.
+Writers (sync, compact, prune) serialize on a lock file in the directory.
+"""
+
+import glob
+import mmap
+import os
+import struct
+import zipfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from config import Config
+from vocabulary import Vocabulary
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in separate processes are not serialized
+    fcntl = None
+
+_ZIP_LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+
+
+def _mmap_npz(path: str) -> Dict:
+    """Map the arrays of an uncompressed .npz file without copying them."""
+    import numpy as np
+
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+            header = _ZIP_LOCAL_HEADER.unpack_from(buffer, info.header_offset)
+            start = info.header_offset + _ZIP_LOCAL_HEADER.size + header[9] + header[10]
+
+            # Parse the .npy header that precedes the raw array bytes
+            member = memoryview(buffer)[start:start + info.file_size]
+            stream = _BufferReader(member)
+            version = np.lib.format.read_magic(stream)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(stream)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(stream)
+            count = int(np.prod(shape)) if shape else 1
+            array = np.frombuffer(buffer, dtype=dtype, count=count,
+                                  offset=start + stream.position)
+            arrays[info.filename[:-4]] = array.reshape(shape, order='F' if fortran else 'C')
+    return arrays
+
+
+@contextmanager
+def directory_lock(directory: str):
+    """Hold an exclusive lock on a directory's ``.lock`` file for the block.
+
+    Not reentrant: each writer takes it once, at its outermost call.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def tiered_merge_start(sizes: Sequence[int]) -> int:
+    """First of the newest files to merge, given the row count of each file.
+
+    Always merges the last two, then pulls in older files while they are
+    smaller than the rows merged so far.
+    """
+    start, total = len(sizes) - 2, sizes[-1] + sizes[-2]
+    while start > 0 and sizes[start - 1] < total:
+        start -= 1
+        total += sizes[start]
+    return start
+
+
+def survivors_between(keep_ids, low: int, high: int):
+    """Slice of the sorted ``keep_ids`` between ``low`` and ``high`` inclusive."""
+    import numpy as np
+
+    start, end = np.searchsorted(keep_ids, [low, high + 1])
+    return keep_ids[start:end]
+
+
+class _BufferReader:
+    """Minimal file-like reader over a memoryview, for numpy header parsing."""
+
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def read(self, size):
+        data = bytes(self.view[self.position:self.position + size])
+        self.position += len(data)
+        return data
+
+
+class DocumentMatrix:
+    """Append-only, segmented document-term matrix of processed posts."""
+
+    def __init__(self, directory: str = None, n_features: int = None):
+        self.directory = directory or Config.DOC_MATRIX_DIR
+        self.n_features = n_features or Config.DOC_MATRIX_FEATURES
+        self._vectorizer = None
+        # feature_terms cache: hashed column -> term, up to vocabulary id _terms_seen
+        self._feature_terms: Dict[int, str] = {}
+        self._terms_seen = 0
+
+    @property
+    def vectorizer(self):
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            # cleaned_text is already lowercased, lemmatized and space separated
+            self._vectorizer = HashingVectorizer(
+                n_features=self.n_features, token_pattern=r'\S+', lowercase=False,
+                alternate_sign=False, norm=None, dtype='float32'
+            )
+        return self._vectorizer
+
+    def segment_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, 'segment_*.npz')))
+
+    def max_doc_id(self) -> int:
+        """Highest post id already stored (the append watermark)."""
+        paths = self.segment_paths()
+        if not paths:
+            return 0
+        ids = _mmap_npz(paths[-1])['ids']
+        return int(ids.max()) if len(ids) else 0
+
+    def append(self, doc_ids: Sequence[int], texts: Sequence[str]) -> str:
+        """Hash a batch of cleaned texts and write it as a new segment.
+
+        Args:
+            doc_ids: posts_processed ids, increasing
+            texts: Matching cleaned_text values
+
+        Returns:
+            Path of the written segment, or None for an empty batch
+        """
+        import numpy as np
+
+        if not doc_ids:
+            return None
+        texts = [text or '' for text in texts]
+        matrix = self.vectorizer.transform(texts).tocsr()
+        return self._write_segment(np.asarray(doc_ids, dtype=np.int64), matrix)
+
+    def _write_segment(self, ids, matrix) -> str:
+        """Atomically write (or replace) the segment named after its first id."""
+        import numpy as np
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'segment_{int(ids[0]):012d}.npz')
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            # Uncompressed on purpose: stored zip members can be memory-mapped
+            np.savez(f, ids=ids, data=matrix.data, indices=matrix.indices.astype(np.int32),
+                     indptr=matrix.indptr.astype(np.int64))
+        os.replace(temp_path, path)
+        return path
+
+    def compact(self, max_segments: int = None) -> int:
+        with directory_lock(self.directory):
+            return self._compact(max_segments)
+
+    def _compact(self, max_segments: int = None) -> int:
+        """Merge the newest segments into one when there are too many.
+
+        Merging is size-tiered (see tiered_merge_start), so a document is
+        rewritten O(log n) times rather than on every compaction.
+
+        Args:
+            max_segments: Segment count that triggers a merge
+                (default: Config.DOC_MATRIX_MAX_SEGMENTS)
+
+        Returns:
+            Number of segments merged away
+        """
+        import numpy as np
+        from scipy.sparse import vstack
+
+        paths = self.segment_paths()
+        if len(paths) <= (max_segments or Config.DOC_MATRIX_MAX_SEGMENTS):
+            return 0
+        start = tiered_merge_start([len(_mmap_npz(path)['ids']) for path in paths])
+        segments = [(_mmap_npz(path), path) for path in paths[start:]]
+        ids = np.concatenate([arrays['ids'] for arrays, _ in segments])
+        matrix = vstack([self._csr(arrays) for arrays, _ in segments], format='csr')
+        # Replaces the first merged segment in place, then drops the rest
+        self._write_segment(ids, matrix)
+        for _, path in segments[1:]:
+            os.remove(path)
+        return len(segments) - 1
+
+    def prune(self, keep_ids, up_to: int) -> int:
+        """Drop documents with ids up to ``up_to`` that are not in ``keep_ids``.
+
+        Segments with no survivors are deleted; any other segment that lost
+        documents is rewritten under its new first id before the old one
+        is removed. Ids above ``up_to`` were added after the caller read
+        ``keep_ids`` and are always kept.
+
+        Args:
+            keep_ids: Sorted ids of posts still in the database
+            up_to: Highest id ``keep_ids`` accounts for
+
+        Returns:
+            Number of documents dropped
+        """
+        import numpy as np
+
+        keep_ids = np.asarray(keep_ids, dtype=np.int64)
+        dropped = 0
+        with directory_lock(self.directory):
+            for path in self.segment_paths():
+                arrays = _mmap_npz(path)
+                ids = arrays['ids']
+                if not len(ids) or ids[0] > up_to:
+                    break
+                keep = (ids > up_to) | np.isin(ids, survivors_between(keep_ids, ids[0], ids[-1]))
+                if keep.all():
+                    continue
+                written = None
+                if keep.any():
+                    written = self._write_segment(ids[keep].copy(), self._csr(arrays)[keep])
+                if written != path:
+                    os.remove(path)
+                dropped += int((~keep).sum())
+        return dropped
+
+    def sync(self, conn) -> int:
+        """Append every processed post newer than the stored watermark.
+
+        Idempotent, so it also backfills after a crash between the
+        database commit and the segment write. Compacts afterwards.
+
+        Returns:
+            Number of documents appended
+        """
+        with directory_lock(self.directory):
+            rows = conn.execute(
+                'SELECT id, tokens, cleaned_text FROM posts_processed WHERE id > ? ORDER BY id',
+                (self.max_doc_id(),)
+            ).fetchall()
+            if rows:
+                vocabulary = Vocabulary(conn)
+                # Legacy rows kept cleaned_text as a string instead of token ids
+                self.append([row[0] for row in rows],
+                            [vocabulary.decode(tokens) if tokens is not None else cleaned_text
+                             for _, tokens, cleaned_text in rows])
+                self._compact()
+        return len(rows)
+
+    def _csr(self, arrays):
+        from scipy.sparse import csr_matrix
+
+        shape = (len(arrays['ids']), self.n_features)
+        return csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False)
+
+    def iter_segments(self) -> Iterator[Tuple]:
+        """Yield (ids, csr_matrix) per segment, backed by memory-mapped arrays."""
+        watermark = 0
+        paths = self.segment_paths()
+        while paths:
+            path = paths.pop(0)
+            try:
+                arrays = _mmap_npz(path)
+            except FileNotFoundError:
+                # Merged away by compact(); its rows moved into an earlier segment
+                paths = self.segment_paths()
+                continue
+            ids = arrays['ids']
+            if not len(ids) or ids[-1] <= watermark:
+                continue
+            matrix = self._csr(arrays)
+            if ids[0] <= watermark:
+                fresh = ids > watermark
+                ids, matrix = ids[fresh], matrix[fresh]
+            watermark = int(ids[-1])
+            yield ids, matrix
+
+    def load(self) -> Tuple:
+        """All documents as (ids, csr_matrix)."""
+        import numpy as np
+        from scipy.sparse import csr_matrix, vstack
+
+        segments = list(self.iter_segments())
+        if not segments:
+            return np.empty(0, dtype=np.int64), csr_matrix((0, self.n_features), dtype=np.float32)
+        if len(segments) == 1:
+            return segments[0]
+        ids = np.concatenate([segment[0] for segment in segments])
+        return ids, vstack([segment[1] for segment in segments], format='csr')
+
+    def feature_terms(self, conn) -> Dict[int, str]:
+        """Map hashed feature ids back to terms of the database's vocabulary table.
+
+        The vocabulary only grows, so each call hashes just the terms added
+        since the previous one.
+        """
+        rows = conn.execute(
+            'SELECT id, term FROM vocabulary WHERE id > ? ORDER BY id', (self._terms_seen,)
+        ).fetchall()
+        if rows:
+            terms = [term for _, term in rows]
+            # One token per term, so row i's only column is term i's hash
+            columns = self.vectorizer.transform(terms).indices
+            self._feature_terms.update(zip(columns.tolist(), terms))
+            self._terms_seen = rows[-1][0]
+        return self._feature_terms
+
+    def top_terms(self, conn, matrix=None, n: int = 10) -> List[Tuple[str, float]]:
+        """Most frequent terms across documents (rows of ``matrix``)."""
+        import numpy as np
+
+        if matrix is None:
+            matrix = self.load()[1]
+        totals = np.asarray(matrix.sum(axis=0)).ravel()
+        top = np.argsort(totals)[::-1][:n]
+        lookup = self.feature_terms(conn)
+        return [(lookup.get(int(i), f'#{i}'), float(totals[i])) for i in top if totals[i] > 0]
+
+    def tfidf(self, matrix=None, corpus=None):
+        """L2-normalized TF-IDF rows, with IDF computed over ``corpus`` (default: all stored documents)."""
+        from sklearn.feature_extraction.text import TfidfTransformer
+
+        corpus = self.load()[1] if corpus is None else corpus
+        transformer = TfidfTransformer().fit(corpus)
+        return transformer.transform(corpus if matrix is None else matrix)
+
+    def similar(self, doc_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        """Cosine-similar posts to a stored post, by exact sparse dot product."""
+        import numpy as np
+
+        ids, counts = self.load()
+        positions = np.flatnonzero(ids == doc_id)
+        if not len(positions):
+            return []
+        weighted = self.tfidf(corpus=counts)
+        scores = (weighted @ weighted[positions[0]].T).toarray().ravel()
+        scores[positions[0]] = -1
+        order = np.argsort(scores)[::-1][:k]
+        return [(int(ids[i]), float(scores[i])) for i in order if scores[i] > 0]
@@ -0,0 +1,99 @@
+"""Feature Matrix Builder for Social Trend Detector
+
+Turns processed post rows, or a columnar PostBatch, into a dense NumPy
+matrix for anomaly scoring.
+"""
+
+from datetime import datetime
+from typing import Sequence
+
+# Column order of the matrix returned by build_feature_matrix
+FEATURE_COLUMNS = [
+    'likes', 'retweets', 'score', 'num_comments',
+    'engagement_velocity', 'word_count', 'sentiment_score'
+]
+
+# SELECT list that yields rows in the layout build_feature_matrix expects
+FEATURE_SQL = ('likes, retweets, score, num_comments, engagement_score, '
+               'created_at, word_count, sentiment_score')
+
+# PostBatch kinds for FEATURE_SQL columns that POST_SCHEMA does not cover
+FEATURE_SCHEMA = {'created_at': 'datetime'}
+
+
+def _age_hours(created, now: datetime = None):
+    """Hours since each datetime64 timestamp, floored at 1 (NaT counts as 1)."""
+    import numpy as np
+
+    reference = np.datetime64(now or datetime.now(), 'us')
+    age_hours = (reference - created) / np.timedelta64(1, 'h')
+    return np.where(np.isnan(age_hours), 1.0, np.maximum(age_hours, 1.0))
+
+
+def build_feature_matrix(rows: Sequence[Sequence], now: datetime = None):
+    """Build the anomaly feature matrix from processed post rows.
+
+    Engagement velocity is engagement per hour since ``created_at``, with
+    the age floored at one hour so brand-new posts do not explode.
+
+    Args:
+        rows: Rows selected with FEATURE_SQL
+        now: Reference time for post age (default: current time)
+
+    Returns:
+        float64 array of shape (len(rows), len(FEATURE_COLUMNS))
+    """
+    import numpy as np
+
+    n = len(rows)
+    if n == 0:
+        return np.empty((0, len(FEATURE_COLUMNS)))
+
+    def numeric(values):
+        return np.array([v if v is not None else 0 for v in values], dtype=np.float64)
+
+    columns = list(zip(*rows))
+
+    likes, retweets, score, comments, engagement = (numeric(c) for c in columns[:5])
+    created = np.array(
+        [c if c else 'NaT' for c in columns[5]], dtype='datetime64[us]'
+    )
+    age_hours = _age_hours(created, now)
+
+    matrix = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float64)
+    matrix[:, 0] = likes
+    matrix[:, 1] = retweets
+    matrix[:, 2] = score
+    matrix[:, 3] = comments
+    matrix[:, 4] = engagement / age_hours
+    matrix[:, 5] = numeric(columns[6])
+    matrix[:, 6] = numeric(columns[7])
+    return matrix
+
+
+def batch_feature_matrix(batch, now: datetime = None):
+    """Build the anomaly feature matrix straight from PostBatch columns.
+
+    Same layout and values as build_feature_matrix, without going through
+    per-row tuples.
+
+    Args:
+        batch: PostBatch read from a FEATURE_SQL select with FEATURE_SCHEMA
+        now: Reference time for post age (default: current time)
+
+    Returns:
+        float64 array of shape (len(batch), len(FEATURE_COLUMNS))
+    """
+    import numpy as np
+
+    matrix = np.empty((len(batch), len(FEATURE_COLUMNS)), dtype=np.float64)
+    if len(batch) == 0:
+        return matrix
+    matrix[:, 0] = batch['likes']
+    matrix[:, 1] = batch['retweets']
+    matrix[:, 2] = batch['score']
+    matrix[:, 3] = batch['num_comments']
+    matrix[:, 4] = batch['engagement_score'] / _age_hours(batch['created_at'], now)
+    matrix[:, 5] = batch['word_count']
+    matrix[:, 6] = batch['sentiment_score']
+    return matrix
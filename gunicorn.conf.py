@@ -0,0 +1,26 @@
+"""Gunicorn configuration for the Social Trend Detector API."""
+
+import multiprocessing
+import os
+import random
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', '1'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Import the app (and its lexicons) once in the master before forking
+preload_app = True
+
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('WEB_ACCESS_LOG')
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Give every worker its own RNG state; DB connections open lazily per worker."""
+    random.seed()
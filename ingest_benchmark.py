@@ -0,0 +1,126 @@
+"""Ingestion Throughput Benchmark for Social Trend Detector
+
+Loads the same synthetic posts into fresh databases through the existing
+insert path and through bulk_ingest, and reports rows/sec:
+
+- executemany of prebuilt tuples, ``INGEST_BATCH_SIZE`` rows per ledger run
+  (what the daemon's ingest stage does)
+- executemany of prebuilt tuples in one ledger run (``create_mock_data``)
+- bulk_ingest from gzipped JSONL and from CSV, including decompression,
+  parsing and validation
+
+Run with: python ingest_benchmark.py [--posts 500000]
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bulk_ingest import INSERT_SQL, BulkIngestor, open_records
+from config import Config
+from ingestor import create_tables
+from run_ledger import RunLedger
+
+WORDS = ['python', 'AI', 'ML', 'data science', 'tech', 'launch', 'update', 'model',
+         'release', 'great', 'today', 'thread', 'news', 'benchmark', 'security']
+
+FIELDS = ('platform', 'text', 'created_at', 'likes', 'retweets', 'score', 'num_comments')
+
+
+def synthetic_records(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    now = datetime.now()
+    for _ in range(n):
+        yield {
+            'platform': rng.choice(['twitter', 'reddit']),
+            'text': ' '.join(rng.choices(WORDS, k=rng.randint(5, 14))),
+            'created_at': (now - timedelta(minutes=rng.randint(0, 24 * 60))).isoformat(),
+            'likes': rng.randint(0, 1000), 'retweets': rng.randint(0, 500),
+            'score': rng.randint(0, 5000), 'num_comments': rng.randint(0, 200),
+        }
+
+
+def write_inputs(directory: str, n: int):
+    """Write the records as posts.jsonl.gz and posts.csv.gz."""
+    jsonl_path = os.path.join(directory, 'posts.jsonl.gz')
+    csv_path = os.path.join(directory, 'posts.csv.gz')
+    with gzip.open(jsonl_path, 'wt', encoding='utf-8') as jsonl, \
+            gzip.open(csv_path, 'wt', encoding='utf-8', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=FIELDS)
+        writer.writeheader()
+        for record in synthetic_records(n):
+            jsonl.write(json.dumps(record) + '\n')
+            writer.writerow(record)
+    return jsonl_path, csv_path
+
+
+def fresh_database(directory: str, name: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(os.path.join(directory, f'{name}.db'))
+    create_tables(conn)
+    return conn
+
+
+def executemany_path(conn: sqlite3.Connection, rows, batch_size: int) -> float:
+    """Insert prebuilt tuples the way SocialIngestor does, batch_size rows per run."""
+    ledger = RunLedger(conn)
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    for start in range(0, len(rows), batch_size):
+        with ledger.run('ingest') as run:
+            cursor.executemany(INSERT_SQL, rows[start:start + batch_size])
+            run.output_count = cursor.rowcount
+            run.watermark_end = cursor.execute('SELECT MAX(id) FROM posts_raw').fetchone()[0]
+    return time.perf_counter() - started
+
+
+def bulk_path(conn: sqlite3.Connection, path: str) -> float:
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        stats = BulkIngestor(conn).load(open_records(f))
+    assert stats['rejected'] == 0, stats['errors'][:3]
+    return time.perf_counter() - started
+
+
+def run_benchmark(n_posts: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Writing {n_posts:,} synthetic posts...")
+        jsonl_path, csv_path = write_inputs(tmp, n_posts)
+        ingested_at = datetime.now().isoformat()
+        rows = [(r['platform'], r['text'], r['created_at'], ingested_at, r['likes'], r['retweets'],
+                 r['score'], r['num_comments']) for r in synthetic_records(n_posts)]
+
+        paths = [
+            (f'executemany x{Config.INGEST_BATCH_SIZE}/run',
+             lambda conn: executemany_path(conn, rows, Config.INGEST_BATCH_SIZE)),
+            ('executemany, one run', lambda conn: executemany_path(conn, rows, len(rows))),
+            ('bulk JSONL.gz', lambda conn: bulk_path(conn, jsonl_path)),
+            ('bulk CSV.gz', lambda conn: bulk_path(conn, csv_path)),
+        ]
+        print(f"\n=== Ingestion ({n_posts:,} posts) ===")
+        results = {}
+        for i, (label, load) in enumerate(paths):
+            conn = fresh_database(tmp, f'db{i}')
+            elapsed = load(conn)
+            loaded = conn.execute('SELECT COUNT(*) FROM posts_raw').fetchone()[0]
+            conn.close()
+            assert loaded == n_posts, (label, loaded)
+            results[label] = n_posts / elapsed
+            print(f"{label:<26} {elapsed:>8.2f}s  {results[label]:>12,.0f} rows/s")
+
+    base = results[paths[0][0]]
+    print("\nvs daemon batches: " + ', '.join(f"{label} {rate / base:.1f}x" for label, rate in results.items()))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare executemany batches with bulk ingestion')
+    parser.add_argument('--posts', type=int, default=500_000)
+    args = parser.parse_args()
+    run_benchmark(args.posts)
@@ -1,72 +1,193 @@
 import sqlite3
 from datetime import datetime, timedelta
 import random
+from profiling import profile_stage
+from rollups import create_rollup_tables
+from run_ledger import RunLedger, create_run_table
+from trend_lifecycle import create_lifecycle_tables
+from vocabulary import create_vocabulary_table
+
+# Columns added after the original schema, migrated in place on old databases
+ADDED_COLUMNS = {
+    'posts_raw': {'cluster_id': 'INTEGER'},
+    'posts_processed': {
+        'sentiment_label': 'TEXT', 'sentiment_score': 'REAL',
+        'cluster_id': 'INTEGER', 'cluster_size': 'INTEGER DEFAULT 1', 'tokens': 'BLOB',
+    },
+}
+
+# Post text is stored once, in posts_raw. Processed rows point at their
+# cluster's first raw post; text/cleaned_text are only set on legacy rows.
+POSTS_VIEW_SQL = '''CREATE VIEW IF NOT EXISTS posts_view AS
+    SELECT p.id, p.platform, COALESCE(p.text, r.text) AS text, p.created_at, p.timestamp,
+           p.likes, p.retweets, p.score, p.num_comments, p.engagement_score, p.word_count,
+           p.sentiment_label, p.sentiment_score, p.cluster_id, p.cluster_size
+    FROM posts_processed p LEFT JOIN posts_raw r ON r.id = p.cluster_id'''
+
+TRENDS_VIEW_SQL = '''CREATE VIEW IF NOT EXISTS trends_view AS
+    SELECT t.id, t.post_id, t.run_id, t.anomaly_score, t.partition_label,
+           v.platform, v.text, v.engagement_score, v.sentiment_label, v.sentiment_score,
+           e.id AS trend_id, e.state, e.velocity
+    FROM trends t JOIN posts_view v ON v.id = t.post_id
+    LEFT JOIN trend_entities e ON e.post_id = t.post_id'''
+
+
+def create_tables(conn):
+    """Create SQLite tables (idempotent, safe to call from every stage)"""
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS posts_raw (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        platform TEXT,
+        text TEXT,
+        created_at TEXT,
+        timestamp TEXT,
+        likes INTEGER,
+        retweets INTEGER,
+        score INTEGER,
+        num_comments INTEGER,
+        processed INTEGER DEFAULT 0
+    )''')
+    
+    cursor.execute('''CREATE TABLE IF NOT EXISTS posts_processed (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        platform TEXT,
+        text TEXT,
+        cleaned_text TEXT,
+        created_at TEXT,
+        timestamp TEXT,
+        likes INTEGER,
+        retweets INTEGER,
+        score INTEGER,
+        num_comments INTEGER,
+        engagement_score REAL,
+        word_count INTEGER,
+        sentiment_label TEXT,
+        sentiment_score REAL,
+        processed INTEGER DEFAULT 1
+    )''')
+    
+    # Trends used to be a full copy of each viral post; they are recomputed
+    # every detection run, so the old table can simply be replaced
+    trend_columns = {row[1] for row in cursor.execute('PRAGMA table_info(trends)')}
+    if 'text' in trend_columns:
+        cursor.execute('DROP TABLE trends')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS trends (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER,
+        anomaly_score REAL,
+        partition_label TEXT,
+        run_id INTEGER
+    )''')
+    
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        for column, column_type in columns.items():
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_processed_cluster ON posts_processed (cluster_id)')
+    # The processing backlog: stays as small as the unprocessed queue
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raw_unprocessed ON posts_raw (id) WHERE processed = 0')
+    create_lifecycle_tables(cursor)
+    # trends_view gained the lifecycle columns; views are cheap to recreate
+    view = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'trends_view'").fetchone()
+    if view and 'trend_entities' not in view[0]:
+        cursor.execute('DROP VIEW trends_view')
+    cursor.execute(POSTS_VIEW_SQL)
+    cursor.execute(TRENDS_VIEW_SQL)
+    create_vocabulary_table(cursor)
+    create_run_table(cursor)
+    create_search_index(cursor)
+    create_rollup_tables(cursor)
+    conn.commit()
+
+
+PROCESSED_COLUMNS = (
+    'platform', 'tokens', 'created_at', 'timestamp', 'likes', 'retweets', 'score', 'num_comments',
+    'engagement_score', 'word_count', 'sentiment_label', 'sentiment_score', 'cluster_id', 'cluster_size'
+)
+
+
+def insert_processed_rows(cursor, rows):
+    """Insert posts_processed rows (PROCESSED_COLUMNS order) in one statement.
+    
+    Rows go through a TEMP staging table first: row-by-row inserts make the
+    FTS trigger flush the index once per row, while one INSERT ... SELECT
+    lets FTS5 buffer the whole batch.
+    """
+    columns = ', '.join(PROCESSED_COLUMNS)
+    cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS processed_staging AS '
+                   f'SELECT {columns} FROM posts_processed LIMIT 0')
+    cursor.executemany(
+        f'INSERT INTO processed_staging ({columns}) VALUES ({", ".join("?" * len(PROCESSED_COLUMNS))})',
+        rows
+    )
+    cursor.execute(f'INSERT INTO posts_processed ({columns}) SELECT {columns} FROM processed_staging ORDER BY rowid')
+    cursor.execute('DELETE FROM processed_staging')
+
+
+def create_search_index(cursor):
+    """FTS5 index over post text (read through posts_view), kept in sync by triggers"""
+    existing = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+    ).fetchone()
+    if existing and 'cleaned_text' not in existing[0]:
+        return
+    if existing:
+        # Older index also stored cleaned_text; stemming now covers word forms
+        for trigger in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS posts_fts_{trigger}')
+        cursor.execute('DROP TABLE posts_fts')
+    try:
+        cursor.execute('''CREATE VIRTUAL TABLE posts_fts USING fts5(
+            text, content='posts_view', content_rowid='id', tokenize='porter unicode61'
+        )''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ Full-text search unavailable: {e}")
+        return
+    
+    # Mirrors posts_view: the raw post's text unless the row carries its own
+    new_text = '(COALESCE(new.text, (SELECT text FROM posts_raw WHERE id = new.cluster_id)))'
+    old_text = '(COALESCE(old.text, (SELECT text FROM posts_raw WHERE id = old.cluster_id)))'
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts_processed BEGIN
+        INSERT INTO posts_fts (rowid, text) VALUES (new.id, {new_text});
+    END''')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts_processed BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, text) VALUES ('delete', old.id, {old_text});
+    END''')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF text ON posts_processed BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, text) VALUES ('delete', old.id, {old_text});
+        INSERT INTO posts_fts (rowid, text) VALUES (new.id, {new_text});
+    END''')
+    # Index rows that existed before search was added
+    cursor.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+
 
 class SocialIngestor:
-    def __init__(self):
-        self.conn = sqlite3.connect('trends.db')
+    def __init__(self, db_path='trends.db'):
+        self.conn = sqlite3.connect(db_path)
         self.cursor = self.conn.cursor()
         self.create_tables()
+        self.ledger = RunLedger(self.conn)
     
     def create_tables(self):
         """Create SQLite tables"""
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS posts_raw (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            platform TEXT,
-            text TEXT,
-            created_at TEXT,
-            timestamp TEXT,
-            likes INTEGER,
-            retweets INTEGER,
-            score INTEGER,
-            num_comments INTEGER,
-            processed INTEGER DEFAULT 0
-        )''')
-        
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS posts_processed (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            platform TEXT,
-            text TEXT,
-            cleaned_text TEXT,
-            created_at TEXT,
-            timestamp TEXT,
-            likes INTEGER,
-            retweets INTEGER,
-            score INTEGER,
-            num_comments INTEGER,
-            engagement_score REAL,
-            word_count INTEGER,
-            sentiment_label TEXT,
-            sentiment_score REAL,
-            processed INTEGER DEFAULT 1
-        )''')
-        
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS trends (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            platform TEXT,
-            text TEXT,
-            cleaned_text TEXT,
-            engagement_score REAL,
-            is_viral INTEGER,
-            anomaly_score REAL,
-            sentiment_label TEXT,
-            sentiment_score REAL
-        )''')
-        
-        self.conn.commit()
+        create_tables(self.conn)
     
-    def create_mock_data(self):
-        """Generate 50 fake social media posts"""
+    @profile_stage('ingest')
+    def create_mock_data(self, num_posts=50, skip_if_exists=True):
+        """Generate fake social media posts"""
         keywords = ['AI', 'ML', 'data science', 'python', 'tech']
         platforms = ['twitter', 'reddit']
         
-        count = self.cursor.execute('SELECT COUNT(*) FROM posts_raw').fetchone()[0]
-        if count > 0:
-            print(f"✅ {count} posts already exist in database")
-            return
+        if skip_if_exists:
+            count = self.cursor.execute('SELECT COUNT(*) FROM posts_raw').fetchone()[0]
+            if count > 0:
+                print(f"✅ {count} posts already exist in database")
+                return 0
         
         posts = []
-        for i in range(50):
+        for i in range(num_posts):
             keyword = random.choice(keywords)
             platform = random.choice(platforms)
             likes = random.randint(10, 1000)
@@ -87,14 +208,17 @@ class SocialIngestor:
             )
             posts.append(post)
         
-        self.cursor.executemany(
-            '''INSERT INTO posts_raw 
-            (platform, text, created_at, timestamp, likes, retweets, score, num_comments, processed)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-            posts
-        )
-        self.conn.commit()
+        with self.ledger.run('ingest') as run:
+            self.cursor.executemany(
+                '''INSERT INTO posts_raw 
+                (platform, text, created_at, timestamp, likes, retweets, score, num_comments, processed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                posts
+            )
+            run.output_count = len(posts)
+            run.watermark_end = self.cursor.execute('SELECT MAX(id) FROM posts_raw').fetchone()[0]
         print(f"✅ Created {len(posts)} MOCK posts (Twitter + Reddit)")
+        return len(posts)
     
     def get_stats(self):
         """Get database stats"""
@@ -0,0 +1,95 @@
+"""LDA Training Benchmark for Social Trend Detector
+
+Writes synthetic posts with planted topics into a document-term matrix,
+then measures:
+
+- training time of one model: the previous single-threaded LdaModel vs
+  LdaMulticore with increasing worker counts
+- wall time of the coherence sweep vs how many candidates train at once
+
+Run with: python lda_benchmark.py [--docs 50000] [--workers 1 2 4] [--candidates 3 5 8 12]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from config import Config
+from doc_matrix import DocumentMatrix
+from topic_model import TopicModeler, load_corpus, train_candidate
+from vocabulary import Vocabulary, create_vocabulary_table
+
+THEMES = [
+    ['python', 'release', 'interpreter', 'typing', 'package', 'wheel'],
+    ['database', 'outage', 'replica', 'failover', 'latency', 'index'],
+    ['football', 'match', 'goal', 'league', 'transfer', 'coach'],
+    ['election', 'vote', 'ballot', 'campaign', 'debate', 'poll'],
+    ['chip', 'fab', 'wafer', 'nanometer', 'foundry', 'yield'],
+    ['movie', 'trailer', 'sequel', 'box', 'office', 'premiere'],
+]
+FILLER = ['today', 'thread', 'news', 'great', 'update', 'people', 'new', 'time']
+
+
+def build_matrix(directory: str, n_docs: int, seed: int = 42) -> DocumentMatrix:
+    """Posts that each mix one or two themes with filler words."""
+    rng = random.Random(seed)
+    matrix = DocumentMatrix(directory)
+    for start in range(0, n_docs, 10000):
+        texts = []
+        for _ in range(start, min(start + 10000, n_docs)):
+            themes = rng.sample(THEMES, rng.choice([1, 1, 2]))
+            words = [rng.choice(theme) for theme in themes for _ in range(rng.randint(3, 6))]
+            texts.append(' '.join(words + rng.choices(FILLER, k=rng.randint(1, 4))))
+        matrix.append(list(range(start + 1, start + len(texts) + 1)), texts)
+    return matrix
+
+
+def run_benchmark(n_docs: int, workers, candidates):
+    from gensim.matutils import Sparse2Corpus
+    from gensim.models import LdaModel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Writing {n_docs:,} synthetic posts ({len(THEMES)} planted topics)...")
+        matrix = build_matrix(os.path.join(tmp, 'dtm'), n_docs)
+        # Feature ids are named through a vocabulary table, as in the pipeline database
+        conn = sqlite3.connect(':memory:')
+        create_vocabulary_table(conn)
+        Vocabulary(conn).ids_for(sorted({word for theme in THEMES for word in theme} | set(FILLER)))
+        ids, counts, columns = load_corpus(matrix)
+        lookup = matrix.feature_terms(conn)
+        id2word = {i: lookup.get(int(column), f'#{column}') for i, column in enumerate(columns)}
+        num_topics = len(THEMES)
+
+        print(f"\n=== One model, {num_topics} topics, {Config.LDA_PASSES} passes, {os.cpu_count()} cores ===")
+        start = time.perf_counter()
+        LdaModel(Sparse2Corpus(counts, documents_columns=False), num_topics=num_topics, id2word=id2word,
+                 passes=Config.LDA_PASSES, chunksize=Config.LDA_CHUNKSIZE, random_state=42)
+        base = time.perf_counter() - start
+        print(f"LdaModel (previous)     {base:8.2f}s")
+        for n in workers:
+            _, coherence, elapsed = train_candidate(
+                num_topics, matrix.directory, matrix.n_features, int(ids.max()), columns, id2word,
+                n, Config.LDA_PASSES, Config.LDA_CHUNKSIZE
+            )
+            label = f"LdaMulticore workers={n}" if n > 1 else "LdaModel (workers=1)"
+            print(f"{label:<23} {elapsed:8.2f}s  {base / elapsed:5.2f}x  coherence {coherence:.3f}")
+
+        print(f"\n=== Coherence sweep over {list(candidates)} ===")
+        modeler = TopicModeler(os.path.join(tmp, 'lda'))
+        # Past max(workers) // 2 at a time, candidates drop to one worker (serial LdaModel)
+        for parallel in sorted({1, min(len(candidates), max(max(workers) // 2, 1))}):
+            result = modeler.sweep(matrix, conn, candidates, workers=max(workers), sweep_workers=parallel)
+            scores = ', '.join(f"{k}={c:.3f}" for k, c in sorted(result['coherence'].items()))
+            print(f"{parallel} at a time    {result['sweep_seconds']:8.2f}s  selected {result['num_topics']} ({scores})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='LDA training time vs cores, and coherence sweep time')
+    parser.add_argument('--docs', type=int, default=50000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--candidates', type=int, nargs='+', default=Config.LDA_TOPIC_CANDIDATES)
+    args = parser.parse_args()
+    run_benchmark(args.docs, args.workers, args.candidates)
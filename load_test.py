@@ -0,0 +1,518 @@
+"""Load Test for the Social Trend Detector API
+
+Starts the production gunicorn server and drives it with concurrent
+clients. Two modes:
+
+- Worker scaling (default): requests/sec against one endpoint as gunicorn
+  workers are added.
+- Latency (``--latency``): seeds a database of ``--posts`` synthetic posts,
+  drives every endpoint at a fixed total ``--rate`` and reports p50/p95/p99
+  latency and error rates per endpoint. Latency is measured from each
+  request's scheduled send time, so an overloaded server shows up as
+  growing latency instead of a quietly lower request rate.
+  ``--profile DIR`` writes a cProfile per endpoint (run in-process against
+  the same database). ``--flamegraph DIR`` records a py-spy flamegraph of
+  the server per endpoint.
+
+Run with:
+    python load_test.py --workers 1 2 4 --path /api/health
+    python load_test.py --latency --posts 10000 --rate 50 --workers 2 --profile profiles
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+REPO_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# (name, method, path, JSON body); {trend_id} (a lifecycle entity id) is filled from the database
+ENDPOINTS = {
+    'enhanced': [
+        ('health', 'GET', '/api/health', None),
+        ('trends', 'GET', '/api/trends?per_page=20', None),
+        ('trend_similar', 'GET', '/api/trends/{trend_id}/similar?k=10', None),
+        ('trend_history', 'GET', '/api/trends/{trend_id}/history', None),
+        ('global', 'GET', '/api/global', None),
+        ('timeseries', 'GET', '/api/timeseries?granularity=hour', None),
+        ('topics', 'GET', '/api/topics', None),
+        ('anomalies', 'GET', '/api/anomalies', None),
+        ('sentiment_stats', 'GET', '/api/sentiment/stats', None),
+        ('search', 'GET', '/api/search?q=python&limit=20', None),
+    ],
+    'basic': [
+        ('health', 'GET', '/health', None),
+        ('trends', 'GET', '/trends', None),
+        ('posts', 'GET', '/posts', None),
+    ],
+}
+
+SEED_WORDS = ['python', 'AI', 'ML', 'data science', 'tech', 'release', 'launch', 'model',
+              'update', 'great', 'terrible', 'love', 'broken', 'today', 'thread', 'news',
+              'benchmark', 'open source', 'security', 'chips']
+
+
+def wait_for_server(host: str, port: int, timeout: float = 30, path: str = '/api/health') -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+@contextmanager
+def serve(args, workers: int, env: Dict = None, cwd: str = None):
+    """Run gunicorn with the given worker count for the duration of the block."""
+    module = 'wsgi:app' if args.app == 'enhanced' else 'app:app'
+    pythonpath = os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')]))
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), API_HOST=args.host,
+               API_PORT=str(args.port), PYTHONPATH=pythonpath, **(env or {}))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_DIR, 'gunicorn.conf.py'), module],
+        cwd=cwd or REPO_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_server(args.host, args.port, path=ENDPOINTS[args.app][0][2]):
+            raise RuntimeError(f"Server with {workers} workers did not start")
+        yield server
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def drive(host: str, port: int, path: str, duration: float, concurrency: int) -> Dict:
+    """Hammer one path with keep-alive clients for a fixed duration.
+
+    Args:
+        host: Server host
+        port: Server port
+        path: Request path
+        duration: Seconds to run
+        concurrency: Number of concurrent clients
+
+    Returns:
+        Dictionary with request, error and requests/sec counts
+    """
+    deadline = time.time() + duration
+
+    def client():
+        ok = errors = 0
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        while time.time() < deadline:
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status < 500:
+                    ok += 1
+                else:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+        conn.close()
+        return ok, errors
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: client(), range(concurrency)))
+    elapsed = time.time() - start
+
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return {'requests': ok, 'errors': errors, 'rps': ok / elapsed if elapsed else 0.0}
+
+
+def run_for_workers(workers: int, args) -> Dict:
+    with serve(args, workers):
+        result = drive(args.host, args.port, args.path, args.duration, args.concurrency)
+    result['workers'] = workers
+    return result
+
+
+def run_load_test(args) -> List[Dict]:
+    results = []
+    print(f"\n=== Load test: GET {args.path} ({args.concurrency} clients, {args.duration}s) ===")
+    for workers in args.workers:
+        result = run_for_workers(workers, args)
+        results.append(result)
+        print(f"workers={workers:<3} {result['rps']:>9.1f} req/s  "
+              f"({result['requests']} ok, {result['errors']} errors)")
+
+    base = results[0]['rps'] if results and results[0]['rps'] else None
+    if base:
+        print("\nScaling vs first run: " +
+              ', '.join(f"{r['workers']}w={r['rps'] / base:.2f}x" for r in results))
+    return results
+
+
+def workspace_settings(workspace: str) -> Dict[str, str]:
+    """Config overrides that keep a seeded workspace's models and matrices inside it."""
+    models = os.path.join(workspace, 'models')
+    return {
+        'DOC_MATRIX_DIR': os.path.join(models, 'doc_matrix'),
+        'VECTOR_INDEX_DIR': os.path.join(models, 'vector_index'),
+        'ANOMALY_MODEL_PATH': os.path.join(models, 'anomaly_model.joblib'),
+        'LDA_MODEL_DIR': os.path.join(models, 'lda'),
+    }
+
+
+@contextmanager
+def workspace_config(workspace: str):
+    """Point Config at a seeded workspace; yields its database path.
+
+    Restores the previous settings afterwards.
+    """
+    from config import Config
+
+    overrides = workspace_settings(workspace)
+    previous = {name: getattr(Config, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(Config, name, value)
+    try:
+        yield os.path.join(workspace, 'trends.db')
+    finally:
+        for name, value in previous.items():
+            setattr(Config, name, value)
+
+
+def seed_database(workspace: str, n_posts: int, seed: int = 42) -> str:
+    """Fill a workspace with n synthetic processed posts, rollups, matrices and trends.
+
+    Returns:
+        Path of the seeded database (``workspace/trends.db``)
+    """
+    from doc_matrix import DocumentMatrix
+    from ingestor import create_tables, insert_processed_rows
+    from ml_model import TrendDetector
+    from rollups import rebuild_rollups
+    from vector_index import VectorIndex
+    from vocabulary import Vocabulary
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    os.makedirs(workspace, exist_ok=True)
+    with workspace_config(workspace) as db_path:
+        conn = sqlite3.connect(db_path)
+        create_tables(conn)
+        vocabulary = Vocabulary(conn)
+        for start in range(0, n_posts, 5000):
+            raw, processed = [], []
+            for post_id in range(start + 1, min(start + 5000, n_posts) + 1):
+                words = rng.choices(SEED_WORDS, k=rng.randint(5, 14))
+                platform = 'twitter' if post_id % 2 else 'reddit'
+                created_at = (now - timedelta(minutes=rng.randint(0, 7 * 24 * 60))).isoformat()
+                # Heavy-tailed engagement, so detection has outliers to find
+                likes, retweets, score, comments = (int(rng.paretovariate(1.2) * base) for base in (10, 3, 20, 5))
+                engagement = likes + 2 * retweets if platform == 'twitter' else score + comments
+                sentiment = round(rng.uniform(-1, 1), 3)
+                label = 'positive' if sentiment >= 0.05 else 'negative' if sentiment <= -0.05 else 'neutral'
+                raw.append((post_id, platform, ' '.join(words) + f' #{post_id % 50}', created_at,
+                            created_at, likes, retweets, score, comments, post_id))
+                processed.append((platform, vocabulary.encode(' '.join(words).lower()), created_at, created_at,
+                                  likes, retweets, score, comments, engagement, len(words), label,
+                                  sentiment, post_id, 1))
+            conn.executemany(
+                '''INSERT INTO posts_raw (id, platform, text, created_at, timestamp, likes, retweets,
+                score, num_comments, processed, cluster_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)''',
+                raw
+            )
+            insert_processed_rows(conn.cursor(), processed)
+            conn.commit()
+        rebuild_rollups(conn, lambda platform, likes, retweets, score, comments:
+                        likes + 2 * retweets if platform == 'twitter' else score + comments)
+        doc_matrix = DocumentMatrix()
+        doc_matrix.sync(conn)
+        VectorIndex().sync(doc_matrix)
+        conn.close()
+
+        detector = TrendDetector(db_path)
+        detector.detect_anomalies(refit=True)
+        detector.close()
+    return db_path
+
+
+def endpoint_paths(db_path: str, app: str, names: Sequence[str] = None) -> List[Tuple]:
+    """The endpoint mix for an app, with trend ids taken from the database."""
+    conn = sqlite3.connect(db_path)
+    try:
+        ids = {'trend_id': conn.execute('SELECT MIN(id) FROM trend_entities').fetchone()[0] or 1}
+    except sqlite3.OperationalError:
+        ids = {'trend_id': 1}
+    finally:
+        conn.close()
+    return [(name, method, path.format(**ids), body) for name, method, path, body in ENDPOINTS[app]
+            if not names or name in names]
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values (0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples: Sequence[Tuple[str, float, int]], elapsed: float) -> Dict[str, Dict]:
+    """Per-endpoint latency percentiles (ms) and error rates from (name, seconds, status) samples.
+
+    Status None means the request failed at the transport level; it and
+    5xx responses count as errors, 4xx responses are reported separately.
+    """
+    by_endpoint = {}
+    for name, latency, status in samples:
+        by_endpoint.setdefault(name, []).append((latency, status))
+    summary = {}
+    for name, results in by_endpoint.items():
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        errors = sum(1 for _, status in results if status is None or status >= 500)
+        client_errors = sum(1 for _, status in results if status is not None and 400 <= status < 500)
+        summary[name] = {
+            'requests': len(results),
+            'rps': len(results) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1],
+            'client_error_rate': client_errors / len(results),
+            'error_rate': errors / len(results),
+        }
+    return summary
+
+
+def drive_mix(host: str, port: int, endpoints: Sequence[Tuple], rate: float,
+              duration: float, concurrency: int) -> Dict[str, Dict]:
+    """Send requests round-robin over endpoints on a fixed schedule (open loop).
+
+    Request i is due at ``start + i / rate``. Clients sleep until a request
+    is due; when they fall behind, requests go out late and the delay is
+    counted in their latency.
+
+    Returns:
+        summarize() output per endpoint name
+    """
+    total = max(int(rate * duration), 1)
+    sequence = itertools.count()
+    start = time.perf_counter() + 0.05
+
+    def client():
+        samples = []
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        while True:
+            i = next(sequence)
+            if i >= total:
+                break
+            due = start + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name, method, path, body = endpoints[i % len(endpoints)]
+            try:
+                if body is None:
+                    conn.request(method, path)
+                else:
+                    conn.request(method, path, body=json.dumps(body),
+                                 headers={'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = None
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+            samples.append((name, time.perf_counter() - due, status))
+        conn.close()
+        return samples
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(client) for _ in range(concurrency)]
+        samples = [sample for future in futures for sample in future.result()]
+    return summarize(samples, time.perf_counter() - start)
+
+
+def print_latency_table(summary: Dict[str, Dict]):
+    print(f"{'endpoint':<16} {'req':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'4xx':>6} {'errors':>7}")
+    for name, stats in summary.items():
+        print(f"{name:<16} {stats['requests']:>6} {stats['rps']:>7.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f} "
+              f"{stats['client_error_rate']:>6.1%} {stats['error_rate']:>7.1%}")
+
+
+@contextmanager
+def _in_process_app(app: str, db_path: str):
+    """Flask test client bound to db_path, for profiling without the network."""
+    if app == 'basic':
+        import app as basic_app
+        # app.py opens trends.db relative to the working directory
+        previous = os.getcwd()
+        os.chdir(os.path.dirname(os.path.abspath(db_path)))
+        try:
+            yield basic_app.app.test_client()
+        finally:
+            os.chdir(previous)
+        return
+
+    import app_enhanced
+    previous = app_enhanced.DATABASE, app_enhanced._db_local
+    app_enhanced.DATABASE = db_path
+    app_enhanced._db_local = threading.local()
+    try:
+        yield app_enhanced.app.test_client()
+    finally:
+        conn = getattr(app_enhanced._db_local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        app_enhanced.DATABASE, app_enhanced._db_local = previous
+
+
+def profile_endpoints(app: str, db_path: str, endpoints: Sequence[Tuple], out_dir: str,
+                      requests: int = 20, top: int = 3) -> Dict[str, str]:
+    """cProfile each endpoint in-process and write ``<out_dir>/<endpoint>.prof``.
+
+    Prints the functions with the most self time per endpoint; open the
+    .prof files with snakeviz or ``python -m pstats`` for the full picture.
+
+    Returns:
+        Endpoint name -> profile path
+    """
+    import cProfile
+    import pstats
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    with _in_process_app(app, db_path) as client:
+        for name, method, path, body in endpoints:
+            # First request pays for lazy imports and model loading
+            client.open(path, method=method, json=body)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            for _ in range(requests):
+                client.open(path, method=method, json=body)
+            profiler.disable()
+            paths[name] = os.path.join(out_dir, f'{name}.prof')
+            profiler.dump_stats(paths[name])
+
+            stats = pstats.Stats(profiler)
+            hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+            print(f"{name:<16} " + '; '.join(
+                f"{os.path.basename(file)}:{line}({function}) {self_time * 1000 / requests:.2f}ms"
+                for (file, line, function), (_, _, self_time, _, _) in hottest
+            ))
+    return paths
+
+
+def record_flamegraphs(args, server, endpoints: Sequence[Tuple], out_dir: str) -> List[str]:
+    """Record a py-spy flamegraph of the server while it serves each endpoint alone."""
+    py_spy = shutil.which('py-spy')
+    if not py_spy:
+        print("⚠️ py-spy not found (pip install py-spy); skipping flamegraphs")
+        return []
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    seconds = args.flamegraph_seconds
+    for endpoint in endpoints:
+        path = os.path.join(out_dir, f'{endpoint[0]}.svg')
+        recorder = subprocess.Popen(
+            [py_spy, 'record', '--pid', str(server.pid), '--subprocesses', '--nonblocking',
+             '--duration', str(int(seconds)), '--format', 'flamegraph', '--output', path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        drive_mix(args.host, args.port, [endpoint], args.rate, seconds, args.concurrency)
+        if recorder.wait() == 0:
+            paths.append(path)
+        else:
+            print(f"⚠️ py-spy could not record {endpoint[0]} (ptrace permissions?)")
+    return paths
+
+
+def run_latency_test(args) -> Dict[int, Dict]:
+    workspace = None
+    db_path = args.db
+    if db_path is None:
+        workspace = tempfile.mkdtemp(prefix='load_test_')
+        print(f"Seeding {args.posts:,} posts into {workspace}...")
+        db_path = seed_database(workspace, args.posts)
+    endpoints = endpoint_paths(db_path, args.app, args.endpoints)
+
+    env = {'DATABASE_PATH': os.path.abspath(db_path)}
+    if workspace:
+        env.update(workspace_settings(workspace))
+    cwd = os.path.dirname(os.path.abspath(db_path)) if args.app == 'basic' else None
+
+    results = {}
+    try:
+        for workers in args.workers:
+            print(f"\n=== Latency: {len(endpoints)} endpoints at {args.rate:g} req/s total, "
+                  f"{args.concurrency} clients, {args.duration}s, workers={workers} ===")
+            with serve(args, workers, env=env, cwd=cwd) as server:
+                results[workers] = drive_mix(args.host, args.port, endpoints, args.rate,
+                                             args.duration, args.concurrency)
+                print_latency_table(results[workers])
+                if args.flamegraph:
+                    record_flamegraphs(args, server, endpoints,
+                                       os.path.join(args.flamegraph, f'workers-{workers}'))
+
+        if args.profile:
+            print(f"\n=== cProfile, {args.profile_requests} requests per endpoint -> {args.profile} ===")
+            if workspace:
+                with workspace_config(workspace):
+                    profile_endpoints(args.app, db_path, endpoints, args.profile, args.profile_requests)
+            else:
+                profile_endpoints(args.app, db_path, endpoints, args.profile, args.profile_requests)
+    finally:
+        if workspace and not args.keep:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Requests/sec vs gunicorn worker count, or per-endpoint latency')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--path', default='/api/health')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--app', choices=sorted(ENDPOINTS), default='enhanced',
+                        help='enhanced (wsgi.py) or basic (app.py)')
+
+    latency = parser.add_argument_group('latency mode')
+    latency.add_argument('--latency', action='store_true', help='Drive every endpoint and report percentiles')
+    latency.add_argument('--posts', type=int, default=10000, help='Posts to seed')
+    latency.add_argument('--db', default=None, help='Use an existing database instead of seeding')
+    latency.add_argument('--rate', type=float, default=50, help='Total requests/sec across endpoints')
+    latency.add_argument('--endpoints', nargs='+', default=None, help='Subset of endpoint names')
+    latency.add_argument('--profile', default=None, metavar='DIR', help='Write a cProfile per endpoint')
+    latency.add_argument('--profile-requests', type=int, default=20)
+    latency.add_argument('--flamegraph', default=None, metavar='DIR', help='Record py-spy flamegraphs per endpoint')
+    latency.add_argument('--flamegraph-seconds', type=float, default=5)
+    latency.add_argument('--keep', action='store_true', help='Keep the seeded workspace')
+
+    args = parser.parse_args()
+    if args.latency:
+        run_latency_test(args)
+    else:
+        run_load_test(args)
@@ -1,9 +1,16 @@
+import sys
 from ingestor import SocialIngestor
 from processor import TextProcessor
 from ml_model import TrendDetector
+from profiling import configure, print_session_summary, profile_session
 
 def full_pipeline():
     print("🔄 Running full pipeline...")
+    with profile_session() as profiled:
+        run_stages()
+    print_session_summary(profiled)
+
+def run_stages():
     try:
         print("\n1️⃣ INGESTION (Creating mock data)...")
         ingestor = SocialIngestor()
@@ -26,6 +33,31 @@ def full_pipeline():
         
     except Exception as e:
         print(f"❌ Error: {e}")
+        print("↩️ Completed stages are recorded in pipeline_runs; rerun to resume")
+
+def show_runs(limit=20):
+    """Print the most recent stage runs from the ledger"""
+    ingestor = SocialIngestor()
+    for run in reversed(ingestor.ledger.history(limit=limit)):
+        print(f"{run['id']:>5} {run['stage']:<8} {run['status']:<9} "
+              f"watermark {run['watermark_start']}->{run['watermark_end']} "
+              f"in={run['input_count']} out={run['output_count']} "
+              f"{run['duration_s'] or 0:.2f}s {run['error'] or ''}")
+    ingestor.close()
 
 if __name__ == "__main__":
-    full_pipeline()
+    if '--profile' in sys.argv:
+        # --profile [cpu|memory|cpu,memory]; same as setting PROFILE
+        index = sys.argv.index('--profile') + 1
+        value = sys.argv[index] if index < len(sys.argv) and not sys.argv[index].startswith('--') else 'all'
+        try:
+            configure(value)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+    if '--daemon' in sys.argv:
+        from pipeline_daemon import PipelineDaemon
+        PipelineDaemon().run_forever()
+    elif '--runs' in sys.argv:
+        show_runs()
+    else:
+        full_pipeline()
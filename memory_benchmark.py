@@ -0,0 +1,115 @@
+"""Batch Memory Benchmark for Social Trend Detector
+
+Loads the same synthetic posts the way the detection and processing stages
+used to (a list of row tuples) and as a columnar PostBatch, and reports the
+tracemalloc peak and the memory still held once the batch is built.
+
+Run with: python memory_benchmark.py [--posts 1000000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from features import FEATURE_SCHEMA, FEATURE_SQL, batch_feature_matrix, build_feature_matrix
+from ml_model import keyword_segment, partition_indices, partition_label
+from post_batch import PostBatch
+
+DETECT_SQL = f'SELECT id, platform, text, {FEATURE_SQL} FROM posts'
+PROCESS_SQL = ('SELECT id, platform, text, created_at, timestamp, likes, retweets, score, '
+               'num_comments FROM posts')
+
+WORDS = ['python', 'data science', 'machine learning', 'AI', 'tech', 'launch', 'update',
+         'model', 'release', 'bug', 'great', 'today', 'thread', 'news', 'benchmark']
+
+
+def build_database(path: str, n: int, seed: int = 42):
+    """Write n synthetic posts with every column the two stages select."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE posts (
+        id INTEGER PRIMARY KEY, platform TEXT, text TEXT, created_at TEXT, timestamp TEXT,
+        likes INTEGER, retweets INTEGER, score INTEGER, num_comments INTEGER,
+        engagement_score REAL, word_count INTEGER, sentiment_score REAL
+    )''')
+
+    def rows():
+        for i in range(n):
+            created_at = f'2024-01-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00'
+            likes, retweets = rng.randint(0, 500), rng.randint(0, 100)
+            yield (rng.choice(['twitter', 'reddit']),
+                   ' '.join(rng.choices(WORDS, k=rng.randint(5, 12))),
+                   created_at, created_at, likes, retweets, rng.randint(0, 900),
+                   rng.randint(0, 200), likes + 2 * retweets, rng.randint(3, 12),
+                   round(rng.uniform(-1, 1), 4))
+
+    conn.executemany(
+        '''INSERT INTO posts (platform, text, created_at, timestamp, likes, retweets, score,
+        num_comments, engagement_score, word_count, sentiment_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows()
+    )
+    conn.commit()
+    return conn
+
+
+def measure(label: str, load):
+    """Run load() under tracemalloc; returns (peak MiB, held MiB, seconds)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    mib = 1024 * 1024
+    print(f"{label:<24} peak {peak / mib:>9.1f} MiB  held {held / mib:>9.1f} MiB  {elapsed:>7.2f}s")
+    return peak / mib, held / mib, elapsed
+
+
+def run_benchmark(n_posts: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Writing {n_posts:,} synthetic posts...")
+        conn = build_database(os.path.join(tmp, 'bench.db'), n_posts)
+
+        def detect_tuples():
+            posts = conn.execute(DETECT_SQL).fetchall()
+            features = build_feature_matrix([post[3:] for post in posts])
+            partitions = {}
+            for i, post in enumerate(posts):
+                partitions.setdefault(partition_label(post[1], post[2]), []).append(i)
+            return posts, features, partitions
+
+        def detect_batch():
+            posts = PostBatch.from_cursor(
+                conn.execute(DETECT_SQL.replace('text,', 'text AS segment,')),
+                schema={'segment': 'category', **FEATURE_SCHEMA},
+                converters={'segment': keyword_segment}
+            )
+            return posts, batch_feature_matrix(posts), partition_indices(posts)
+
+        results = {}
+        print(f"\n=== Detection input ({n_posts:,} posts) ===")
+        results['detect'] = (measure('row tuples', detect_tuples), measure('PostBatch', detect_batch))
+
+        print(f"\n=== Processing input ({n_posts:,} posts) ===")
+        results['process'] = (
+            measure('row tuples', lambda: conn.execute(PROCESS_SQL).fetchall()),
+            measure('PostBatch', lambda: PostBatch.from_cursor(conn.execute(PROCESS_SQL)))
+        )
+        conn.close()
+
+    print()
+    for stage, (legacy, batch) in results.items():
+        print(f"{stage:<8} peak -{1 - batch[0] / legacy[0]:.0%}, held -{1 - batch[1] / legacy[1]:.0%}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare row-tuple and columnar batch memory')
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    args = parser.parse_args()
+    run_benchmark(args.posts)
@@ -1,95 +1,330 @@
-import sqlite3
-import nltk
+import multiprocessing
+import os
 import re
-import numpy as np
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from gensim import corpora
-from gensim.models import LdaModel
-from sklearn.ensemble import IsolationForest
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from config import Config
+from doc_matrix import DocumentMatrix
+from features import FEATURE_COLUMNS, FEATURE_SCHEMA, FEATURE_SQL, batch_feature_matrix
+from ingestor import create_tables
+from post_batch import PostBatch
+from profiling import profile_stage
+from run_ledger import RunLedger
+from topic_model import TopicModeler
+from trend_lifecycle import STATES as TREND_STATES, TrendTracker
+
+_KEYWORD_PATTERNS = [
+    (keyword, re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE))
+    for keyword in Config.KEYWORDS
+]
+
+def keyword_segment(text):
+    """First Config.KEYWORDS entry mentioned in the text, or 'other'"""
+    for keyword, pattern in _KEYWORD_PATTERNS:
+        if text and pattern.search(text):
+            return keyword
+    return 'other'
+
+def partition_label(platform, text):
+    """Detection partition of a post, e.g. 'reddit:python'"""
+    return f"{platform}:{keyword_segment(text)}"
+
+def partition_indices(batch):
+    """Row indices per partition label of a batch with platform/segment columns"""
+    import numpy as np
+    
+    segments = batch.categories['segment']
+    keys = batch['platform'].astype(np.int64) * len(segments) + batch['segment']
+    order = np.argsort(keys, kind='stable')
+    unique_keys, starts = np.unique(keys[order], return_index=True)
+    partitions = {}
+    for key, indices in zip(unique_keys.tolist(), np.split(order, starts[1:])):
+        platform = batch.categories['platform'][key // len(segments)]
+        partitions[f"{platform}:{segments[key % len(segments)]}"] = indices
+    return partitions
+
+def score_in_batches(model, features, batch_size=None):
+    """Decision-function scores in fixed-size batches (negative = anomaly)"""
+    import numpy as np
+    
+    batch_size = batch_size or Config.ANOMALY_BATCH_SIZE
+    scores = np.empty(len(features))
+    for start in range(0, len(features), batch_size):
+        stop = start + batch_size
+        scores[start:stop] = model.decision_function(features[start:stop])
+    return scores
 
-nltk.download('stopwords', quiet=True)
-nltk.download('wordnet', quiet=True)
+def fit_and_score_partition(label, post_ids, features, model=None, n_jobs=1):
+    """Fit (if needed) and score one partition; runs inside pool workers"""
+    fitted = model is None
+    if fitted:
+        from sklearn.ensemble import IsolationForest
+        model = IsolationForest(contamination=0.1, random_state=42, n_jobs=n_jobs)
+        model.fit(features)
+    return label, post_ids, score_in_batches(model, features), model, fitted
+
+def create_model_fit_table(cursor):
+    """Per-partition fit bookkeeping for the anomaly refit policy"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS anomaly_model_fits (
+        partition_label TEXT PRIMARY KEY,
+        fitted_rows INTEGER,
+        current_rows INTEGER,
+        fitted_at TEXT
+    )''')
 
 class TrendDetector:
-    def __init__(self):
-        self.conn = sqlite3.connect('trends.db')
+    def __init__(self, db_path='trends.db', doc_matrix_dir=None, lda_model_dir=None,
+                 anomaly_model_path=None, workers=None):
+        """Paths and workers left as None follow Config (DOC_MATRIX_DIR,
+        LDA_MODEL_DIR, ANOMALY_MODEL_PATH, DETECT_WORKERS)"""
+        self.conn = sqlite3.connect(db_path)
         self.cursor = self.conn.cursor()
-        self.stop_words = set(stopwords.words('english'))
-        self.lemmatizer = WordNetLemmatizer()
+        create_tables(self.conn)
+        create_model_fit_table(self.cursor)
+        self.conn.commit()
         self.lda_model = None
+        self.anomaly_models = {}
+        self.ledger = RunLedger(self.conn)
+        self.tracker = TrendTracker(self.conn)
+        self.doc_matrix_dir = doc_matrix_dir
+        self.lda_model_dir = lda_model_dir
+        self.anomaly_model_path = anomaly_model_path
+        self.workers = workers
+        self._pool = None
     
-    def train_lda(self, num_topics=3):
-        """Train LDA model on cleaned text"""
-        posts = self.cursor.execute(
-            'SELECT cleaned_text FROM posts_processed WHERE cleaned_text IS NOT NULL AND cleaned_text != ""'
-        ).fetchall()
-        
-        if len(posts) < 10:
+    @profile_stage('lda')
+    def train_lda(self, num_topics=None):
+        """Train LDA on the shared document-term matrix, sweeping topic counts by coherence"""
+        modeler = TopicModeler(self.lda_model_dir)
+        result = modeler.sweep(DocumentMatrix(self.doc_matrix_dir), self.conn, candidates=[num_topics] if num_topics else None)
+        if result is None:
             print("⚠️ Not enough data for LDA (need 10+)")
             return None
         
-        texts = [post[0].split() for post in posts]
-        dictionary = corpora.Dictionary(texts)
-        corpus = [dictionary.doc2bow(text) for text in texts]
-        
-        self.lda_model = LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=5)
-        print("✅ LDA model trained")
+        self.lda_model = result['model']
+        modeler.save(result)
+        sweep = ', '.join(f"{k}={coherence:.2f}" for k, coherence in sorted(result['coherence'].items()))
+        print(f"✅ LDA model trained: {result['num_topics']} topics from {result['documents']} posts "
+              f"in {result['sweep_seconds']:.1f}s (UMass coherence {sweep})")
         
         for topic_id, topic in self.lda_model.print_topics(num_words=5):
             print(f"   Topic {topic_id}: {topic}")
         
         return self.lda_model
     
-    def detect_anomalies(self):
-        """Find viral posts using engagement anomalies"""
-        posts = self.cursor.execute(
-            'SELECT id, platform, text, cleaned_text, engagement_score, sentiment_label, sentiment_score FROM posts_processed WHERE engagement_score IS NOT NULL'
-        ).fetchall()
+    def load_lda(self):
+        """Load the saved topic model instead of retraining it"""
+        self.lda_model = TopicModeler(self.lda_model_dir).load_model()
+        return self.lda_model
+    
+    def lda_needs_retrain(self, now=None):
+        """Whether the saved topic model is missing, older than LDA_RETRAIN_HOURS, or its
+        corpus has grown LDA_RETRAIN_GROWTH times since it was trained"""
+        saved = TopicModeler(self.lda_model_dir).load_topics()
+        if saved is None:
+            return True
+        documents = self.cursor.execute('SELECT COUNT(*) FROM posts_processed').fetchone()[0]
+        if Config.LDA_RETRAIN_GROWTH and documents >= saved['documents'] * Config.LDA_RETRAIN_GROWTH:
+            return True
+        age_hours = ((now or datetime.now()) - datetime.fromisoformat(saved['trained_at'])).total_seconds() / 3600
+        return bool(Config.LDA_RETRAIN_HOURS) and age_hours >= Config.LDA_RETRAIN_HOURS
+    
+    def load_anomaly_models(self):
+        """Load persisted per-partition anomaly models if they match the current features"""
+        import joblib
         
-        if len(posts) < 5:
-            print("⚠️ Not enough data for anomaly detection")
-            return []
+        if self.anomaly_models:
+            return self.anomaly_models
+        path = self.anomaly_model_path or Config.ANOMALY_MODEL_PATH
+        if not os.path.exists(path):
+            return {}
+        saved = joblib.load(path)
+        if saved.get('features') != FEATURE_COLUMNS or 'partitions' not in saved:
+            print("⚠️ Saved anomaly models use a different layout, refitting")
+            return {}
+        self.anomaly_models = saved['partitions']
+        return self.anomaly_models
+    
+    def save_anomaly_models(self):
+        """Persist the fitted per-partition anomaly models"""
+        import joblib
         
-        scores = np.array([post[4] for post in posts]).reshape(-1, 1)
+        path = self.anomaly_model_path or Config.ANOMALY_MODEL_PATH
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump({'features': FEATURE_COLUMNS, 'partitions': self.anomaly_models}, path)
+    
+    def load_model_fits(self):
+        """partition label -> (rows at fit, rows now, fitted_at) for the saved models"""
+        return {label: tuple(info) for label, *info in self.cursor.execute(
+            'SELECT partition_label, fitted_rows, current_rows, fitted_at FROM anomaly_model_fits'
+        )}
+    
+    def save_model_fits(self, fits):
+        """Record fit bookkeeping inside the caller's transaction"""
+        self.cursor.executemany(
+            'INSERT OR REPLACE INTO anomaly_model_fits (partition_label, fitted_rows, current_rows, fitted_at) '
+            'VALUES (?, ?, ?, ?)',
+            [(label, *info) for label, info in fits.items()]
+        )
+    
+    def _needs_refit(self, label, models, fits, now):
+        """Whether a partition's model is missing, too old or outgrown by its partition"""
+        if label not in models or label not in fits:
+            return True
+        fitted_rows, current_rows, fitted_at = fits[label]
+        if Config.ANOMALY_REFIT_GROWTH and current_rows >= fitted_rows * Config.ANOMALY_REFIT_GROWTH:
+            return True
+        age_hours = (now - datetime.fromisoformat(fitted_at)).total_seconds() / 3600
+        return bool(Config.ANOMALY_REFIT_HOURS) and age_hours >= Config.ANOMALY_REFIT_HOURS
+    
+    def _run_partitions(self, tasks):
+        """Fit/score partitions, concurrently in a process pool when worthwhile"""
+        workers = Config.DETECT_WORKERS if self.workers is None else self.workers
+        if workers <= 1 or len(tasks) <= 1:
+            return [fit_and_score_partition(*task, n_jobs=Config.ANOMALY_N_JOBS) for task in tasks]
         
-        detector = IsolationForest(contamination=0.1, random_state=42)
-        anomalies = detector.fit_predict(scores)
+        if self._pool is None:
+            # spawn: safe even when called from the daemon's worker threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        futures = [self._pool.submit(fit_and_score_partition, *task) for task in tasks]
+        return [future.result() for future in futures]
+    
+    def _load_posts(self, where='', params=()):
+        """Columnar batch of processed posts; text is reduced to its keyword segment while streaming"""
+        return PostBatch.from_cursor(
+            self.cursor.execute(
+                f'''SELECT id, cluster_id, platform, text AS segment, {FEATURE_SQL}
+                FROM posts_view WHERE engagement_score IS NOT NULL {where}''',
+                params
+            ),
+            schema={'segment': 'category', **FEATURE_SCHEMA},
+            converters={'segment': keyword_segment}
+        )
+    
+    @profile_stage('detect')
+    def detect_anomalies(self, refit=False):
+        """Find viral posts with one anomaly model per platform/keyword partition
         
-        viral_posts = []
-        for i, post in enumerate(posts):
-            if anomalies[i] == -1:
-                post_id, platform, text, cleaned_text, engagement, sentiment_label, sentiment_score = post
-                viral_posts.append((
-                    platform, text, cleaned_text, engagement, 1, float(scores[i][0]), sentiment_label, sentiment_score
-                ))
+        Only posts that changed since the last detection (new clusters, clusters
+        that merged new duplicates) and the current trends are rescored. A
+        partition is refitted on all of its posts when it has no model, its model
+        is older than ANOMALY_REFIT_HOURS, or it has grown ANOMALY_REFIT_GROWTH
+        times since the fit. refit=True refits and rescores everything.
+        """
+        # Input watermark: the last raw post id processing has reached
+        watermark = self.ledger.last_watermark('process')
+        previous = self.ledger.last_watermark('detect')
+        if not refit and watermark and watermark == previous:
+            print("ℹ️ No new processing runs since last detection")
+            return []
+        incremental = not refit and 0 < previous < watermark
         
-        if viral_posts:
-            self.cursor.execute('DELETE FROM trends')
-            self.cursor.executemany(
-                '''INSERT INTO trends 
-                (platform, text, cleaned_text, engagement_score, is_viral, anomaly_score, sentiment_label, sentiment_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                viral_posts
+        if incremental:
+            posts = self._load_posts(
+                '''AND (id IN (SELECT post_id FROM trends)
+                OR cluster_id IN (SELECT cluster_id FROM posts_raw WHERE id > ? AND id <= ?))''',
+                (previous, watermark)
             )
-            self.conn.commit()
-            print(f"🚨 Found {len(viral_posts)} viral trends!")
+        else:
+            posts = self._load_posts()
+            if len(posts) < 5:
+                print("⚠️ Not enough data for anomaly detection")
+                return []
+        
+        models = {} if refit else self.load_anomaly_models()
+        fits = {} if refit else self.load_model_fits()
+        now = datetime.now()
+        partitions = partition_indices(posts) if len(posts) else {}
+        features = batch_feature_matrix(posts)
         
+        stale = {label for label in partitions if self._needs_refit(label, models, fits, now)}
+        all_posts, all_partitions, all_features = posts, partitions, features
+        if incremental and stale:
+            # A refit trains on every post of the partition, not just the changed ones
+            all_posts = self._load_posts()
+            all_partitions = partition_indices(all_posts)
+            all_features = batch_feature_matrix(all_posts)
+        
+        tasks = []
+        rows = {}
+        for label, indices in partitions.items():
+            if label in stale:
+                indices = all_partitions[label]
+                if len(indices) < Config.PARTITION_MIN_ROWS:
+                    print(f"⚠️ Skipping partition {label} ({len(indices)} posts)")
+                    continue
+                rows[label] = len(indices)
+                tasks.append((label, all_posts['id'][indices], all_features[indices], None))
+                continue
+            # Posts whose cluster is newer than the last detection are new to the partition
+            rows[label] = (fits[label][1] + int((posts['cluster_id'][indices] > previous).sum())
+                           if incremental else len(indices))
+            tasks.append((label, posts['id'][indices], features[indices], models[label]))
+        
+        with self.ledger.run('detect', previous) as run:
+            run.watermark_end = watermark
+            run.input_count = sum(len(task[1]) for task in tasks)
+            viral_posts = []
+            refitted = False
+            for label, post_ids, scores, model, fitted in self._run_partitions(tasks):
+                self.anomaly_models[label] = model
+                if fitted:
+                    refitted = True
+                    fits[label] = (rows[label], rows[label], now.isoformat())
+                else:
+                    fits[label] = (fits[label][0], rows[label], fits[label][2])
+                viral = scores < 0
+                viral_posts.extend(
+                    (post_id, score, label, run.id)
+                    for post_id, score in zip(post_ids[viral].tolist(), scores[viral].tolist())
+                )
+            if refitted:
+                self.save_anomaly_models()
+            self.save_model_fits({label: fits[label] for label in rows if label in fits})
+            
+            if viral_posts:
+                # Swap in the new run and drop older ones in one transaction, so
+                # readers see either the previous trends or the new ones, never none
+                self.cursor.executemany(
+                    'INSERT INTO trends (post_id, anomaly_score, partition_label, run_id) VALUES (?, ?, ?, ?)',
+                    viral_posts
+                )
+                self.cursor.execute('DELETE FROM trends WHERE run_id != ?', (run.id,))
+            # Lifecycle entities advance in the same transaction as the trends
+            lifecycle = self.tracker.update(run.id, viral_posts)
+            run.output_count = len(viral_posts)
+        
+        if viral_posts:
+            print(f"🚨 Found {len(viral_posts)} viral trends across {len(tasks)} partitions "
+                  f"({run.input_count} posts scored, {len(stale & set(rows))} refitted)!")
+        if lifecycle:
+            print("📈 Trend lifecycle: " + ", ".join(
+                f"{lifecycle[state]} {state}" for state in TREND_STATES if state in lifecycle
+            ))
         return viral_posts
     
     def get_trends(self, limit=10):
-        """Get top viral trends"""
+        """Get top viral trends (most anomalous decision score first)"""
         trends = self.cursor.execute(
-            'SELECT * FROM trends ORDER BY anomaly_score DESC LIMIT ?',
+            '''SELECT id, post_id, text, platform, engagement_score, anomaly_score,
+                      sentiment_label, sentiment_score, partition_label, run_id
+            FROM trends_view ORDER BY anomaly_score ASC LIMIT ?''',
             (limit,)
         ).fetchall()
         return trends
     
     def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
         self.conn.close()
 
 if __name__ == "__main__":
     detector = TrendDetector()
     detector.train_lda()
-    detector.detect_anomalies()
+    detector.detect_anomalies(refit='--refit' in sys.argv)
     detector.close()
@@ -0,0 +1,114 @@
+"""Shared NLP Resources for Social Trend Detector
+
+Loads NLTK corpora and heavy models lazily, once per process. Corpora are
+verified against the local nltk_data path only. The downloader is never
+called unless NLTK_AUTO_DOWNLOAD=1 opts in; by default a missing corpus
+raises LookupError with the command that installs it.
+"""
+
+import importlib
+import logging
+import os
+from functools import lru_cache
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# nltk.data resource paths for each downloadable package we use
+CORPORA = {
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+    'omw-1.4': 'corpora/omw-1.4',
+    'vader_lexicon': 'sentiment/vader_lexicon.zip',
+}
+
+HEAVY_MODULES = ['numpy', 'textblob', 'gensim', 'sklearn.ensemble']
+
+
+def auto_download_enabled() -> bool:
+    """Whether missing corpora may be fetched from the network (opt-in)."""
+    return os.getenv('NLTK_AUTO_DOWNLOAD', '0').lower() in ('1', 'true', 'yes')
+
+
+def ensure_corpora(names: Iterable[str]):
+    """Make sure NLTK packages are available locally.
+
+    Args:
+        names: Package names from CORPORA
+
+    Raises:
+        LookupError: If a package is missing and auto-download is disabled
+    """
+    import nltk
+
+    for name in names:
+        path = CORPORA[name]
+        try:
+            nltk.data.find(path)
+            continue
+        except LookupError:
+            # Zipped corpora are found by their archive name
+            try:
+                nltk.data.find(f'{path}.zip')
+                continue
+            except LookupError:
+                pass
+
+        if not auto_download_enabled():
+            raise LookupError(
+                f"NLTK resource '{name}' not found locally "
+                f"(run: python -m nltk.downloader {name})"
+            )
+        logger.warning(f"NLTK resource '{name}' not found. Downloading...")
+        nltk.download(name, quiet=True)
+
+
+@lru_cache(maxsize=None)
+def get_stop_words() -> frozenset:
+    """English stopword set, loaded on first use."""
+    ensure_corpora(['stopwords'])
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    """Shared WordNet lemmatizer, loaded on first use."""
+    ensure_corpora(['wordnet', 'omw-1.4'])
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer()
+
+
+@lru_cache(maxsize=None)
+def get_vader():
+    """Shared VADER analyzer, loaded on first use."""
+    ensure_corpora(['vader_lexicon'])
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+
+def preload(sentiment: bool = True, models: bool = True):
+    """Load corpora and heavy modules up front.
+
+    Call this in a parent process before forking workers so the loaded
+    lexicons and module pages are shared copy-on-write by every child.
+
+    Args:
+        sentiment: Also build the configured sentiment backend
+        models: Also import numpy/gensim/sklearn/TextBlob
+    """
+    get_stop_words()
+    # WordNet is itself lazy; one lemmatize call forces it into memory
+    get_lemmatizer().lemmatize('trends')
+    if sentiment:
+        from sentiment_backends import get_backend
+        get_backend()
+    if models:
+        for module in HEAVY_MODULES:
+            importlib.import_module(module)
+
+    # Objects loaded so far never get freed; keep the GC from touching
+    # (and so un-sharing) their pages in forked children
+    import gc
+    gc.freeze()
+    logger.info("NLP resources preloaded")
@@ -0,0 +1,300 @@
+"""Continuous Pipeline Daemon for Social Trend Detector
+
+Runs ingestion, processing and trend detection as independent stage loops
+connected by bounded queues, plus an hourly retention loop. Each stage owns
+one long-lived worker object (and its SQLite connection), so NLTK corpora
+and models are loaded once and kept warm for the lifetime of the daemon.
+
+The ingest stage only generates mock posts when ``MOCK_INGEST`` is set;
+otherwise posts come from bulk ingestion and processing runs on its
+interval. Stage connections use WAL mode and a busy timeout, so the stages
+and the API can share one database file.
+"""
+
+import logging
+import queue
+import signal
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def create_status_table(conn: sqlite3.Connection):
+    """Create the table the daemon uses to publish stage health."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS pipeline_status (
+        stage TEXT PRIMARY KEY,
+        status TEXT,
+        interval REAL,
+        last_run TEXT,
+        last_count INTEGER,
+        total_count INTEGER,
+        error TEXT,
+        updated_at TEXT
+    )''')
+    conn.commit()
+
+
+def read_pipeline_status(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    """Read stage health rows, flagging stages that stopped heartbeating.
+
+    Args:
+        conn: Open database connection
+
+    Returns:
+        Dictionary keyed by stage name; empty if the daemon never ran
+    """
+    try:
+        rows = conn.execute(
+            'SELECT stage, status, interval, last_run, last_count, total_count, error, updated_at '
+            'FROM pipeline_status'
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+
+    now = datetime.now()
+    stages = {}
+    for stage, status, interval, last_run, last_count, total_count, error, updated_at in rows:
+        age = (now - datetime.fromisoformat(updated_at)).total_seconds()
+        if status == 'running' and age > 3 * (interval or 0) + 60:
+            status = 'stale'
+        stages[stage] = {
+            'status': status,
+            'last_run': last_run,
+            'last_count': last_count,
+            'total_count': total_count,
+            'error': error,
+            'seconds_since_heartbeat': round(age, 1)
+        }
+    return stages
+
+
+def configure_connection(conn: sqlite3.Connection):
+    """Enable WAL and a busy timeout on a stage connection.
+
+    WAL lets readers (the API, other stages) proceed while one stage
+    writes; the timeout makes concurrent writers wait instead of failing
+    with 'database is locked'.
+    """
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA busy_timeout = {int(Config.SQLITE_BUSY_TIMEOUT_MS)}')
+
+
+class StageLoop(threading.Thread):
+    """One pipeline stage running on its own interval.
+
+    The worker object is built inside the thread because sqlite3
+    connections are bound to the thread that created them.
+    """
+
+    def __init__(self, name: str, interval: float, factory: Callable,
+                 step: Callable, stop_event: threading.Event,
+                 inbox: Optional[queue.Queue] = None,
+                 outbox: Optional[queue.Queue] = None):
+        super().__init__(name=f'stage-{name}', daemon=True)
+        self.stage = name
+        self.interval = interval
+        self.factory = factory
+        self.step = step
+        self.stop_event = stop_event
+        self.inbox = inbox
+        self.outbox = outbox
+        self.total = 0
+
+    def _wait_for_work(self) -> int:
+        """Block until upstream signals or the interval elapses.
+
+        Returns:
+            Number of upstream rows announced since the last run
+        """
+        if self.inbox is None:
+            self.stop_event.wait(self.interval)
+            return 0
+
+        pending = 0
+        try:
+            pending += self.inbox.get(timeout=self.interval)
+        except queue.Empty:
+            return 0
+        # Coalesce any signals that piled up while we were busy
+        while True:
+            try:
+                pending += self.inbox.get_nowait()
+            except queue.Empty:
+                return pending
+
+    def wake(self):
+        """Interrupt a pending inbox wait so the loop sees stop_event."""
+        if self.inbox is None:
+            return
+        try:
+            # A zero-count signal; a full inbox already wakes the loop
+            self.inbox.put_nowait(0)
+        except queue.Full:
+            pass
+
+    def _signal_downstream(self, count: int):
+        if self.outbox is None or not count:
+            return
+        try:
+            self.outbox.put(count, timeout=1)
+        except queue.Full:
+            # Rows live in SQLite, so downstream will still pick them up
+            logger.warning(f"{self.stage}: downstream queue full, signal dropped")
+
+    def _heartbeat(self, conn: sqlite3.Connection, status: str,
+                   count: int = 0, error: Optional[str] = None):
+        now = datetime.now().isoformat()
+        conn.execute(
+            '''INSERT INTO pipeline_status
+            (stage, status, interval, last_run, last_count, total_count, error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(stage) DO UPDATE SET
+                status = excluded.status,
+                interval = excluded.interval,
+                last_run = COALESCE(excluded.last_run, last_run),
+                last_count = excluded.last_count,
+                total_count = excluded.total_count,
+                error = excluded.error,
+                updated_at = excluded.updated_at''',
+            (self.stage, status, self.interval, now if count else None,
+             count, self.total, error, now)
+        )
+        conn.commit()
+
+    def run(self):
+        worker = self.factory()
+        configure_connection(worker.conn)
+        create_status_table(worker.conn)
+        self._heartbeat(worker.conn, 'running')
+        logger.info(f"{self.stage} stage started (interval={self.interval}s)")
+
+        run_now = True
+        try:
+            while not self.stop_event.is_set():
+                pending = 0 if run_now else self._wait_for_work()
+                if self.stop_event.is_set():
+                    break
+                try:
+                    count, more = self.step(worker, pending)
+                    self.total += count
+                    self._heartbeat(worker.conn, 'running', count)
+                    self._signal_downstream(count)
+                    # Drain backlog without sleeping when a batch came back full
+                    run_now = more
+                except Exception as e:
+                    logger.error(f"{self.stage} stage failed: {e}")
+                    try:
+                        self._heartbeat(worker.conn, 'error', error=str(e))
+                    except sqlite3.Error as heartbeat_error:
+                        # A locked database must not kill the stage thread
+                        logger.error(f"{self.stage}: could not record failure: {heartbeat_error}")
+                    run_now = False
+        finally:
+            self._heartbeat(worker.conn, 'stopped')
+            worker.close()
+            logger.info(f"{self.stage} stage stopped")
+
+
+class PipelineDaemon:
+    """Long-running ingestion -> processing -> detection pipeline."""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        self.stop_event = threading.Event()
+        self.stages = []
+
+    def _ingest(self, ingestor, pending):
+        count = ingestor.create_mock_data(
+            num_posts=Config.INGEST_BATCH_SIZE, skip_if_exists=False
+        )
+        return count, False
+
+    def _process(self, processor, pending):
+        count = processor.process_batch(limit=Config.PROCESS_BATCH_SIZE)
+        return count, count >= Config.PROCESS_BATCH_SIZE
+
+    def _detect(self, detector, pending):
+        # Every processed batch signals detection, so topics follow their own
+        # age/growth schedule; in between the saved model is reused
+        if detector.lda_needs_retrain():
+            detector.train_lda()
+        elif detector.lda_model is None:
+            detector.load_lda()
+        return len(detector.detect_anomalies()), False
+
+    def _retain(self, manager, pending):
+        from retention import ARCHIVABLE_TABLES
+        results = manager.run()
+        return sum(count for key, count in results.items() if key in ARCHIVABLE_TABLES), False
+
+    def build_stages(self):
+        """Wire stage loops together with bounded queues."""
+        from ingestor import SocialIngestor
+        from processor import TextProcessor
+        from ml_model import TrendDetector
+        from retention import RetentionManager
+
+        to_process = queue.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+        to_detect = queue.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+
+        self.stages = [
+            StageLoop('process', Config.PROCESS_INTERVAL,
+                      lambda: TextProcessor(self.db_path), self._process,
+                      self.stop_event, inbox=to_process, outbox=to_detect),
+            StageLoop('detect', Config.DETECT_INTERVAL,
+                      lambda: TrendDetector(self.db_path), self._detect,
+                      self.stop_event, inbox=to_detect),
+            StageLoop('retention', Config.RETENTION_INTERVAL,
+                      lambda: RetentionManager(self.db_path), self._retain,
+                      self.stop_event),
+        ]
+        if Config.MOCK_INGEST:
+            self.stages.insert(0, StageLoop('ingest', Config.INGEST_INTERVAL,
+                                            lambda: SocialIngestor(self.db_path), self._ingest,
+                                            self.stop_event, outbox=to_process))
+        return self.stages
+
+    def start(self):
+        if not self.stages:
+            self.build_stages()
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout: float = 30):
+        """Ask every stage to finish its current batch and exit."""
+        self.stop_event.set()
+        # Inbox waits can last a whole stage interval (DETECT_INTERVAL)
+        for stage in self.stages:
+            stage.wake()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def run_forever(self):
+        """Run until SIGINT/SIGTERM, then shut down gracefully."""
+        def handle_signal(signum, frame):
+            logger.info(f"Received signal {signum}, shutting down...")
+            self.stop_event.set()
+
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+
+        print("🔁 Pipeline daemon running (Ctrl+C to stop)...")
+        self.start()
+        while not self.stop_event.is_set():
+            self.stop_event.wait(1)
+        self.stop()
+        print("✅ Pipeline daemon stopped")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    PipelineDaemon().run_forever()
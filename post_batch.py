@@ -0,0 +1,197 @@
+"""Columnar Post Batches for Social Trend Detector
+
+Pipeline stages used to hold every selected row as a Python tuple of boxed
+ints, floats and strings. A PostBatch stores each column once instead:
+NumPy arrays for numbers and timestamps, small-integer codes for repeated
+strings such as platform, and a plain list only for free text. Rows are
+read with ``fetchmany`` so at most one chunk of tuples exists at a time,
+and stages pass the batch (or index arrays into it) along without copying.
+"""
+
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+# Storage kind per known column name; anything else is kept as text
+POST_SCHEMA = {
+    'id': 'int',
+    'cluster_id': 'int',
+    'likes': 'int',
+    'retweets': 'int',
+    'score': 'int',
+    'num_comments': 'int',
+    'word_count': 'int',
+    'engagement_score': 'float',
+    'sentiment_score': 'float',
+    'anomaly_score': 'float',
+    'platform': 'category',
+    'sentiment_label': 'category',
+}
+
+_DTYPES = {'int': 'int64', 'float': 'float64', 'datetime': 'datetime64[us]'}
+
+
+def _numeric(values, dtype):
+    """Array from a column chunk; NULL counts as 0, as it always has for features and sums."""
+    import numpy as np
+
+    try:
+        column = np.array(values, dtype=dtype)
+    except TypeError:
+        return np.array([0 if value is None else value for value in values], dtype=dtype)
+    if column.dtype.kind == 'f':
+        column[np.isnan(column)] = 0
+    return column
+
+
+class PostRecord:
+    """Read-only view of one row of a PostBatch; attributes are column values."""
+
+    __slots__ = ('_batch', '_index')
+
+    def __init__(self, batch: 'PostBatch', index: int):
+        self._batch = batch
+        self._index = index
+
+    def __getattr__(self, name):
+        try:
+            return self._batch.value(name, self._index)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={self._batch.value(name, self._index)!r}'
+                           for name in self._batch.names)
+        return f'PostRecord({fields})'
+
+
+class PostBatch:
+    """Column-oriented set of posts."""
+
+    def __init__(self, columns: Dict, kinds: Dict[str, str],
+                 categories: Optional[Dict[str, List]] = None):
+        self.columns = columns
+        self.kinds = kinds
+        self.categories = categories or {}
+        self.names = list(columns)
+
+    @classmethod
+    def from_cursor(cls, cursor, schema: Optional[Dict[str, str]] = None,
+                    converters: Optional[Dict[str, Callable]] = None,
+                    chunk_size: int = 10000) -> 'PostBatch':
+        """Drain an executed cursor into columns, one fetchmany chunk at a time.
+
+        Args:
+            cursor: Executed cursor; column names come from its description
+            schema: Overrides for POST_SCHEMA kinds ('int', 'float',
+                'datetime', 'category' or 'text')
+            converters: Per-column functions applied to each value first,
+                e.g. to reduce a text column to a category
+            chunk_size: Rows fetched per round trip
+
+        Returns:
+            PostBatch with one column per selected field
+        """
+        import numpy as np
+
+        names = [column[0] for column in cursor.description]
+        kinds = {name: (schema or {}).get(name, POST_SCHEMA.get(name, 'text')) for name in names}
+        converters = converters or {}
+
+        chunks = {name: [] for name in names}
+        codes = {name: {} for name in names if kinds[name] == 'category'}
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for name, values in zip(names, zip(*rows)):
+                if name in converters:
+                    values = [converters[name](value) for value in values]
+                kind = kinds[name]
+                if kind == 'text':
+                    chunks[name].extend(values)
+                elif kind == 'category':
+                    lookup = codes[name]
+                    chunks[name].append(np.fromiter(
+                        (lookup.setdefault(value, len(lookup)) for value in values),
+                        dtype=np.int32, count=len(values)
+                    ))
+                elif kind == 'datetime':
+                    chunks[name].append(np.array([value or 'NaT' for value in values],
+                                                 dtype=_DTYPES[kind]))
+                else:
+                    chunks[name].append(_numeric(values, _DTYPES[kind]))
+
+        columns = {}
+        for name in names:
+            kind = kinds[name]
+            if kind == 'text':
+                columns[name] = chunks[name]
+            elif chunks[name]:
+                columns[name] = np.concatenate(chunks[name])
+            else:
+                columns[name] = np.empty(0, dtype=np.int32 if kind == 'category' else _DTYPES[kind])
+            chunks[name] = None
+        categories = {name: list(lookup) for name, lookup in codes.items()}
+        return cls(columns, kinds, categories)
+
+    def __len__(self):
+        return len(self.columns[self.names[0]]) if self.names else 0
+
+    def __getitem__(self, name):
+        """Raw column: array, category codes, or list of text."""
+        return self.columns[name]
+
+    def __iter__(self) -> Iterator[PostRecord]:
+        for index in range(len(self)):
+            yield PostRecord(self, index)
+
+    def record(self, index: int) -> PostRecord:
+        return PostRecord(self, index)
+
+    def value(self, name: str, index: int):
+        """One cell as a plain Python value."""
+        column = self.columns[name]
+        kind = self.kinds[name]
+        if kind == 'text':
+            return column[index]
+        if kind == 'category':
+            return self.categories[name][column[index]]
+        return column[index].item()
+
+    def decoded(self, name: str) -> List:
+        """A category column as a list of its values."""
+        labels = self.categories[name]
+        return [labels[code] for code in self.columns[name].tolist()]
+
+    def is_value(self, name: str, value):
+        """Boolean mask of rows whose category column equals ``value``."""
+        import numpy as np
+
+        labels = self.categories[name]
+        if value not in labels:
+            return np.zeros(len(self), dtype=bool)
+        return self.columns[name] == labels.index(value)
+
+    def take(self, indices: Sequence[int]) -> 'PostBatch':
+        """Subset of rows (numeric columns are gathered, categories shared)."""
+        import numpy as np
+
+        indices = np.asarray(indices, dtype=np.int64)
+        columns = {}
+        for name, column in self.columns.items():
+            if self.kinds[name] == 'text':
+                columns[name] = [column[i] for i in indices.tolist()]
+            else:
+                columns[name] = column[indices]
+        return PostBatch(columns, self.kinds, self.categories)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns, text included."""
+        import sys
+
+        total = 0
+        for name, column in self.columns.items():
+            if self.kinds[name] == 'text':
+                total += sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+            else:
+                total += column.nbytes
+        return total
@@ -1,20 +1,38 @@
+import json
 import sqlite3
-import nltk
 import re
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from textblob import TextBlob
-
-nltk.download('stopwords', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('omw-1.4', quiet=True)
+import sys
+from config import Config
+from dedup import Deduplicator
+from doc_matrix import DocumentMatrix
+from vector_index import VectorIndex
+from ingestor import create_tables, insert_processed_rows
+from nlp_resources import get_stop_words, get_lemmatizer
+from post_batch import PostBatch
+from profiling import profile_stage
+from rollups import rebuild_rollups, update_rollups
+from run_ledger import RunLedger
+from sentiment_backends import get_backend
+from vocabulary import Vocabulary
 
 class TextProcessor:
-    def __init__(self):
-        self.conn = sqlite3.connect('trends.db')
+    def __init__(self, db_path='trends.db', doc_matrix_dir=None, vector_index_dir=None):
+        self.conn = sqlite3.connect(db_path)
         self.cursor = self.conn.cursor()
-        self.stop_words = set(stopwords.words('english'))
-        self.lemmatizer = WordNetLemmatizer()
+        create_tables(self.conn)
+        self.stop_words = get_stop_words()
+        self.lemmatizer = get_lemmatizer()
+        self.sentiment = get_backend()
+        self.deduplicator = None
+        if Config.DEDUP_ENABLED:
+            self.deduplicator = Deduplicator(
+                self.conn, num_perm=Config.DEDUP_NUM_PERM,
+                bands=Config.DEDUP_BANDS, threshold=Config.DEDUP_THRESHOLD
+            )
+        self.vocabulary = Vocabulary(self.conn)
+        self.ledger = RunLedger(self.conn)
+        self.doc_matrix = DocumentMatrix(doc_matrix_dir)
+        self.vector_index = VectorIndex(vector_index_dir)
     
     def clean_text(self, text):
         """Clean text: remove URLs, mentions, special chars, lemmatize"""
@@ -28,19 +46,9 @@ class TextProcessor:
                 if w.lower() not in self.stop_words and len(w) > 2]
         return ' '.join(words)
     
-    def analyze_sentiment(self, text):
-        """Analyze sentiment using TextBlob"""
-        if not text:
-            return "neutral", 0.0
-        blob = TextBlob(text)
-        polarity = blob.sentiment.polarity
-        if polarity > 0.1:
-            label = "positive"
-        elif polarity < -0.1:
-            label = "negative"
-        else:
-            label = "neutral"
-        return label, polarity
+    def analyze_sentiment(self, text, tokens=None):
+        """Analyze sentiment with the configured backend (Config.SENTIMENT_BACKEND)"""
+        return self.sentiment.analyze(text, tokens)
     
     def compute_engagement(self, platform, likes, retweets, score, comments):
         """Calculate engagement score"""
@@ -49,46 +57,156 @@ class TextProcessor:
         else:
             return score + comments
     
-    def process_batch(self):
-        """Process raw posts -> cleaned posts"""
-        raw_posts = self.cursor.execute(
-            'SELECT id, platform, text, created_at, timestamp, likes, retweets, score, num_comments FROM posts_raw WHERE processed = 0'
-        ).fetchall()
+    def batch_engagement(self, batch):
+        """Vectorized compute_engagement over a PostBatch"""
+        import numpy as np
         
-        if not raw_posts:
-            print("ℹ️ No new posts to process")
-            return
+        return np.where(
+            batch.is_value('platform', 'twitter'),
+            batch['likes'] + 2 * batch['retweets'],
+            batch['score'] + batch['num_comments']
+        )
+    
+    def _apply_batch(self, raw_posts):
+        """Cluster, clean and store one PostBatch inside the caller's transaction"""
+        import numpy as np
+        
+        ids = raw_posts['id']
+        if self.deduplicator:
+            assignments = self.deduplicator.assign(zip(ids.tolist(), raw_posts['text']))
+            cluster_of = np.fromiter((assignments[post_id] for post_id in ids.tolist()),
+                                     dtype=np.int64, count=len(ids))
+        else:
+            cluster_of = ids
+        engagement = self.batch_engagement(raw_posts)
+        
+        # Aggregate engagement per near-duplicate cluster, column by column
+        cluster_ids, first, inverse = np.unique(cluster_of, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        totals = {}
+        for name, values in (('likes', raw_posts['likes']), ('retweets', raw_posts['retweets']),
+                             ('score', raw_posts['score']), ('num_comments', raw_posts['num_comments']),
+                             ('engagement', engagement)):
+            total = np.zeros(len(cluster_ids), dtype=np.int64)
+            np.add.at(total, inverse, values)
+            totals[name] = total.tolist()
+        sizes = np.bincount(inverse, minlength=len(cluster_ids)).tolist()
+        # created_at is nullable; fall back to the ingest time, and skip rows with neither
+        created = [created_at if created_at is not None else timestamp
+                   for created_at, timestamp in zip(raw_posts['created_at'], raw_posts['timestamp'])]
+        earliest = [None] * len(cluster_ids)
+        for cluster, created_at in zip(inverse.tolist(), created):
+            if created_at is not None and (earliest[cluster] is None or created_at < earliest[cluster]):
+                earliest[cluster] = created_at
+        
+        cluster_ids = cluster_ids.tolist()
+        existing = dict(self.cursor.execute(
+            'SELECT cluster_id, sentiment_score FROM posts_processed WHERE cluster_id IN (SELECT value FROM json_each(?))',
+            (json.dumps(cluster_ids),)
+        ).fetchall())
         
+        sentiments = [None] * len(cluster_ids)
         processed = []
-        for post in raw_posts:
-            post_id, platform, text, created_at, timestamp, likes, retweets, score, num_comments = post
+        merged = []
+        # Clusters in order of first appearance, as rows were ingested
+        for cluster in np.argsort(first, kind='stable').tolist():
+            cluster_id = cluster_ids[cluster]
+            counts = (totals['likes'][cluster], totals['retweets'][cluster], totals['score'][cluster],
+                      totals['num_comments'][cluster], totals['engagement'][cluster])
+            if cluster_id in existing:
+                sentiments[cluster] = existing[cluster_id]
+                merged.append((earliest[cluster], *counts, sizes[cluster], cluster_id))
+                continue
             
-            cleaned_text = self.clean_text(text)
-            engagement = self.compute_engagement(platform, likes, retweets, score, num_comments)
+            # Heavy NLP runs once per cluster, on its first post
+            post = raw_posts.record(first[cluster])
+            cleaned_text = self.clean_text(post.text)
             word_count = len(cleaned_text.split()) if cleaned_text else 0
-            sentiment_label, sentiment_score = self.analyze_sentiment(text)
+            sentiment_label, sentiment_score = self.analyze_sentiment(post.text, cleaned_text.split())
+            sentiments[cluster] = sentiment_score
             
+            # Text stays in posts_raw (row cluster_id); cleaned text is stored as token ids
             processed.append((
-                platform, text, cleaned_text, created_at, timestamp, 
-                likes, retweets, score, num_comments, engagement, word_count, sentiment_label, sentiment_score
+                post.platform, self.vocabulary.encode(cleaned_text), earliest[cluster], post.timestamp,
+                *counts, word_count, sentiment_label, sentiment_score, cluster_id, sizes[cluster]
             ))
         
+        insert_processed_rows(self.cursor, processed)
+        
+        self.cursor.executemany(
+            '''UPDATE posts_processed SET
+                created_at = MIN(created_at, ?),
+                likes = likes + ?, retweets = retweets + ?, score = score + ?,
+                num_comments = num_comments + ?, engagement_score = engagement_score + ?,
+                cluster_size = cluster_size + ?
+            WHERE cluster_id = ?''',
+            merged
+        )
+        
         self.cursor.executemany(
-            '''INSERT INTO posts_processed 
-            (platform, text, cleaned_text, created_at, timestamp, likes, retweets, score, num_comments, engagement_score, word_count, sentiment_label, sentiment_score)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-            processed
+            'UPDATE posts_raw SET processed = 1, cluster_id = ? WHERE id = ?',
+            zip(cluster_of.tolist(), ids.tolist())
         )
         
-        self.cursor.execute('UPDATE posts_raw SET processed = 1')
-        self.conn.commit()
+        # Rollups count every raw post, scored with its cluster's sentiment
+        update_rollups(self.cursor, zip(
+            raw_posts.decoded('platform'), created, engagement.tolist(),
+            (sentiments[cluster] for cluster in inverse.tolist())
+        ))
+        return len(cluster_ids), processed, merged
+    
+    @profile_stage('process')
+    def process_batch(self, limit=None):
+        """Process raw posts -> cleaned posts"""
+        query = 'SELECT id, platform, text, created_at, timestamp, likes, retweets, score, num_comments FROM posts_raw WHERE processed = 0 ORDER BY id'
+        params = ()
+        if limit:
+            query += ' LIMIT ?'
+            params = (limit,)
+        raw_posts = PostBatch.from_cursor(self.cursor.execute(query, params))
         
-        print(f"✅ Processed {len(processed)} posts")
+        if not len(raw_posts):
+            print("ℹ️ No new posts to process")
+            self.sync_doc_matrix()
+            return 0
+        
+        # Flags, clusters, processed rows and rollups commit together with the
+        # ledger entry; a failed batch rolls back and is simply picked up again
+        try:
+            with self.ledger.run('process') as run:
+                run.input_count = len(raw_posts)
+                run.watermark_end = int(raw_posts['id'][-1])
+                clusters, processed, merged = self._apply_batch(raw_posts)
+                run.output_count = len(processed)
+        except Exception:
+            # Token ids registered in the rolled-back transaction are gone too
+            self.vocabulary.reset()
+            raise
+        self.sync_doc_matrix()
+        
+        print(f"✅ Processed {len(raw_posts)} posts into {clusters} clusters "
+              f"({len(processed)} new, {len(merged)} merged)")
+        return len(raw_posts)
+    
+    def rebuild_rollups(self):
+        """Recompute time-series rollups from all processed raw posts"""
+        count = rebuild_rollups(self.conn, self.compute_engagement)
+        print(f"✅ Rebuilt rollups from {count} posts")
+        return count
+    
+    def sync_doc_matrix(self):
+        """Hash newly processed posts into the shared document-term matrix and vector index"""
+        added = self.doc_matrix.sync(self.conn)
+        self.vector_index.sync(self.doc_matrix)
+        return added
     
     def close(self):
         self.conn.close()
 
 if __name__ == "__main__":
     processor = TextProcessor()
-    processor.process_batch()
+    if '--rebuild-rollups' in sys.argv:
+        processor.rebuild_rollups()
+    else:
+        processor.process_batch()
     processor.close()
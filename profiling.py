@@ -0,0 +1,183 @@
+"""Opt-in Stage Profiling for Social Trend Detector
+
+Set ``PROFILE`` (or pass ``python main.py --profile``) to profile every
+pipeline stage call:
+
+- ``cpu``: cProfile, written to ``<stage>-run<id>.prof``
+- ``memory``: tracemalloc, written to ``<stage>-run<id>.snapshot``
+- ``cpu,memory``: both
+
+Files go to ``Config.PROFILE_DIR``. ``<id>`` is the ledger run the call
+recorded; stages without one (LDA, retention, empty batches) use a
+timestamp. Each call prints its top ``Config.PROFILE_TOP`` functions by
+self time and allocation sites by size. Open ``.prof`` files with snakeviz
+or ``python -m pstats``, and snapshots with ``tracemalloc.Snapshot.load``.
+
+``PROFILE`` is parsed once, when this module is imported (or by
+``configure`` for ``--profile``), so an invalid value fails at startup.
+When it is unset, a stage call costs one attribute check. Only one
+stage is profiled at a time: a stage that starts while another is being
+profiled (a nested call, or a concurrent daemon stage) runs unprofiled.
+"""
+
+import cProfile
+import functools
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional
+
+from config import Config
+
+MODES = ('cpu', 'memory')
+
+_lock = threading.Lock()
+_session: Optional[List[Dict]] = None
+
+# Profiler bookkeeping would otherwise top the allocation list
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+)
+
+
+def parse_modes(value: str) -> FrozenSet[str]:
+    """Profiling modes from a PROFILE value ('1'/'all'/'true' mean both).
+
+    Raises:
+        ValueError: For an unknown mode
+    """
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'false', 'off'):
+        return frozenset()
+    if value in ('1', 'true', 'on', 'all'):
+        return frozenset(MODES)
+    modes = frozenset(mode.strip() for mode in value.split(',') if mode.strip())
+    unknown = modes - set(MODES)
+    if unknown:
+        raise ValueError(f"Unknown profile mode(s): {', '.join(sorted(unknown))}")
+    return modes
+
+
+def configure(value: Optional[str] = None) -> FrozenSet[str]:
+    """Parse a PROFILE value (default: ``Config.PROFILE``) into ``Config.PROFILE_MODES``.
+
+    Raises:
+        ValueError: For an unknown mode
+    """
+    if value is None:
+        value = Config.PROFILE
+    modes = parse_modes(value)
+    Config.PROFILE, Config.PROFILE_MODES = value, modes
+    return modes
+
+
+def profile_stage(stage: str) -> Callable:
+    """Decorate a stage method so it is profiled when PROFILE is set."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not Config.PROFILE_MODES:
+                return method(self, *args, **kwargs)
+            return _run_profiled(stage, self, method, args, kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_session() -> Iterator[List[Dict]]:
+    """Collect the results of every stage profiled inside the block."""
+    global _session
+    previous, _session = _session, []
+    try:
+        yield _session
+    finally:
+        _session = previous
+
+
+def _run_profiled(stage, owner, method, args, kwargs):
+    modes = Config.PROFILE_MODES
+    if not modes or not _lock.acquire(blocking=False):
+        return method(owner, *args, **kwargs)
+
+    ledger = getattr(owner, 'ledger', None)
+    previous_run = getattr(ledger, 'last_run', None)
+    profiler = cProfile.Profile() if 'cpu' in modes else None
+    trace_memory = 'memory' in modes and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start(Config.PROFILE_FRAMES)
+    started = time.perf_counter()
+    try:
+        if profiler:
+            profiler.enable()
+        try:
+            return method(owner, *args, **kwargs)
+        finally:
+            if profiler:
+                profiler.disable()
+    finally:
+        elapsed = time.perf_counter() - started
+        snapshot = peak = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        run = getattr(ledger, 'last_run', None)
+        run_id = run.id if run is not None and run is not previous_run else None
+        try:
+            _report(stage, run_id, elapsed, profiler, snapshot, peak)
+        finally:
+            _lock.release()
+
+
+def _report(stage: str, run_id: Optional[int], elapsed: float, profiler: Optional[cProfile.Profile],
+            snapshot: Optional[tracemalloc.Snapshot], peak: Optional[int]) -> Dict:
+    """Write the profile files for one stage call and print its top-N summary."""
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    suffix = f'run{run_id}' if run_id is not None else datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    base = os.path.join(Config.PROFILE_DIR, f'{stage}-{suffix}')
+    result = {'stage': stage, 'run_id': run_id, 'seconds': elapsed,
+              'cpu_path': None, 'memory_path': None, 'peak_mib': None}
+    top = Config.PROFILE_TOP
+
+    print(f"⏱️ Profiled {stage} (run {run_id if run_id is not None else '-'}) in {elapsed:.2f}s")
+    if profiler is not None:
+        result['cpu_path'] = f'{base}.prof'
+        profiler.dump_stats(result['cpu_path'])
+        stats = pstats.Stats(profiler)
+        hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        for (file, line, function), (_, calls, self_time, cumulative, _) in hottest:
+            print(f"   {self_time * 1000:>9.1f}ms self {cumulative * 1000:>9.1f}ms cum "
+                  f"{calls:>8} calls  {os.path.basename(file)}:{line}({function})")
+    if snapshot is not None:
+        result['memory_path'] = f'{base}.snapshot'
+        result['peak_mib'] = peak / (1024 * 1024)
+        snapshot.dump(result['memory_path'])
+        print(f"   peak {result['peak_mib']:.1f} MiB; largest allocations still held:")
+        for stat in snapshot.statistics('lineno')[:top]:
+            frame = stat.traceback[0]
+            print(f"   {stat.size / 1024:>9.1f} KiB {stat.count:>8} blocks  "
+                  f"{os.path.basename(frame.filename)}:{frame.lineno}")
+
+    if _session is not None:
+        _session.append(result)
+    return result
+
+
+def print_session_summary(results: List[Dict]):
+    """One line per profiled stage, slowest first."""
+    if not results:
+        return
+    print(f"\n⏱️ Profile summary ({Config.PROFILE_DIR}):")
+    for result in sorted(results, key=lambda r: r['seconds'], reverse=True):
+        peak = f"{result['peak_mib']:>8.1f} MiB peak" if result['peak_mib'] is not None else ''
+        files = ', '.join(os.path.basename(path) for path in (result['cpu_path'], result['memory_path']) if path)
+        print(f"   {result['stage']:<8} {result['seconds']:>8.2f}s {peak}  {files}")
+
+
+configure()
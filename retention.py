@@ -0,0 +1,330 @@
+"""Retention and Archival for Social Trend Detector
+
+Moves rows older than a per-table window out of the hot SQLite tables into
+compressed JSONL archives partitioned by day, then returns the freed pages
+to the OS with incremental VACUUM. Rollup tables are never pruned, so
+time-series history survives archival. Detections of archived posts are
+archived with them and their trend entities are detached from the post.
+Document-matrix segments and vector-index chunks are pruned down to the
+posts still in the database, so archived posts stop feeding LDA and
+/similar.
+
+Incremental VACUUM needs a one-time conversion of the database (a full
+VACUUM under an exclusive lock), which is an explicit step:
+``python retention.py --enable-incremental-vacuum``.
+
+Archives are zstd-compressed when the optional ``zstandard`` package is
+installed and gzip-compressed otherwise. Both formats allow appending a
+new frame/member, so re-archiving the same day just extends its file.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Tuple
+
+from config import Config
+from doc_matrix import DocumentMatrix
+from ingestor import create_tables
+from profiling import profile_stage
+from vector_index import VectorIndex
+from vocabulary import Vocabulary
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Table -> extra WHERE clause restricting which old rows may be archived.
+# Processed posts read their text from the cluster's first raw post, so
+# that raw row stays until its processed row has been archived.
+ARCHIVABLE_TABLES = {
+    'posts_processed': '1 = 1',
+    'posts_raw': 'processed = 1 AND id NOT IN (SELECT cluster_id FROM posts_processed WHERE cluster_id IS NOT NULL)',
+}
+
+
+def archive_extension() -> str:
+    return '.jsonl.zst' if zstandard else '.jsonl.gz'
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data)
+
+
+def read_archive(path: str) -> Iterator[Dict]:
+    """Yield archived rows from one day file (all appended frames)."""
+    if path.endswith('.zst'):
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            data = reader.read()
+    else:
+        with gzip.open(path, 'rb') as f:
+            data = f.read()
+    for line in data.splitlines():
+        if line:
+            yield json.loads(line)
+
+
+class RetentionManager:
+    """Archives expired rows and compacts the database."""
+
+    def __init__(self, db_path: str = None, archive_dir: str = None,
+                 doc_matrix_dir: str = None, vector_index_dir: str = None):
+        self.conn = sqlite3.connect(db_path or Config.DATABASE_PATH)
+        self.conn.row_factory = sqlite3.Row
+        self.archive_dir = archive_dir or Config.ARCHIVE_DIR
+        self.doc_matrix_dir = doc_matrix_dir
+        self.vector_index_dir = vector_index_dir
+        self.vocabulary = Vocabulary(self.conn)
+        create_tables(self.conn)
+
+    def incremental_vacuum_enabled(self) -> bool:
+        return self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+    def enable_incremental_vacuum(self) -> bool:
+        """Switch the database to incremental auto-vacuum.
+
+        Rewrites the whole file with a full VACUUM under an exclusive lock,
+        so it is run by hand (``--enable-incremental-vacuum``), never by
+        the daemon.
+
+        Returns:
+            Whether incremental auto-vacuum is now enabled
+        """
+        if not self.incremental_vacuum_enabled():
+            self.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            try:
+                self.conn.execute('VACUUM')
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not enable incremental vacuum: {e}")
+        return self.incremental_vacuum_enabled()
+
+    def windows(self) -> Dict[str, int]:
+        """Retention window in days per table (0 keeps rows forever), in archive order."""
+        return {
+            'posts_processed': Config.RETENTION_POSTS_PROCESSED_DAYS,
+            'posts_raw': Config.RETENTION_POSTS_RAW_DAYS,
+        }
+
+    def _write_archive(self, table: str, rows_by_day: Dict[str, list]):
+        directory = os.path.join(self.archive_dir, table)
+        os.makedirs(directory, exist_ok=True)
+        for day, rows in rows_by_day.items():
+            payload = ''.join(json.dumps(row, default=str) + '\n' for row in rows)
+            path = os.path.join(directory, day + archive_extension())
+            with open(path, 'ab') as f:
+                f.write(_compress(payload.encode('utf-8')))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def archive_table(self, table: str, days: int, now: datetime = None,
+                      batch_size: int = None) -> int:
+        """Archive and delete rows of one table older than ``days``.
+
+        Rows are written (and fsynced) to the archive before they are
+        deleted, so a crash can at worst archive a batch twice.
+
+        Returns:
+            Number of rows archived
+        """
+        if days <= 0:
+            return 0
+        batch_size = batch_size or Config.RETENTION_BATCH_SIZE
+        cutoff = ((now or datetime.now()) - timedelta(days=days)).isoformat()
+        condition = ARCHIVABLE_TABLES[table]
+
+        archived = 0
+        while True:
+            rows = self.conn.execute(
+                f'SELECT * FROM {table} WHERE created_at < ? AND {condition} ORDER BY id LIMIT ?',
+                (cutoff, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+
+            rows_by_day = {}
+            for row in rows:
+                record = dict(row)
+                if 'tokens' in record:
+                    # Token ids only mean something next to this database's vocabulary
+                    tokens = record.pop('tokens')
+                    if tokens is not None:
+                        record['cleaned_text'] = self.vocabulary.decode(tokens)
+                rows_by_day.setdefault(row['created_at'][:10], []).append(record)
+            self._write_archive(table, rows_by_day)
+            if table == 'posts_processed':
+                self._archive_detections(rows)
+
+            with self.conn:
+                self.conn.executemany(f'DELETE FROM {table} WHERE id = ?',
+                                      [(row['id'],) for row in rows])
+                if table == 'posts_processed':
+                    self._release_posts([row['id'] for row in rows])
+                    self._forget_clusters([row['cluster_id'] for row in rows])
+            archived += len(rows)
+        return archived
+
+    def _archive_detections(self, rows):
+        """Archive the trends rows of archived posts, under their post's day."""
+        days = {row['id']: row['created_at'][:10] for row in rows}
+        detections = self.conn.execute(
+            'SELECT * FROM trends WHERE post_id IN (SELECT value FROM json_each(?)) ORDER BY id',
+            (json.dumps(list(days)),)
+        ).fetchall()
+        rows_by_day = {}
+        for detection in detections:
+            rows_by_day.setdefault(days[detection['post_id']], []).append(dict(detection))
+        self._write_archive('trends', rows_by_day)
+
+    def _release_posts(self, post_ids):
+        """Drop archived posts' detections and detach their trend entities.
+
+        Entities keep their lifecycle history; the API reports a trend
+        without a post as gone.
+        """
+        selected = json.dumps(post_ids)
+        self.conn.execute('DELETE FROM trends WHERE post_id IN (SELECT value FROM json_each(?))', (selected,))
+        self.conn.execute(
+            'UPDATE trend_entities SET post_id = NULL WHERE post_id IN (SELECT value FROM json_each(?))',
+            (selected,)
+        )
+
+    def _forget_clusters(self, cluster_ids):
+        """Drop dedup signatures of archived clusters; they can no longer absorb duplicates."""
+        has_dedup = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dedup_clusters'"
+        ).fetchone()
+        cluster_ids = [cluster_id for cluster_id in cluster_ids if cluster_id is not None]
+        if not has_dedup or not cluster_ids:
+            return
+        # One pass per table: dedup_buckets is only indexed by (band, bucket)
+        selected = json.dumps(cluster_ids)
+        for dedup_table in ('dedup_clusters', 'dedup_buckets'):
+            self.conn.execute(
+                f'DELETE FROM {dedup_table} WHERE cluster_id IN (SELECT value FROM json_each(?))',
+                (selected,)
+            )
+
+    def prune_runs(self, days: int, now: datetime = None) -> int:
+        """Delete finished ledger rows older than ``days``, keeping each stage's last completed run.
+
+        Returns:
+            Number of runs deleted
+        """
+        if days <= 0:
+            return 0
+        cutoff = ((now or datetime.now()) - timedelta(days=days)).isoformat()
+        with self.conn:
+            cursor = self.conn.execute(
+                '''DELETE FROM pipeline_runs WHERE started_at < ? AND status != 'running'
+                AND id NOT IN (SELECT MAX(id) FROM pipeline_runs WHERE status = 'completed' GROUP BY stage)''',
+                (cutoff,)
+            )
+        return cursor.rowcount
+
+    def prune_trends(self, days: int, now: datetime = None) -> int:
+        """Delete expired trend entities last seen more than ``days`` ago, with their history.
+
+        Returns:
+            Number of trend entities deleted
+        """
+        if days <= 0:
+            return 0
+        cutoff = ((now or datetime.now()) - timedelta(days=days)).isoformat()
+        expired = "SELECT id FROM trend_entities WHERE state = 'expired' AND last_seen_at < ?"
+        with self.conn:
+            self.conn.execute(f'DELETE FROM trend_history WHERE entity_id IN ({expired})', (cutoff,))
+            cursor = self.conn.execute(f'DELETE FROM trend_entities WHERE id IN ({expired})', (cutoff,))
+        return cursor.rowcount
+
+    def surviving_documents(self) -> Tuple:
+        """Sorted posts_processed ids still in the database, and the highest id assigned.
+
+        The sequence is read first, so a post inserted in between has a
+        higher id and is never mistaken for an archived one.
+        """
+        import numpy as np
+
+        row = self.conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'posts_processed'"
+        ).fetchone()
+        up_to = row[0] if row else 0
+        ids = np.fromiter(
+            (doc_id for doc_id, in self.conn.execute(
+                'SELECT id FROM posts_processed WHERE id <= ? ORDER BY id', (up_to,)
+            )),
+            dtype=np.int64
+        )
+        return ids, up_to
+
+    def prune_documents(self) -> int:
+        """Drop archived posts from the document-term matrix and vector index.
+
+        Prunes by the set of surviving ids, since posts are archived by
+        created_at and a backfill can archive ids above ones that remain.
+
+        Returns:
+            Number of documents dropped from the matrix
+        """
+        keep_ids, up_to = self.surviving_documents()
+        if not up_to:
+            return 0
+        VectorIndex(self.vector_index_dir).prune(keep_ids, up_to)
+        return DocumentMatrix(self.doc_matrix_dir).prune(keep_ids, up_to)
+
+    def compact(self, pages: int = None) -> int:
+        """Release free pages with incremental VACUUM (a no-op until it is enabled).
+
+        Returns:
+            Number of free pages released
+        """
+        if not self.incremental_vacuum_enabled():
+            return 0
+        pages = Config.RETENTION_VACUUM_PAGES if pages is None else pages
+        before = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        self.conn.execute(f'PRAGMA incremental_vacuum({int(pages)})' if pages else 'PRAGMA incremental_vacuum')
+        after = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return before - after
+
+    @profile_stage('retain')
+    def run(self, now: datetime = None) -> Dict[str, int]:
+        """Archive every table past its window, then compact."""
+        results = {}
+        for table, days in self.windows().items():
+            results[table] = self.archive_table(table, days, now=now)
+        results['runs_pruned'] = self.prune_runs(Config.RETENTION_RUNS_DAYS, now=now)
+        results['trends_pruned'] = self.prune_trends(Config.RETENTION_RUNS_DAYS, now=now)
+        results['documents_pruned'] = self.prune_documents()
+        results['pages_released'] = self.compact()
+
+        archived = sum(count for table, count in results.items() if table in ARCHIVABLE_TABLES)
+        print(f"🗄️ Archived {archived} rows, released {results['pages_released']} pages")
+        return results
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive expired rows and compact the database')
+    parser.add_argument('db', nargs='?', default=None, help='Database path (default: DATABASE_PATH)')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='Convert the database to incremental auto-vacuum (full VACUUM, exclusive lock) and exit')
+    args = parser.parse_args()
+
+    manager = RetentionManager(args.db)
+    if args.enable_incremental_vacuum:
+        enabled = manager.enable_incremental_vacuum()
+        print("✅ Incremental vacuum enabled" if enabled else "⚠️ Incremental vacuum not enabled (database busy?)")
+    else:
+        manager.run()
+    manager.close()
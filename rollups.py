@@ -0,0 +1,155 @@
+"""Time-Series Rollups for Social Trend Detector
+
+Per-platform post counts, engagement and sentiment pre-aggregated into
+minute, hour and day buckets. The processing stage folds each batch in
+with upserts, so chart queries read only the buckets in range instead of
+scanning posts and parsing ``created_at``.
+"""
+
+import sqlite3
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Bucket key = ISO created_at truncated to this many characters
+GRANULARITIES = {
+    'minute': 16,   # 2024-01-01T10:05
+    'hour': 13,     # 2024-01-01T10
+    'day': 10,      # 2024-01-01
+}
+
+
+def create_rollup_tables(cursor, prefix: str = 'rollup'):
+    """Rollup tables: ``rollup_*`` for this database's posts, ``global_rollup_*`` for shard merges."""
+    for granularity in GRANULARITIES:
+        cursor.execute(f'''CREATE TABLE IF NOT EXISTS {prefix}_{granularity} (
+            bucket TEXT,
+            platform TEXT,
+            post_count INTEGER,
+            engagement_sum REAL,
+            engagement_max REAL,
+            sentiment_sum REAL,
+            PRIMARY KEY (bucket, platform)
+        ) WITHOUT ROWID''')
+
+
+def update_rollups(cursor, posts: Iterable[Tuple[str, str, float, float]]):
+    """Fold a batch of posts into every rollup table.
+
+    Args:
+        cursor: Cursor inside the caller's transaction
+        posts: (platform, created_at, engagement, sentiment_score) per post;
+            read once, so a generator over batch columns is fine
+    """
+    buckets: Dict[str, Dict[Tuple[str, str], List[float]]] = {
+        granularity: {} for granularity in GRANULARITIES
+    }
+    for platform, created_at, engagement, sentiment in posts:
+        if not created_at:
+            continue
+        engagement = engagement or 0
+        sentiment = sentiment or 0
+        for granularity, width in GRANULARITIES.items():
+            agg = buckets[granularity].setdefault((created_at[:width], platform), [0, 0.0, engagement, 0.0])
+            agg[0] += 1
+            agg[1] += engagement
+            agg[2] = max(agg[2], engagement)
+            agg[3] += sentiment
+
+    for granularity, aggregates in buckets.items():
+        cursor.executemany(
+            f'''INSERT INTO rollup_{granularity}
+            (bucket, platform, post_count, engagement_sum, engagement_max, sentiment_sum)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(bucket, platform) DO UPDATE SET
+                post_count = post_count + excluded.post_count,
+                engagement_sum = engagement_sum + excluded.engagement_sum,
+                engagement_max = MAX(engagement_max, excluded.engagement_max),
+                sentiment_sum = sentiment_sum + excluded.sentiment_sum''',
+            [(bucket, platform, *agg) for (bucket, platform), agg in aggregates.items()]
+        )
+
+
+def rebuild_rollups(conn: sqlite3.Connection, compute_engagement: Callable) -> int:
+    """Recompute all rollups from processed raw posts (backfill/repair).
+
+    Only posts still in ``posts_raw`` are counted, so buckets whose posts
+    were archived by retention lose their history on a rebuild. Posts
+    without created_at are bucketed by their ingest timestamp, as in
+    process_batch.
+
+    Args:
+        conn: Open database connection
+        compute_engagement: TextProcessor.compute_engagement
+
+    Returns:
+        Number of posts aggregated
+    """
+    cursor = conn.cursor()
+    rows = cursor.execute(
+        '''SELECT r.platform, COALESCE(r.created_at, r.timestamp), r.likes, r.retweets, r.score, r.num_comments,
+                  p.sentiment_score
+        FROM posts_raw r LEFT JOIN posts_processed p ON p.cluster_id = r.cluster_id
+        WHERE r.processed = 1'''
+    ).fetchall()
+    posts = [
+        (platform, created_at,
+         compute_engagement(platform, likes, retweets, score, comments), sentiment)
+        for platform, created_at, likes, retweets, score, comments, sentiment in rows
+    ]
+    for granularity in GRANULARITIES:
+        cursor.execute(f'DELETE FROM rollup_{granularity}')
+    update_rollups(cursor, posts)
+    conn.commit()
+    return len(posts)
+
+
+def query_timeseries(conn: sqlite3.Connection, granularity: str,
+                     platform: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None, limit: int = 500,
+                     prefix: str = 'rollup') -> List[Dict]:
+    """Read buckets in [since, until) from one rollup table.
+
+    Without ``since`` the most recent ``limit`` buckets are returned.
+    ``prefix='global_rollup'`` reads the merged view of sharded processing.
+
+    Raises:
+        ValueError: For an unknown granularity
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    width = GRANULARITIES[granularity]
+
+    conditions, params = [], []
+    if since:
+        conditions.append('bucket >= ?')
+        params.append(since[:width])
+    if until:
+        # A bucket key sorts before ``until`` exactly when the bucket starts before it
+        conditions.append('bucket < ?')
+        params.append(until)
+    if platform:
+        conditions.append('platform = ?')
+        params.append(platform)
+
+    query = (f'SELECT bucket, platform, post_count, engagement_sum, engagement_max, sentiment_sum '
+             f'FROM {prefix}_{granularity}')
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    # Newest-first when unbounded so LIMIT keeps the latest buckets
+    query += ' ORDER BY bucket ASC, platform' if since else ' ORDER BY bucket DESC, platform'
+    query += ' LIMIT ?'
+    params.append(limit)
+
+    rows = conn.execute(query, params).fetchall()
+    if not since:
+        rows = sorted(rows, key=lambda row: (row[0], row[1]))
+    return [
+        {
+            'bucket': bucket,
+            'platform': row_platform,
+            'post_count': count,
+            'engagement_sum': engagement_sum,
+            'engagement_max': engagement_max,
+            'sentiment_mean': sentiment_sum / count if count else 0.0
+        }
+        for bucket, row_platform, count, engagement_sum, engagement_max, sentiment_sum in rows
+    ]
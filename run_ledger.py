@@ -0,0 +1,122 @@
+"""Pipeline Run Ledger for Social Trend Detector
+
+Every stage run is recorded in ``pipeline_runs`` with the input watermark
+it started from, the watermark it reached, its row counts, duration and
+final status. A run's work and its 'completed' row are committed in the
+same transaction, so the ledger never claims work that was rolled back,
+and a rerun after a crash resumes from the last completed watermark.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+
+def create_run_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS pipeline_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        stage TEXT,
+        status TEXT,
+        watermark_start INTEGER,
+        watermark_end INTEGER,
+        input_count INTEGER,
+        output_count INTEGER,
+        started_at TEXT,
+        finished_at TEXT,
+        duration_s REAL,
+        error TEXT
+    )''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pipeline_runs_stage ON pipeline_runs (stage, status)')
+
+
+class StageRun:
+    """Mutable record of an in-progress run; the stage fills in the outcome."""
+
+    def __init__(self, run_id: int, stage: str, watermark_start: int):
+        self.id = run_id
+        self.stage = stage
+        self.watermark_start = watermark_start
+        self.watermark_end = watermark_start
+        self.input_count = 0
+        self.output_count = 0
+
+
+class RunLedger:
+    """Records stage runs in the pipeline_runs table."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        # Most recently started run, for callers wrapping a stage (e.g. profiling)
+        self.last_run = None
+
+    def last_watermark(self, stage: str) -> int:
+        """Watermark reached by the latest completed run of a stage (0 if none)."""
+        row = self.conn.execute(
+            "SELECT watermark_end FROM pipeline_runs WHERE stage = ? AND status = 'completed' "
+            "ORDER BY id DESC LIMIT 1", (stage,)
+        ).fetchone()
+        return (row[0] or 0) if row else 0
+
+    def last_run_id(self, stage: str) -> int:
+        """Id of the latest completed run of a stage (0 if none)."""
+        row = self.conn.execute(
+            "SELECT MAX(id) FROM pipeline_runs WHERE stage = ? AND status = 'completed'", (stage,)
+        ).fetchone()
+        return row[0] or 0
+
+    @contextmanager
+    def run(self, stage: str, watermark: Optional[int] = None) -> Iterator[StageRun]:
+        """Record one transactional stage run.
+
+        The body must not commit; on success the stage's writes and the
+        'completed' ledger row are committed together. On error the work
+        is rolled back, the run is marked 'failed' and the error re-raised.
+
+        Args:
+            stage: Stage name
+            watermark: Input watermark; defaults to the last completed one
+        """
+        if watermark is None:
+            watermark = self.last_watermark(stage)
+        started = time.perf_counter()
+        cursor = self.conn.execute(
+            "INSERT INTO pipeline_runs (stage, status, watermark_start, started_at) VALUES (?, 'running', ?, ?)",
+            (stage, watermark, datetime.now().isoformat())
+        )
+        # Committed up front so crashed runs stay visible as 'running'
+        self.conn.commit()
+        record = StageRun(cursor.lastrowid, stage, watermark)
+        self.last_run = record
+
+        try:
+            yield record
+        except BaseException as e:
+            self.conn.rollback()
+            self._finish(record, 'failed', started, error=str(e) or type(e).__name__)
+            self.conn.commit()
+            raise
+        self._finish(record, 'completed', started)
+        self.conn.commit()
+
+    def _finish(self, record: StageRun, status: str, started: float, error: str = None):
+        self.conn.execute(
+            '''UPDATE pipeline_runs SET status = ?, watermark_end = ?, input_count = ?,
+            output_count = ?, finished_at = ?, duration_s = ?, error = ? WHERE id = ?''',
+            (status, record.watermark_end, record.input_count, record.output_count,
+             datetime.now().isoformat(), round(time.perf_counter() - started, 6), error, record.id)
+        )
+
+    def history(self, stage: str = None, limit: int = 20) -> List[Dict]:
+        """Most recent runs first, optionally for one stage."""
+        query = 'SELECT * FROM pipeline_runs'
+        params = []
+        if stage:
+            query += ' WHERE stage = ?'
+            params.append(stage)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        cursor = self.conn.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -1,13 +1,13 @@
 """Sentiment Analysis Module for Social Trend Detector
 
 Provides emotion detection and sentiment scoring for social media posts
-using NLTK's VADER (Valence Aware Dictionary and sEntiment Reasoner).
+using the backend configured in Config.SENTIMENT_BACKEND (VADER by default),
+the same one the processing stage uses.
 """
 
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from typing import Dict, List
 import logging
+from sentiment_backends import get_backend
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,15 +17,14 @@ logger = logging.getLogger(__name__)
 class SentimentAnalyzer:
     """Analyzes sentiment and emotion in social media posts."""
     
-    def __init__(self):
-        """Initialize the sentiment analyzer with VADER."""
-        try:
-            self.sia = SentimentIntensityAnalyzer()
-            logger.info("Sentiment analyzer initialized successfully")
-        except LookupError:
-            logger.warning("VADER lexicon not found. Downloading...")
-            nltk.download('vader_lexicon', quiet=True)
-            self.sia = SentimentIntensityAnalyzer()
+    def __init__(self, backend: str = None):
+        """Initialize the sentiment analyzer.
+        
+        Args:
+            backend: Backend name; defaults to Config.SENTIMENT_BACKEND
+        """
+        self.backend = get_backend(backend)
+        logger.info(f"Sentiment analyzer initialized with {self.backend.name} backend")
     
     def analyze_sentiment(self, text: str) -> Dict[str, float]:
         """Analyze sentiment of a single text.
@@ -43,24 +42,18 @@ class SentimentAnalyzer:
         if not text or not isinstance(text, str):
             return {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
         
-        scores = self.sia.polarity_scores(text)
-        return scores
+        return self.backend.polarity_scores(text)
     
     def classify_sentiment(self, compound_score: float) -> str:
         """Classify sentiment based on compound score.
         
         Args:
-            compound_score: VADER compound score (-1 to 1)
+            compound_score: Compound score (-1 to 1)
             
         Returns:
             Sentiment label: 'positive', 'negative', or 'neutral'
         """
-        if compound_score >= 0.05:
-            return 'positive'
-        elif compound_score <= -0.05:
-            return 'negative'
-        else:
-            return 'neutral'
+        return self.backend.label(compound_score)
     
     def analyze_batch(self, texts: List[str]) -> List[Dict]:
         """Analyze sentiment for multiple texts.
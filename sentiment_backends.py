@@ -0,0 +1,153 @@
+"""Sentiment Backends for Social Trend Detector
+
+A single scoring interface over interchangeable engines, so the processing
+stage and the API label posts the same way. The backend is chosen with
+``Config.SENTIMENT_BACKEND``:
+
+- ``vader``: NLTK VADER compound score, labelled at +/-0.05
+- ``textblob``: TextBlob pattern polarity, labelled at +/-0.1
+- ``lexicon``: flat dict lookup over already-cleaned tokens, VADER-scaled.
+  No parsing, negation or intensifier rules, in exchange for throughput.
+"""
+
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+from nlp_resources import get_vader
+
+_WORD = re.compile(r"[a-z']+")
+
+
+class SentimentBackend:
+    """Base class: subclasses implement score(); labels come from the threshold."""
+
+    name = None
+    threshold = 0.05
+
+    def score(self, text: str, tokens: Optional[Sequence[str]] = None) -> float:
+        """Polarity in [-1, 1].
+
+        Args:
+            text: Original post text
+            tokens: Cleaned tokens, if the caller already has them
+        """
+        raise NotImplementedError
+
+    def label(self, score: float) -> str:
+        if score >= self.threshold:
+            return 'positive'
+        if score <= -self.threshold:
+            return 'negative'
+        return 'neutral'
+
+    def analyze(self, text: str, tokens: Optional[Sequence[str]] = None) -> Tuple[str, float]:
+        """(label, score) for one post; empty text is neutral."""
+        if not text:
+            return 'neutral', 0.0
+        score = self.score(text, tokens)
+        return self.label(score), score
+
+    def analyze_batch(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        return [self.analyze(text) for text in texts]
+
+    def polarity_scores(self, text: str) -> Dict[str, float]:
+        """VADER-style score dict; backends without pos/neg parts derive them."""
+        score = self.score(text) if text else 0.0
+        return {
+            'neg': max(-score, 0.0),
+            'neu': 1.0 - abs(score),
+            'pos': max(score, 0.0),
+            'compound': score
+        }
+
+
+class VaderBackend(SentimentBackend):
+    name = 'vader'
+    threshold = 0.05
+
+    def __init__(self):
+        self.sia = get_vader()
+
+    def score(self, text, tokens=None):
+        return self.sia.polarity_scores(text)['compound']
+
+    def polarity_scores(self, text):
+        if not text:
+            return {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
+        return self.sia.polarity_scores(text)
+
+
+class TextBlobBackend(SentimentBackend):
+    name = 'textblob'
+    threshold = 0.1
+
+    def __init__(self):
+        from textblob import TextBlob
+        self._blob = TextBlob
+
+    def score(self, text, tokens=None):
+        return self._blob(text).sentiment.polarity
+
+
+@lru_cache(maxsize=None)
+def compile_lexicon() -> Dict[str, float]:
+    """Word -> VADER-scale valence (-4..4).
+
+    Uses VADER's lexicon when the corpus is installed, otherwise TextBlob's
+    bundled lexicon (sense-averaged polarity, scaled from -1..1).
+    """
+    try:
+        return {word.lower(): float(valence) for word, valence in get_vader().lexicon.items()}
+    except LookupError:
+        from textblob.en import sentiment as textblob_lexicon
+        textblob_lexicon.load()
+        return {
+            word.lower(): senses[None][0] * 4
+            for word, senses in textblob_lexicon.items()
+            if None in senses and senses[None][0]
+        }
+
+
+class LexiconBackend(SentimentBackend):
+    name = 'lexicon'
+    threshold = 0.05
+    # VADER's normalization constant: maps summed valence into (-1, 1)
+    alpha = 15
+
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None):
+        self.lexicon = compile_lexicon() if lexicon is None else lexicon
+        self._valence = self.lexicon.get
+
+    def score(self, text, tokens=None):
+        if tokens is None:
+            tokens = _WORD.findall(text.lower())
+        valence = self._valence
+        total = 0.0
+        for token in tokens:
+            total += valence(token, 0.0)
+        if not total:
+            return 0.0
+        return total / math.sqrt(total * total + self.alpha)
+
+
+BACKENDS = {
+    'vader': VaderBackend,
+    'textblob': TextBlobBackend,
+    'lexicon': LexiconBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: str = None) -> SentimentBackend:
+    """Shared backend instance; defaults to Config.SENTIMENT_BACKEND.
+
+    Raises:
+        ValueError: For an unknown backend name
+    """
+    name = name or Config.SENTIMENT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend '{name}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
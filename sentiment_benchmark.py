@@ -0,0 +1,96 @@
+"""Sentiment Backend Benchmark for Social Trend Detector
+
+Scores a fixed corpus of short social posts with every available backend,
+reporting throughput (posts/sec) and how often each backend's labels agree
+with the others. The lexicon backend is timed on pre-tokenized text, as it
+runs in the processing stage on already-cleaned tokens.
+
+Run with: python sentiment_benchmark.py [--repeat 200]
+"""
+
+import argparse
+import re
+import time
+
+from sentiment_backends import BACKENDS, get_backend
+
+CORPUS = [
+    "I absolutely love this new AI model, it's amazing!",
+    "This update is terrible and the app keeps crashing.",
+    "Python 3.13 release notes are out.",
+    "Great talk on data science today, learned a lot",
+    "Worst customer support ever. Totally disappointed.",
+    "The conference starts at 9am in room B.",
+    "Huge thanks to the team, fantastic work on the launch!",
+    "ML hype is getting ridiculous and annoying",
+    "New breakthrough in tech: faster chips announced",
+    "I hate waiting for builds, so slow and frustrating",
+    "Happy to share that our paper was accepted!",
+    "Server outage again. This is a disaster.",
+    "Reading the documentation for the new API",
+    "Beautiful visualization, really clear and helpful",
+    "Ugh, broken dependencies ruined my whole day",
+    "The meetup moved to Thursday.",
+    "Brilliant idea, I'm excited to try it",
+    "Sad to see the project abandoned",
+    "Data pipeline finished in 12 minutes",
+    "This benchmark is misleading and wrong",
+    "Love the clean design of this library",
+    "Pricing changes are awful for small teams",
+    "Tutorial on gradient boosting posted",
+    "Wow, incredible results on the leaderboard!",
+    "Security flaw exposes user data, very bad news",
+    "Weekly tech digest is here",
+    "Such a fun hackathon, great people",
+    "Angry about the license change",
+    "Model weights uploaded to the hub",
+    "Not impressed, the demo failed twice",
+]
+
+_WORD = re.compile(r"[a-z']+")
+
+
+def available_backends():
+    """Instantiate every backend whose resources are installed."""
+    backends = {}
+    for name in BACKENDS:
+        try:
+            backends[name] = get_backend(name)
+        except LookupError as e:
+            print(f"{name:<9} unavailable: {str(e).splitlines()[0] if str(e) else e}")
+    return backends
+
+
+def run_benchmark(repeat: int):
+    print(f"\n=== Sentiment backends ({len(CORPUS)} posts x {repeat}) ===")
+    backends = available_backends()
+    texts = CORPUS * repeat
+    tokens = [_WORD.findall(text.lower()) for text in texts]
+
+    labels = {}
+    for name, backend in backends.items():
+        start = time.perf_counter()
+        if name == 'lexicon':
+            results = [backend.analyze(text, toks) for text, toks in zip(texts, tokens)]
+        else:
+            results = [backend.analyze(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        labels[name] = [label for label, _ in results[:len(CORPUS)]]
+        counts = {label: labels[name].count(label) for label in ('positive', 'neutral', 'negative')}
+        print(f"{name:<9} {len(texts) / elapsed:>12,.0f} posts/s  labels {counts}")
+
+    names = list(labels)
+    if len(names) > 1:
+        print("\nLabel agreement")
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                agree = sum(x == y for x, y in zip(labels[a], labels[b])) / len(CORPUS)
+                print(f"{a:>9} vs {b:<9} {agree:6.1%}")
+    return labels
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark sentiment backends')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    run_benchmark(args.repeat)
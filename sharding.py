@@ -0,0 +1,403 @@
+"""Sharded Processing for Social Trend Detector
+
+Raw posts in the primary database are routed by a stable hash of their id
+into ``SHARD_COUNT`` shard workspaces (``SHARD_DIR/shard-NN/``). Each
+shard has its own database, document matrix, vector index and anomaly
+models, whose paths are passed explicitly to each stage (global Config is
+never patched, so in-process shards cannot leak into other threads).
+Shard workers run the normal processing and detection stages in separate
+processes, then summarize their shard as a ShardPartial.
+
+Partials are mergeable: rollups and sentiment totals are summed, hashed
+term counts are added per feature column (every shard hashes terms the
+same way), and each shard's top anomaly candidates are unioned. The
+coordinator reduces all partials, plus one summarizing the primary
+database's own (single-node) posts, and replaces the global view
+(``global_*`` tables, never the primary's own rollups) in one ledger
+transaction. A global top-N is always
+contained in the union of per-shard top-Ns. Near-duplicates that landed
+on different shards are collapsed with MinHash before the candidates are
+stored.
+
+Shard workers also run retention on their workspace, archiving to
+``ARCHIVE_DIR/shard-NN/``.
+
+Run with: python sharding.py [--shards 4] [--workers 4] [--no-detect] [--no-retain]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from typing import Dict, List, Optional
+
+from config import Config
+from ingestor import create_tables
+from rollups import GRANULARITIES, create_rollup_tables
+from run_ledger import RunLedger
+
+RAW_COLUMNS = ('id', 'platform', 'text', 'created_at', 'timestamp', 'likes', 'retweets',
+               'score', 'num_comments')
+
+CANDIDATE_COLUMNS = ('post_id', 'platform', 'text', 'engagement_score', 'anomaly_score',
+                     'sentiment_label', 'sentiment_score', 'partition_label', 'state', 'velocity')
+
+
+def create_global_tables(cursor):
+    """Global view tables in the primary database."""
+    create_rollup_tables(cursor, 'global_rollup')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS global_terms (
+        feature INTEGER PRIMARY KEY,
+        term TEXT,
+        count REAL
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS global_sentiment (
+        platform TEXT,
+        sentiment_label TEXT,
+        post_count INTEGER,
+        score_sum REAL,
+        PRIMARY KEY (platform, sentiment_label)
+    ) WITHOUT ROWID''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS global_trends (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        shard INTEGER,
+        post_id INTEGER,
+        platform TEXT,
+        text TEXT,
+        engagement_score REAL,
+        anomaly_score REAL,
+        sentiment_label TEXT,
+        sentiment_score REAL,
+        partition_label TEXT,
+        state TEXT,
+        velocity REAL,
+        duplicates INTEGER,
+        run_id INTEGER
+    )''')
+
+
+def _dicts(cursor) -> List[Dict]:
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def read_global_view(conn: sqlite3.Connection, limit: int = 10) -> Dict:
+    """Last merge, top terms, sentiment totals and top trends of the global view."""
+    create_global_tables(conn.cursor())
+    merges = _dicts(conn.execute(
+        "SELECT id, input_count, finished_at FROM pipeline_runs "
+        "WHERE stage = 'merge' AND status = 'completed' ORDER BY id DESC LIMIT 1"
+    ))
+    return {
+        'merge': merges[0] if merges else None,
+        'terms': _dicts(conn.execute('SELECT term, count FROM global_terms ORDER BY count DESC LIMIT ?', (limit,))),
+        'sentiment': _dicts(conn.execute('SELECT * FROM global_sentiment ORDER BY platform, sentiment_label')),
+        'trends': _dicts(conn.execute('SELECT * FROM global_trends ORDER BY anomaly_score ASC LIMIT ?', (limit,))),
+    }
+
+
+def shard_of(post_id: int, num_shards: int) -> int:
+    """Shard index for a raw post id; stable across processes and restarts."""
+    return zlib.crc32(int(post_id).to_bytes(8, 'little')) % num_shards
+
+
+def shard_workspace(shard_dir: str, shard: int) -> str:
+    return os.path.join(shard_dir, f'shard-{shard:02d}')
+
+
+def workspace_paths(workspace: str) -> Dict[str, str]:
+    """Model and matrix paths inside a shard workspace, by constructor argument name."""
+    models = os.path.join(workspace, 'models')
+    return {
+        'doc_matrix_dir': os.path.join(models, 'doc_matrix'),
+        'vector_index_dir': os.path.join(models, 'vector_index'),
+        'anomaly_model_path': os.path.join(models, 'anomaly_model.joblib'),
+        'lda_model_dir': os.path.join(models, 'lda'),
+    }
+
+
+class ShardPartial:
+    """Mergeable summary of one or more shards."""
+
+    def __init__(self, shards=None, rollups=None, terms=None, sentiment=None, candidates=None):
+        self.shards = shards or []
+        # (granularity, bucket, platform) -> [post_count, engagement_sum, engagement_max, sentiment_sum]
+        self.rollups: Dict = rollups or {}
+        # hashed feature column -> [count, term]
+        self.terms: Dict = terms or {}
+        # (platform, sentiment_label) -> [post_count, score_sum]
+        self.sentiment: Dict = sentiment or {}
+        self.candidates: List[Dict] = candidates or []
+
+    @classmethod
+    def from_shard(cls, shard: Optional[int], conn: sqlite3.Connection, candidate_limit: int = None,
+                   doc_matrix_dir: str = None) -> 'ShardPartial':
+        """Summarize a shard database and its document matrix.
+
+        With ``shard=None`` this summarizes the primary database's own posts
+        (and ``doc_matrix_dir`` defaults to Config.DOC_MATRIX_DIR).
+        """
+        import numpy as np
+        from doc_matrix import DocumentMatrix
+
+        rollups = {}
+        for granularity in GRANULARITIES:
+            for bucket, platform, *totals in conn.execute(
+                f'SELECT bucket, platform, post_count, engagement_sum, engagement_max, sentiment_sum '
+                f'FROM rollup_{granularity}'
+            ):
+                rollups[(granularity, bucket, platform)] = totals
+
+        doc_matrix = DocumentMatrix(doc_matrix_dir)
+        counts = np.zeros(doc_matrix.n_features)
+        for _, matrix in doc_matrix.iter_segments():
+            counts += np.asarray(matrix.sum(axis=0)).ravel()
+        lookup = doc_matrix.feature_terms(conn)
+        terms = {feature: [float(counts[feature]), lookup.get(feature)] for feature in np.flatnonzero(counts).tolist()}
+
+        # Weighted by cluster size so every raw post counts once
+        sentiment = {
+            (platform, label): [count, score_sum] for platform, label, count, score_sum in conn.execute(
+                '''SELECT platform, sentiment_label, SUM(COALESCE(cluster_size, 1)),
+                          SUM(COALESCE(sentiment_score, 0) * COALESCE(cluster_size, 1))
+                FROM posts_processed GROUP BY platform, sentiment_label'''
+            )
+        }
+
+        limit = Config.SHARD_CANDIDATES if candidate_limit is None else candidate_limit
+        candidates = [
+            dict(zip(CANDIDATE_COLUMNS, row), shard=shard) for row in conn.execute(
+                f'SELECT {", ".join(CANDIDATE_COLUMNS)} FROM trends_view ORDER BY anomaly_score ASC LIMIT ?',
+                (limit,)
+            )
+        ]
+        return cls([] if shard is None else [shard], rollups, terms, sentiment, candidates)
+
+    def merge(self, other: 'ShardPartial') -> 'ShardPartial':
+        """Combine two partials into a new one; associative and commutative."""
+        rollups = {key: list(totals) for key, totals in self.rollups.items()}
+        for key, (count, engagement_sum, engagement_max, sentiment_sum) in other.rollups.items():
+            if key in rollups:
+                totals = rollups[key]
+                totals[0] += count
+                totals[1] += engagement_sum
+                totals[2] = max(totals[2], engagement_max)
+                totals[3] += sentiment_sum
+            else:
+                rollups[key] = [count, engagement_sum, engagement_max, sentiment_sum]
+
+        terms = {feature: list(entry) for feature, entry in self.terms.items()}
+        for feature, (count, term) in other.terms.items():
+            entry = terms.setdefault(feature, [0, term])
+            entry[0] += count
+            entry[1] = entry[1] or term
+
+        sentiment = {key: list(totals) for key, totals in self.sentiment.items()}
+        for key, (count, score_sum) in other.sentiment.items():
+            totals = sentiment.setdefault(key, [0, 0.0])
+            totals[0] += count
+            totals[1] += score_sum
+
+        return ShardPartial(self.shards + other.shards, rollups, terms, sentiment,
+                            self.candidates + other.candidates)
+
+    def top_candidates(self, limit: int = None) -> List[Dict]:
+        """Most anomalous candidates, with cross-shard near-duplicates collapsed."""
+        from dedup import Deduplicator
+
+        ranked = sorted(self.candidates, key=lambda candidate: candidate['anomaly_score'])
+        deduplicator = Deduplicator(sqlite3.connect(':memory:'), num_perm=Config.DEDUP_NUM_PERM,
+                                    bands=Config.DEDUP_BANDS, threshold=Config.DEDUP_THRESHOLD)
+        assignments = deduplicator.assign((i, candidate['text'] or '') for i, candidate in enumerate(ranked))
+        kept = {}
+        for i, candidate in enumerate(ranked):
+            # The most anomalous member represents its cluster
+            kept.setdefault(assignments[i], dict(candidate, duplicates=0))['duplicates'] += 1
+        deduplicator.conn.close()
+        return list(kept.values())[:limit or Config.SHARD_CANDIDATES]
+
+
+def process_shard(shard: int, shard_dir: str, detect: bool = True, retain: bool = True) -> ShardPartial:
+    """Run processing, detection and retention on one shard; runs inside pool workers."""
+    from ml_model import TrendDetector
+    from processor import TextProcessor
+    from retention import RetentionManager
+
+    workspace = shard_workspace(shard_dir, shard)
+    db_path = os.path.join(workspace, 'trends.db')
+    paths = workspace_paths(workspace)
+    processor = TextProcessor(db_path, paths['doc_matrix_dir'], paths['vector_index_dir'])
+    try:
+        processor.process_batch()
+    finally:
+        processor.close()
+    if detect:
+        # Shards already run in parallel; no nested detection pools
+        detector = TrendDetector(db_path, paths['doc_matrix_dir'], paths['lda_model_dir'],
+                                 paths['anomaly_model_path'], workers=1)
+        try:
+            detector.detect_anomalies()
+        finally:
+            detector.close()
+    if retain:
+        manager = RetentionManager(db_path, os.path.join(Config.ARCHIVE_DIR, f'shard-{shard:02d}'),
+                                   paths['doc_matrix_dir'], paths['vector_index_dir'])
+        try:
+            manager.run()
+        finally:
+            manager.close()
+    conn = sqlite3.connect(db_path)
+    try:
+        return ShardPartial.from_shard(shard, conn, doc_matrix_dir=paths['doc_matrix_dir'])
+    finally:
+        conn.close()
+
+
+class ShardCoordinator:
+    """Routes raw posts to shards, runs shard workers and merges their partials."""
+
+    def __init__(self, db_path: str = None, num_shards: int = None, shard_dir: str = None):
+        self.conn = sqlite3.connect(db_path or Config.DATABASE_PATH)
+        create_tables(self.conn)
+        create_global_tables(self.conn.cursor())
+        self.conn.commit()
+        self.ledger = RunLedger(self.conn)
+        self.num_shards = num_shards or Config.SHARD_COUNT
+        self.shard_dir = shard_dir or Config.SHARD_DIR
+
+    def _open_shard(self, shard: int) -> sqlite3.Connection:
+        workspace = shard_workspace(self.shard_dir, shard)
+        os.makedirs(workspace, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(workspace, 'trends.db'))
+        create_tables(conn)
+        return conn
+
+    def route(self, batch_size: int = 10000) -> int:
+        """Copy unrouted raw posts into their shards, keeping their ids.
+
+        Shard inserts are idempotent (INSERT OR IGNORE on the id), so a
+        crash before the primary commits just routes the same rows again.
+
+        Returns:
+            Number of posts routed
+        """
+        shards = [self._open_shard(shard) for shard in range(self.num_shards)]
+        columns = ', '.join(RAW_COLUMNS)
+        insert = (f'INSERT OR IGNORE INTO posts_raw ({columns}, processed) '
+                  f'VALUES ({", ".join("?" * len(RAW_COLUMNS))}, 0)')
+        try:
+            with self.ledger.run('route') as run:
+                cursor = self.conn.execute(
+                    f'SELECT {columns} FROM posts_raw WHERE id > ? AND processed = 0 ORDER BY id',
+                    (run.watermark_start,)
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    routed = [[] for _ in shards]
+                    for row in rows:
+                        routed[shard_of(row[0], self.num_shards)].append(row)
+                    for conn, shard_rows in zip(shards, routed):
+                        conn.executemany(insert, shard_rows)
+                    run.input_count += len(rows)
+                    run.watermark_end = rows[-1][0]
+                for conn in shards:
+                    conn.commit()
+                # Handed off: single-node processing and retention treat them as processed
+                self.conn.execute(
+                    'UPDATE posts_raw SET processed = 1 WHERE id > ? AND id <= ? AND processed = 0',
+                    (run.watermark_start, run.watermark_end)
+                )
+                run.output_count = run.input_count
+        finally:
+            for conn in shards:
+                conn.close()
+        print(f"🔀 Routed {run.output_count} posts across {self.num_shards} shards")
+        return run.output_count
+
+    def process(self, workers: int = None, detect: bool = True, retain: bool = True) -> List[ShardPartial]:
+        """Process every shard, concurrently in a process pool when worthwhile."""
+        workers = Config.SHARD_WORKERS if workers is None else workers
+        shards = range(self.num_shards)
+        if workers <= 1 or self.num_shards <= 1:
+            return [process_shard(shard, self.shard_dir, detect, retain) for shard in shards]
+
+        # spawn: each worker imports its own NLP and model state
+        with ProcessPoolExecutor(max_workers=min(workers, self.num_shards),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(process_shard, shard, self.shard_dir, detect, retain) for shard in shards]
+            return [future.result() for future in futures]
+
+    def merge(self, partials: List[ShardPartial]) -> ShardPartial:
+        """Reduce shard partials and replace the global view in one transaction.
+
+        Posts the primary processed itself (before sharding, or through the
+        daemon) are folded in as one more partial, so the global view covers
+        every post and the primary's own rollups are left untouched.
+        """
+        primary = ShardPartial.from_shard(None, self.conn)
+        merged = reduce(ShardPartial.merge, partials, primary)
+        candidates = merged.top_candidates()
+
+        with self.ledger.run('merge', self.ledger.last_run_id('route')) as run:
+            run.input_count = len(partials)
+            for granularity in GRANULARITIES:
+                self.conn.execute(f'DELETE FROM global_rollup_{granularity}')
+                self.conn.executemany(
+                    f'''INSERT INTO global_rollup_{granularity}
+                    (bucket, platform, post_count, engagement_sum, engagement_max, sentiment_sum)
+                    VALUES (?, ?, ?, ?, ?, ?)''',
+                    [(bucket, platform, *totals)
+                     for (rollup, bucket, platform), totals in merged.rollups.items() if rollup == granularity]
+                )
+            self.conn.execute('DELETE FROM global_terms')
+            self.conn.executemany(
+                'INSERT INTO global_terms (feature, term, count) VALUES (?, ?, ?)',
+                [(feature, term, count) for feature, (count, term) in merged.terms.items()]
+            )
+            self.conn.execute('DELETE FROM global_sentiment')
+            self.conn.executemany(
+                'INSERT INTO global_sentiment (platform, sentiment_label, post_count, score_sum) VALUES (?, ?, ?, ?)',
+                [(platform, label, *totals) for (platform, label), totals in merged.sentiment.items()]
+            )
+            self.conn.execute('DELETE FROM global_trends')
+            self.conn.executemany(
+                f'''INSERT INTO global_trends (shard, {", ".join(CANDIDATE_COLUMNS)}, duplicates, run_id)
+                VALUES (?, {", ".join("?" * len(CANDIDATE_COLUMNS))}, ?, ?)''',
+                [(candidate['shard'], *(candidate[column] for column in CANDIDATE_COLUMNS),
+                  candidate['duplicates'], run.id) for candidate in candidates]
+            )
+            run.output_count = len(candidates)
+
+        print(f"🧩 Merged {len(partials)} shards: {len(merged.terms)} terms, "
+              f"{len(candidates)} trend candidates")
+        return merged
+
+    def run(self, workers: int = None, detect: bool = True, retain: bool = True) -> ShardPartial:
+        """Route, process every shard and merge."""
+        self.route()
+        return self.merge(self.process(workers, detect, retain))
+
+    def global_view(self, limit: int = 10) -> Dict:
+        return read_global_view(self.conn, limit)
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process posts across hash-partitioned shards')
+    parser.add_argument('--db', default=None, help='Primary database (default: DATABASE_PATH)')
+    parser.add_argument('--shards', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-detect', action='store_true')
+    parser.add_argument('--no-retain', action='store_true', help='Skip archiving expired rows in the shards')
+    args = parser.parse_args()
+
+    coordinator = ShardCoordinator(args.db, num_shards=args.shards)
+    coordinator.run(workers=args.workers, detect=not args.no_detect, retain=not args.no_retain)
+    coordinator.close()
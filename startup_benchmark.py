@@ -0,0 +1,87 @@
+"""Startup Benchmark for Social Trend Detector
+
+Measures cold import time of each entry-point module in a fresh
+interpreter, and reports which heavy dependencies each import pulls in.
+
+Run with: python startup_benchmark.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+MODULES = ['config', 'ingestor', 'processor', 'ml_model',
+           'sentiment_analyzer', 'main', 'app', 'app_enhanced']
+
+HEAVY = ['nltk', 'numpy', 'gensim', 'sklearn', 'textblob', 'scipy']
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'heavy': heavy}}))
+'''
+
+
+def measure_import(module: str, repeat: int = 5) -> Dict:
+    """Import a module in fresh interpreters and time it.
+
+    Args:
+        module: Module name to import
+        repeat: Number of cold runs
+
+    Returns:
+        Dictionary with median/min seconds and heavy modules loaded
+    """
+    here = os.path.abspath(os.path.dirname(__file__))
+    env = dict(os.environ, NLTK_AUTO_DOWNLOAD='0')
+    timings: List[float] = []
+    heavy: List[str] = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+            cwd=here, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return {'module': module, 'error': result.stderr.strip().splitlines()[-1]}
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(data['seconds'])
+        heavy = data['heavy']
+
+    return {
+        'module': module,
+        'median_ms': round(statistics.median(timings) * 1000, 1),
+        'min_ms': round(min(timings) * 1000, 1),
+        'heavy_loaded': heavy
+    }
+
+
+def run_benchmark(modules: List[str] = None, repeat: int = 5) -> List[Dict]:
+    results = [measure_import(m, repeat) for m in (modules or MODULES)]
+
+    print(f"\n=== Cold import time ({repeat} runs each) ===")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['module']:<20} ERROR: {r['error']}")
+            continue
+        heavy = ', '.join(r['heavy_loaded']) or '-'
+        print(f"{r['module']:<20} {r['median_ms']:>8.1f} ms (min {r['min_ms']:.1f})  heavy: {heavy}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure module import times')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Print raw JSON results')
+    parser.add_argument('modules', nargs='*')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.modules, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
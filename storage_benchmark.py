@@ -0,0 +1,141 @@
+"""Storage Layout Benchmark for Social Trend Detector
+
+Writes the same synthetic posts with the previous denormalized layout (text
+and cleaned text copied into posts_processed and trends) and with the
+current one (text once in posts_raw, token-id BLOBs, thin trends), then
+compares write time and database size.
+
+Run with: python storage_benchmark.py [--posts 100000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from ingestor import create_tables, insert_processed_rows
+from vocabulary import Vocabulary
+
+# The schema as it was before text was normalized, for comparison
+LEGACY_SCHEMA = '''
+CREATE TABLE posts_raw (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, platform TEXT, text TEXT, created_at TEXT,
+    timestamp TEXT, likes INTEGER, retweets INTEGER, score INTEGER, num_comments INTEGER,
+    processed INTEGER DEFAULT 0, cluster_id INTEGER
+);
+CREATE TABLE posts_processed (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, platform TEXT, text TEXT, cleaned_text TEXT,
+    created_at TEXT, timestamp TEXT, likes INTEGER, retweets INTEGER, score INTEGER,
+    num_comments INTEGER, engagement_score REAL, word_count INTEGER, sentiment_label TEXT,
+    sentiment_score REAL, processed INTEGER DEFAULT 1, cluster_id INTEGER, cluster_size INTEGER
+);
+CREATE TABLE trends (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, platform TEXT, text TEXT, cleaned_text TEXT,
+    engagement_score REAL, is_viral INTEGER, anomaly_score REAL, sentiment_label TEXT,
+    sentiment_score REAL, partition_label TEXT, post_id INTEGER
+);
+CREATE VIRTUAL TABLE posts_fts USING fts5(text, cleaned_text, content='posts_processed', content_rowid='id');
+CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts_processed BEGIN
+    INSERT INTO posts_fts (rowid, text, cleaned_text) VALUES (new.id, new.text, new.cleaned_text);
+END;
+'''
+
+
+def synthetic_posts(n: int, seed: int = 42):
+    """(platform, text, cleaned_text, created_at) tuples with a Zipf-like vocabulary."""
+    rng = random.Random(seed)
+    words = [f'word{i}' for i in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    posts = []
+    for i in range(n):
+        tokens = rng.choices(words, weights, k=rng.randint(8, 30))
+        text = 'Breaking: ' + ' '.join(tokens) + f' https://example.com/{i} #trend @user{i % 100}'
+        posts.append((rng.choice(['twitter', 'reddit']), text, ' '.join(tokens),
+                      f'2024-01-{1 + i % 28:02d}T{i % 24:02d}:00:00'))
+    return posts
+
+
+def _insert_raw(conn, posts):
+    conn.executemany(
+        '''INSERT INTO posts_raw (platform, text, created_at, timestamp, likes, retweets, score,
+        num_comments, processed) VALUES (?, ?, ?, ?, 1, 1, 1, 1, 1)''',
+        [(platform, text, created_at, created_at) for platform, text, _, created_at in posts]
+    )
+    conn.commit()
+
+
+def _write_legacy(conn, posts, viral_every):
+    conn.executemany(
+        '''INSERT INTO posts_processed (platform, text, cleaned_text, created_at, engagement_score,
+        word_count, sentiment_label, sentiment_score, cluster_id, cluster_size)
+        VALUES (?, ?, ?, ?, 3, ?, 'neutral', 0.0, ?, 1)''',
+        [(platform, text, cleaned, created_at, len(cleaned.split()), i + 1)
+         for i, (platform, text, cleaned, created_at) in enumerate(posts)]
+    )
+    conn.executemany(
+        '''INSERT INTO trends (platform, text, cleaned_text, engagement_score, is_viral, anomaly_score,
+        sentiment_label, sentiment_score, partition_label, post_id)
+        VALUES (?, ?, ?, 3, 1, -0.1, 'neutral', 0.0, 'twitter:other', ?)''',
+        [(platform, text, cleaned, i + 1)
+         for i, (platform, text, cleaned, _) in enumerate(posts) if i % viral_every == 0]
+    )
+    conn.commit()
+
+
+def _write_normalized(conn, posts, viral_every):
+    vocabulary = Vocabulary(conn)
+    insert_processed_rows(conn.cursor(), [
+        (platform, vocabulary.encode(cleaned), created_at, created_at, 1, 1, 1, 1, 3,
+         len(cleaned.split()), 'neutral', 0.0, i + 1, 1)
+        for i, (platform, _, cleaned, created_at) in enumerate(posts)
+    ])
+    conn.executemany(
+        "INSERT INTO trends (post_id, anomaly_score, partition_label, run_id) VALUES (?, -0.1, 'twitter:other', 1)",
+        [(i + 1,) for i in range(0, len(posts), viral_every)]
+    )
+    conn.commit()
+
+
+def measure(layout: str, posts, viral_every: int, directory: str):
+    path = os.path.join(directory, f'{layout}.db')
+    conn = sqlite3.connect(path)
+    if layout == 'legacy':
+        conn.executescript(LEGACY_SCHEMA)
+        write = _write_legacy
+    else:
+        create_tables(conn)
+        write = _write_normalized
+    _insert_raw(conn, posts)
+
+    start = time.perf_counter()
+    write(conn, posts, viral_every)
+    elapsed = time.perf_counter() - start
+    conn.execute('VACUUM')
+    conn.close()
+    return elapsed, os.path.getsize(path)
+
+
+def run_benchmark(n_posts: int, viral_every: int):
+    print(f"\n=== Storage layout benchmark ({n_posts:,} posts, 1 in {viral_every} viral) ===")
+    posts = synthetic_posts(n_posts)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in ('legacy', 'normalized'):
+            elapsed, size = measure(layout, posts, viral_every, directory)
+            results[layout] = (elapsed, size)
+            print(f"{layout:<11} write {elapsed:7.2f}s  {n_posts / elapsed:>10,.0f} posts/s  "
+                  f"db {size / 2 ** 20:8.1f} MiB")
+
+    (legacy_time, legacy_size), (new_time, new_size) = results['legacy'], results['normalized']
+    print(f"size reduction {1 - new_size / legacy_size:.1%}, write speedup {legacy_time / new_time:.2f}x")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare legacy and normalized storage layouts')
+    parser.add_argument('--posts', type=int, default=100_000)
+    parser.add_argument('--viral-every', type=int, default=10)
+    args = parser.parse_args()
+    run_benchmark(args.posts, args.viral_every)
@@ -12,6 +12,112 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 from sentiment_analyzer import SentimentAnalyzer
 from export_utils import DataExporter
+import queue
+import sqlite3
+import threading
+import time
+from pipeline_daemon import PipelineDaemon, StageLoop, read_pipeline_status
+import nlp_resources
+from startup_benchmark import measure_import
+import processor
+from dedup import Deduplicator, MinHasher, estimate_jaccard
+from ingestor import SocialIngestor
+from datetime import datetime, timedelta
+from config import Config
+from doc_matrix import DocumentMatrix
+from vector_index import VectorIndex
+from retention import RetentionManager, archive_extension, read_archive
+from run_ledger import RunLedger
+from vocabulary import Vocabulary, create_vocabulary_table
+from sentiment_backends import LexiconBackend, TextBlobBackend, get_backend
+from features import FEATURE_COLUMNS, FEATURE_SCHEMA, FEATURE_SQL, batch_feature_matrix, build_feature_matrix
+from ml_model import TrendDetector, keyword_segment, partition_indices, partition_label
+from post_batch import PostBatch
+from trend_lifecycle import TrendTracker
+from sharding import ShardCoordinator, ShardPartial, shard_of
+import load_test
+import profiling
+from bulk_ingest import BulkIngestor, open_records
+from topic_model import TopicModeler, umass_coherence
+import app_enhanced
+
+
+class _IdentityLemmatizer:
+    def lemmatize(self, word):
+        return word
+
+
+@pytest.fixture(autouse=True)
+def isolated_model_paths(tmp_path, monkeypatch):
+    """Keep persisted models and matrices out of the working tree."""
+    monkeypatch.setattr(Config, 'ANOMALY_MODEL_PATH', str(tmp_path / 'models' / 'anomaly.joblib'))
+    monkeypatch.setattr(Config, 'DOC_MATRIX_DIR', str(tmp_path / 'models' / 'doc_matrix'))
+    monkeypatch.setattr(Config, 'VECTOR_INDEX_DIR', str(tmp_path / 'models' / 'vector_index'))
+    monkeypatch.setattr(Config, 'LDA_MODEL_DIR', str(tmp_path / 'models' / 'lda'))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Fresh database with the pipeline schema."""
+    path = str(tmp_path / 'trends.db')
+    SocialIngestor(path).close()
+    return path
+
+
+@pytest.fixture
+def text_processor(db_path, monkeypatch):
+    """TextProcessor that does not depend on downloaded NLTK corpora."""
+    monkeypatch.setattr(processor, 'get_stop_words', lambda: frozenset({'the', 'and', 'new'}))
+    monkeypatch.setattr(processor, 'get_lemmatizer', lambda: _IdentityLemmatizer())
+    monkeypatch.setattr(processor, 'get_backend', TextBlobBackend)
+    text_proc = processor.TextProcessor(db_path)
+    yield text_proc
+    text_proc.close()
+
+
+@pytest.fixture
+def api_client(db_path, monkeypatch):
+    """Flask test client for the enhanced API bound to the test database."""
+    monkeypatch.setattr(app_enhanced, 'DATABASE', db_path)
+    monkeypatch.setattr(app_enhanced, '_db_local', threading.local())
+    return app_enhanced.app.test_client()
+
+
+def insert_processed_posts(db_path, posts):
+    """Insert (platform, text, created_at, engagement) rows into posts_processed."""
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        '''INSERT INTO posts_processed
+        (platform, text, cleaned_text, created_at, likes, retweets, score, num_comments,
+         engagement_score, word_count, sentiment_label, sentiment_score)
+        VALUES (?, ?, lower(?), ?, 0, 0, 0, 0, ?, 3, 'neutral', 0.0)''',
+        [(platform, text, text, created_at, engagement) for platform, text, created_at, engagement in posts]
+    )
+    conn.commit()
+    conn.close()
+
+
+def vocabulary_conn(texts):
+    """In-memory database whose vocabulary table holds the terms of texts."""
+    conn = sqlite3.connect(':memory:')
+    create_vocabulary_table(conn)
+    vocabulary = Vocabulary(conn)
+    for text in texts:
+        vocabulary.encode(text)
+    return conn
+
+
+def insert_raw_posts(db_path, posts):
+    """Insert (platform, text, likes, retweets, score, comments) rows into posts_raw."""
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        '''INSERT INTO posts_raw
+        (platform, text, created_at, timestamp, likes, retweets, score, num_comments, processed)
+        VALUES (?, ?, '2024-01-01T00:00:00', '2024-01-01T00:00:00', ?, ?, ?, ?, 0)''',
+        posts
+    )
+    conn.commit()
+    conn.close()
 
 
 class TestSentimentAnalyzer:
@@ -88,6 +194,35 @@ class TestSentimentAnalyzer:
         assert -1 <= avg <= 1
 
 
+class TestSentimentBackends:
+    """Test cases for the pluggable sentiment backends."""
+    
+    def test_lexicon_backend_scores_cleaned_tokens(self):
+        """Test dict lookup scoring and VADER-style normalization."""
+        backend = LexiconBackend(lexicon={'love': 3.2, 'great': 3.1, 'awful': -2.0})
+        label, score = backend.analyze('ignored', ['love', 'great', 'release'])
+        assert label == 'positive'
+        assert score == pytest.approx(6.3 / (6.3 ** 2 + 15) ** 0.5)
+        assert backend.analyze('Awful news', None)[0] == 'negative'
+        assert backend.analyze('Release notes', None) == ('neutral', 0.0)
+        assert backend.analyze('') == ('neutral', 0.0)
+    
+    def test_backends_share_one_interface(self):
+        """Test per-backend thresholds and selection by name."""
+        textblob = TextBlobBackend()
+        assert textblob.label(0.08) == 'neutral'
+        assert LexiconBackend(lexicon={}).label(0.08) == 'positive'
+        assert textblob.polarity_scores('I love this amazing product')['compound'] > 0
+        with pytest.raises(ValueError):
+            get_backend('bert')
+    
+    def test_analyzer_uses_selected_backend(self):
+        """Test that the API analyzer labels posts with the chosen backend."""
+        analyzer = SentimentAnalyzer(backend='textblob')
+        scores = analyzer.analyze_sentiment("This is terrible and awful.")
+        assert analyzer.classify_sentiment(scores['compound']) == 'negative'
+
+
 class TestDataExporter:
     """Test cases for data export functionality."""
     
@@ -151,5 +286,1377 @@ class TestIntegration:
         assert isinstance(report, dict)
 
 
+class TestPipelineDaemon:
+    """Test cases for the continuous pipeline stage loops."""
+    
+    class FakeWorker:
+        def __init__(self, db_path):
+            self.conn = sqlite3.connect(db_path)
+            self.closed = False
+        
+        def close(self):
+            self.closed = True
+            self.conn.close()
+    
+    def test_stage_signals_downstream_and_reports_health(self, tmp_path):
+        """Test that a stage forwards counts and heartbeats its status."""
+        db_path = str(tmp_path / 'daemon.db')
+        stop = threading.Event()
+        outbox = queue.Queue(maxsize=2)
+        calls = []
+        
+        def step(worker, pending):
+            calls.append(pending)
+            if len(calls) == 2:
+                stop.set()
+            return 5, False
+        
+        stage = StageLoop('ingest', 0.01, lambda: self.FakeWorker(db_path),
+                          step, stop, outbox=outbox)
+        stage.start()
+        stage.join(5)
+        
+        assert not stage.is_alive()
+        assert stage.total == 10
+        assert outbox.get_nowait() == 5
+        
+        conn = sqlite3.connect(db_path)
+        status = read_pipeline_status(conn)
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.close()
+        assert status['ingest']['status'] == 'stopped'
+        assert status['ingest']['total_count'] == 10
+        assert journal_mode == 'wal'
+    
+    def test_failed_error_heartbeat_keeps_stage_alive(self, tmp_path, monkeypatch):
+        """Test that a lock error while recording a failure does not kill the stage."""
+        db_path = str(tmp_path / 'daemon.db')
+        stop = threading.Event()
+        calls = []
+        
+        def step(worker, pending):
+            calls.append(pending)
+            if len(calls) == 1:
+                raise RuntimeError('batch failed')
+            stop.set()
+            return 0, False
+        
+        stage = StageLoop('process', 0.01, lambda: self.FakeWorker(db_path), step, stop)
+        heartbeat = stage._heartbeat
+        
+        def locked_on_error(conn, status, count=0, error=None):
+            if status == 'error':
+                raise sqlite3.OperationalError('database is locked')
+            heartbeat(conn, status, count, error)
+        
+        monkeypatch.setattr(stage, '_heartbeat', locked_on_error)
+        stage.start()
+        stage.join(5)
+        
+        assert not stage.is_alive()
+        assert len(calls) == 2
+    
+    def test_mock_ingest_is_opt_in(self, tmp_path, monkeypatch):
+        """Test that the daemon only runs the mock ingest stage when MOCK_INGEST is set."""
+        daemon = PipelineDaemon(str(tmp_path / 'daemon.db'))
+        monkeypatch.setattr(Config, 'MOCK_INGEST', False)
+        assert [stage.stage for stage in daemon.build_stages()] == ['process', 'detect', 'retention']
+        monkeypatch.setattr(Config, 'MOCK_INGEST', True)
+        assert [stage.stage for stage in daemon.build_stages()][0] == 'ingest'
+    
+    def test_stage_coalesces_inbox_signals(self, tmp_path):
+        """Test that queued upstream signals are merged into one run."""
+        db_path = str(tmp_path / 'daemon.db')
+        stop = threading.Event()
+        inbox = queue.Queue()
+        seen = []
+        
+        def step(worker, pending):
+            seen.append(pending)
+            if pending:
+                stop.set()
+            return 0, False
+        
+        stage = StageLoop('process', 1, lambda: self.FakeWorker(db_path),
+                          step, stop, inbox=inbox)
+        for count in (3, 4):
+            inbox.put(count)
+        stage.start()
+        stage.join(5)
+        
+        assert seen == [0, 7]
+    
+    def test_stop_wakes_stage_waiting_on_inbox(self, tmp_path):
+        """Test that stop() does not wait out a long downstream interval."""
+        db_path = str(tmp_path / 'daemon.db')
+        daemon = PipelineDaemon(db_path)
+        ran = threading.Event()
+        
+        def step(worker, pending):
+            ran.set()
+            return 0, False
+        
+        stage = StageLoop('detect', 300, lambda: self.FakeWorker(db_path),
+                          step, daemon.stop_event, inbox=queue.Queue(maxsize=2))
+        daemon.stages = [stage]
+        daemon.start()
+        assert ran.wait(5)
+        
+        started = time.perf_counter()
+        daemon.stop(timeout=10)
+        
+        assert not stage.is_alive()
+        assert time.perf_counter() - started < 5
+        conn = sqlite3.connect(db_path)
+        assert read_pipeline_status(conn)['detect']['status'] == 'stopped'
+        conn.close()
+    
+    def test_status_missing_table(self):
+        """Test health lookup before the daemon has ever run."""
+        conn = sqlite3.connect(':memory:')
+        assert read_pipeline_status(conn) == {}
+
+
+class TestLazyStartup:
+    """Test cases for deferred imports and local corpus checks."""
+    
+    def test_missing_corpus_without_download(self, monkeypatch):
+        """Test that a missing corpus fails fast unless downloads are opted into."""
+        import nltk
+        monkeypatch.delenv('NLTK_AUTO_DOWNLOAD', raising=False)
+        monkeypatch.setitem(nlp_resources.CORPORA, 'missing', 'corpora/does_not_exist')
+        monkeypatch.setattr(nltk, 'download', lambda *args, **kwargs: pytest.fail('downloader called'))
+        
+        with pytest.raises(LookupError):
+            nlp_resources.ensure_corpora(['missing'])
+        monkeypatch.setenv('NLTK_AUTO_DOWNLOAD', '0')
+        assert not nlp_resources.auto_download_enabled()
+    
+    def test_pipeline_imports_stay_light(self):
+        """Test that importing pipeline modules defers heavy libraries."""
+        for module in ('processor', 'ml_model', 'sentiment_analyzer'):
+            result = measure_import(module, repeat=1)
+            assert 'error' not in result
+            assert result['heavy_loaded'] == []
+
+
+class TestDeduplication:
+    """Test cases for MinHash/LSH near-duplicate clustering."""
+    
+    def test_signature_similarity(self):
+        """Test that retweets match and different keywords do not."""
+        hasher = MinHasher()
+        base = hasher.signature("Breaking: AI revolution! Amazing new model discovered")
+        retweet = hasher.signature("RT @bob: Breaking: AI revolution! Amazing new model discovered http://t.co/x")
+        other = hasher.signature("Breaking: ML revolution! Amazing new model discovered")
+        
+        assert estimate_jaccard(base, retweet) == 1.0
+        assert estimate_jaccard(base, other) < 0.7
+    
+    def test_assign_persists_clusters(self):
+        """Test that later batches join clusters created earlier."""
+        conn = sqlite3.connect(':memory:')
+        dedup = Deduplicator(conn)
+        
+        first = dedup.assign([(1, "Python 3.13 released today"), (2, "Rust beats Go in benchmark")])
+        second = dedup.assign([(3, "RT @dev: Python 3.13 released today")])
+        
+        assert first == {1: 1, 2: 2}
+        assert second == {3: 1}
+    
+    def test_band_layout_change_rebuilds_buckets(self):
+        """Test that clusters stored under an older band layout are still found."""
+        conn = sqlite3.connect(':memory:')
+        Deduplicator(conn, bands=8).assign([(1, "Python 3.13 released today")])
+        
+        dedup = Deduplicator(conn)
+        assert conn.execute('SELECT COUNT(*), MAX(band) FROM dedup_buckets').fetchone() == (16, 15)
+        assert dedup.assign([(2, "RT @dev: Python 3.13 released today")]) == {2: 1}
+    
+    def test_process_batch_aggregates_clusters(self, db_path, text_processor):
+        """Test that duplicates collapse into one processed row with summed engagement."""
+        insert_raw_posts(db_path, [
+            ('twitter', 'Breaking: AI revolution! Amazing model discovered', 10, 5, 0, 0),
+            ('twitter', 'RT @a: Breaking: AI revolution! Amazing model discovered', 20, 0, 0, 0),
+            ('reddit', 'Completely different story about databases', 0, 0, 100, 10),
+        ])
+        
+        assert text_processor.process_batch() == 3
+        insert_raw_posts(db_path, [
+            ('reddit', 'Breaking: AI revolution! Amazing model discovered', 0, 0, 50, 5),
+        ])
+        text_processor.process_batch()
+        
+        rows = text_processor.cursor.execute(
+            'SELECT cluster_size, engagement_score FROM posts_processed ORDER BY id'
+        ).fetchall()
+        assert rows == [(3, 10 + 2 * 5 + 20 + 55), (1, 110)]
+    
+    def test_null_created_at_uses_ingest_time(self, db_path, text_processor):
+        """Test that a NULL created_at neither fails the batch nor drops the post from rollups."""
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            '''INSERT INTO posts_raw (platform, text, created_at, timestamp, likes, processed)
+            VALUES ('twitter', ?, ?, '2024-01-02T08:00:00', 1, 0)''',
+            [('Breaking: AI revolution! Amazing model discovered', '2024-01-03T09:00:00'),
+             ('RT @a: Breaking: AI revolution! Amazing model discovered', None)]
+        )
+        conn.commit()
+        
+        assert text_processor.process_batch() == 2
+        assert conn.execute('SELECT created_at, cluster_size FROM posts_processed').fetchall() == [
+            ('2024-01-02T08:00:00', 2)
+        ]
+        assert conn.execute('SELECT SUM(post_count) FROM rollup_day').fetchone()[0] == 2
+        conn.close()
+
+
+class TestAnomalyModel:
+    """Test cases for multivariate anomaly scoring."""
+    
+    def test_feature_matrix(self):
+        """Test feature layout and engagement velocity."""
+        rows = [
+            (10, 5, 0, 0, 20.0, '2024-01-01T00:00:00', 4, 0.5),
+            (0, 0, 0, 0, 30.0, '2024-01-01T09:30:00', 2, None),
+        ]
+        matrix = build_feature_matrix(rows, now=datetime(2024, 1, 1, 10, 0))
+        
+        assert matrix.shape == (2, len(FEATURE_COLUMNS))
+        assert matrix[0, 4] == pytest.approx(2.0)
+        # Posts younger than an hour are treated as one hour old
+        assert matrix[1, 4] == pytest.approx(30.0)
+        assert matrix[1, 6] == 0.0
+    
+    def test_detect_persists_model_and_decision_scores(self, db_path, tmp_path, monkeypatch):
+        """Test that scores come from decision_function and the model is reused."""
+        monkeypatch.setattr(Config, 'ANOMALY_N_JOBS', 1)
+        monkeypatch.setattr(Config, 'DETECT_WORKERS', 1)
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            '''INSERT INTO posts_processed
+            (platform, text, created_at, likes, retweets, score, num_comments,
+             engagement_score, word_count, sentiment_score)
+            VALUES ('twitter', ?, '2024-01-01T00:00:00', ?, 1, 0, 0, ?, 5, 0.0)''',
+            [(f'post {i}', likes, likes + 2) for i, likes in
+             enumerate([10, 11, 12, 9, 10, 11, 13, 10, 12, 5000])]
+        )
+        conn.commit()
+        conn.close()
+        
+        detector = TrendDetector(db_path)
+        viral = detector.detect_anomalies()
+        top = detector.get_trends(limit=1)
+        detector.close()
+        
+        assert viral
+        assert all(post[1] < 0 for post in viral)
+        assert top[0][2] == 'post 9'
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM trend_entities WHERE state = 'emerging'").fetchone()[0] == len(viral)
+        conn.close()
+        assert os.path.exists(Config.ANOMALY_MODEL_PATH)
+        
+        reloaded = TrendDetector(db_path)
+        assert reloaded.load_anomaly_models()
+        reloaded.close()
+    
+    def test_incremental_scoring_and_refit_policy(self, db_path, text_processor, monkeypatch):
+        """Test that later runs score only changed posts and refit once a partition outgrows its model."""
+        monkeypatch.setattr(Config, 'ANOMALY_N_JOBS', 1)
+        monkeypatch.setattr(Config, 'DETECT_WORKERS', 1)
+        monkeypatch.setattr(Config, 'ANOMALY_REFIT_GROWTH', 2)
+        
+        def add_posts(start, count):
+            insert_raw_posts(db_path, [
+                ('twitter', f'python item{i} tag{i} note{i} mark{i}', 10 + i % 3 + (5000 if i == 7 else 0), 1, 0, 0)
+                for i in range(start, start + count)
+            ])
+            text_processor.process_batch()
+        
+        detector = TrendDetector(db_path)
+        add_posts(0, 20)
+        assert detector.detect_anomalies()
+        assert detector.load_model_fits()['twitter:python'][:2] == (20, 20)
+        trending = detector.conn.execute('SELECT COUNT(*) FROM trends').fetchone()[0]
+        
+        add_posts(20, 3)
+        detector.detect_anomalies()
+        assert detector.ledger.history('detect', limit=1)[0]['input_count'] == 3 + trending
+        assert detector.load_model_fits()['twitter:python'][:2] == (20, 23)
+        assert detector.detect_anomalies() == []
+        
+        monkeypatch.setattr(Config, 'ANOMALY_REFIT_GROWTH', 1.1)
+        add_posts(23, 1)
+        detector.detect_anomalies()
+        assert detector.ledger.history('detect', limit=1)[0]['input_count'] == 24
+        assert detector.load_model_fits()['twitter:python'][:2] == (24, 24)
+        detector.close()
+
+
+class TestPartitionedDetection:
+    """Test cases for per-platform, per-keyword anomaly partitions."""
+    
+    def test_keyword_segment(self):
+        """Test keyword matching on word boundaries."""
+        assert keyword_segment("New breakthrough in data science") == 'data science'
+        assert keyword_segment("AI is everywhere") == 'AI'
+        assert keyword_segment("She said hello") == 'other'
+        assert partition_label('reddit', "Learning Python") == 'reddit:python'
+    
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_each_platform_gets_its_own_model(self, db_path, tmp_path, monkeypatch, workers):
+        """Test that a small-scale platform still produces its own viral posts."""
+        monkeypatch.setattr(Config, 'DETECT_WORKERS', workers)
+        rows = []
+        for platform, base in (('twitter', 10), ('reddit', 5000)):
+            for i, bump in enumerate([0, 1, 2, 1, 0, 2, 1, 0, 1, 50 * base]):
+                rows.append((platform, f'{platform} python post {i}', base + bump))
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            '''INSERT INTO posts_processed
+            (platform, text, created_at, likes, retweets, score, num_comments,
+             engagement_score, word_count, sentiment_score)
+            VALUES (?, ?, '2024-01-01T00:00:00', ?, 0, 0, 0, 0, 5, 0.0)''',
+            rows
+        )
+        conn.execute('UPDATE posts_processed SET engagement_score = likes')
+        conn.commit()
+        conn.close()
+        
+        detector = TrendDetector(db_path)
+        viral = detector.detect_anomalies()
+        detector.close()
+        
+        labels = {post[2] for post in viral}
+        assert labels == {'twitter:python', 'reddit:python'}
+        assert set(detector.anomaly_models) == labels
+
+
+class TestPostBatch:
+    """Test cases for columnar post batches."""
+    
+    @pytest.fixture
+    def conn(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute('''CREATE TABLE posts (id INTEGER, platform TEXT, text TEXT, likes INTEGER,
+            retweets INTEGER, score INTEGER, num_comments INTEGER, engagement_score REAL,
+            created_at TEXT, word_count INTEGER, sentiment_score REAL)''')
+        conn.executemany(
+            'INSERT INTO posts VALUES (?, ?, ?, ?, 1, 0, 0, ?, ?, 3, ?)',
+            [(1, 'twitter', 'Learning Python', 10, 20.0, '2024-01-01T00:00:00', 0.5),
+             (2, 'reddit', 'AI news', None, 30.0, '2024-01-01T09:30:00', None),
+             (3, 'twitter', 'hello there', 7, 9.0, None, -0.2),
+             (4, 'twitter', 'more python', 2, 4.0, '2024-01-01T08:00:00', 0.1)]
+        )
+        yield conn
+        conn.close()
+    
+    def test_columns_records_and_take(self, conn):
+        """Test column kinds, NULL handling and row views across fetch chunks."""
+        batch = PostBatch.from_cursor(conn.execute('SELECT id, platform, text, likes FROM posts'),
+                                      chunk_size=3)
+        
+        assert len(batch) == 4
+        assert batch['likes'].tolist() == [10, 0, 7, 2]
+        assert batch.categories['platform'] == ['twitter', 'reddit']
+        assert batch.decoded('platform') == ['twitter', 'reddit', 'twitter', 'twitter']
+        assert batch.is_value('platform', 'reddit').tolist() == [False, True, False, False]
+        
+        record = batch.record(1)
+        assert (record.id, record.platform, record.text) == (2, 'reddit', 'AI news')
+        with pytest.raises(AttributeError):
+            record.__dict__
+        
+        subset = batch.take([3, 0])
+        assert subset['id'].tolist() == [4, 1]
+        assert subset['text'] == ['more python', 'Learning Python']
+    
+    def test_feature_matrix_matches_rows(self, conn):
+        """Test that the columnar feature matrix equals the row-based one."""
+        now = datetime(2024, 1, 1, 10, 0)
+        rows = conn.execute(f'SELECT {FEATURE_SQL} FROM posts').fetchall()
+        batch = PostBatch.from_cursor(conn.execute(f'SELECT {FEATURE_SQL} FROM posts'),
+                                      schema=FEATURE_SCHEMA)
+        
+        assert batch_feature_matrix(batch, now=now).tolist() == build_feature_matrix(rows, now=now).tolist()
+    
+    def test_partition_indices(self, conn):
+        """Test grouping rows by platform and keyword segment."""
+        batch = PostBatch.from_cursor(
+            conn.execute('SELECT id, platform, text AS segment FROM posts'),
+            schema={'segment': 'category'}, converters={'segment': keyword_segment}
+        )
+        partitions = {label: indices.tolist() for label, indices in partition_indices(batch).items()}
+        
+        assert partitions == {'twitter:python': [0, 3], 'twitter:other': [2], 'reddit:AI': [1]}
+
+
+class TestDocumentMatrix:
+    """Test cases for the shared hashed document-term matrix."""
+    
+    def test_segments_are_memory_mapped(self, tmp_path):
+        """Test append/load round trip without copying segment arrays."""
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        texts = ['ai model discovered', 'ai revolution', 'python release']
+        matrix.append([1, 2], texts[:2])
+        matrix.append([3], texts[2:])
+        
+        ids, counts = matrix.load()
+        assert ids.tolist() == [1, 2, 3]
+        assert counts.shape[0] == 3
+        assert matrix.max_doc_id() == 3
+        for _, segment in matrix.iter_segments():
+            assert not segment.data.flags.owndata
+        assert matrix.top_terms(vocabulary_conn(texts), n=1) == [('ai', 2.0)]
+    
+    def test_terms_come_from_the_vocabulary_table(self, tmp_path):
+        """Test that segments store no terms and lookups only hash newly added vocabulary."""
+        import numpy as np
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        path = matrix.append([1], ['python release'])
+        assert 'terms' not in np.load(path).files
+        
+        conn = vocabulary_conn(['python release'])
+        assert set(matrix.feature_terms(conn).values()) == {'python', 'release'}
+        Vocabulary(conn).encode('outage')
+        conn.commit()
+        assert set(matrix.feature_terms(conn).values()) == {'python', 'release', 'outage'}
+        assert matrix._terms_seen == 3
+    
+    def test_compaction_keeps_every_document_once(self, tmp_path):
+        """Test size-tiered merging, including a reader that overlaps it."""
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        for doc_id in range(1, 7):
+            matrix.append([doc_id], [f'term{doc_id} shared'])
+        before = matrix.load()[1].toarray()
+        reader = matrix.iter_segments()
+        assert next(reader)[0].tolist() == [1]
+        
+        assert matrix.compact(max_segments=2) == 5
+        assert len(matrix.segment_paths()) == 1
+        assert [ids.tolist() for ids, _ in reader] == [[2, 3, 4, 5, 6]]
+        ids, counts = matrix.load()
+        assert ids.tolist() == [1, 2, 3, 4, 5, 6]
+        assert (counts.toarray() == before).all()
+        conn = vocabulary_conn(f'term{doc_id} shared' for doc_id in range(1, 7))
+        assert set(matrix.feature_terms(conn).values()) == {'shared'} | {f'term{i}' for i in range(1, 7)}
+        
+        matrix.append([7], ['term7'])
+        assert matrix.compact(max_segments=2) == 0
+        matrix.append([8], ['term8'])
+        # The two small segments merge; the large one is left alone
+        assert matrix.compact(max_segments=2) == 1
+        assert [len(ids) for ids, _ in matrix.iter_segments()] == [6, 2]
+    
+    def test_similar_posts(self, tmp_path):
+        """Test cosine similarity lookup over TF-IDF rows."""
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        matrix.append([1, 2, 3], ['python release today', 'python release notes', 'database story'])
+        
+        assert [doc_id for doc_id, _ in matrix.similar(1)] == [2]
+    
+    def test_processing_feeds_lda(self, db_path, text_processor):
+        """Test that processed batches are appended and LDA trains from them."""
+        insert_raw_posts(db_path, [
+            ('twitter', f'{topic} story number {word}', 1, 1, 0, 0)
+            for topic in ('python release', 'database outage')
+            for word in ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot')
+        ])
+        text_processor.process_batch()
+        
+        conn = sqlite3.connect(db_path)
+        processed = conn.execute('SELECT MAX(id) FROM posts_processed').fetchone()[0]
+        conn.close()
+        assert DocumentMatrix().max_doc_id() == processed
+        assert text_processor.sync_doc_matrix() == 0
+        
+        detector = TrendDetector(db_path)
+        assert detector.train_lda(num_topics=2) is not None
+        detector.close()
+    
+    def test_daemon_reuses_saved_topics_until_due(self, db_path, text_processor, monkeypatch):
+        """Test that the daemon loads the saved LDA model and retrains only by age or growth."""
+        insert_raw_posts(db_path, [
+            ('twitter', f'{topic} story number {word}', 1, 1, 0, 0)
+            for topic in ('python release', 'database outage')
+            for word in ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot')
+        ])
+        text_processor.process_batch()
+        detector = TrendDetector(db_path)
+        detector.train_lda(num_topics=2)
+        detector.close()
+        
+        detector = TrendDetector(db_path)
+        assert not detector.lda_needs_retrain()
+        assert detector.lda_needs_retrain(now=datetime.now() + timedelta(hours=Config.LDA_RETRAIN_HOURS))
+        monkeypatch.setattr(detector, 'train_lda', lambda: pytest.fail('retrained a fresh model'))
+        PipelineDaemon(db_path)._detect(detector, 1)
+        assert detector.lda_model is not None
+        
+        insert_raw_posts(db_path, [('reddit', f'cloud launch recap {i} {"z" * i}', 1, 0, 3, 0) for i in range(8)])
+        text_processor.process_batch()
+        assert detector.lda_needs_retrain()
+        detector.close()
+
+
+class TestTopicModel:
+    """Test cases for the coherence-swept, persisted LDA topic model."""
+    
+    THEMES = [['python', 'release', 'interpreter', 'typing'],
+              ['database', 'outage', 'replica', 'failover'],
+              ['football', 'match', 'goal', 'league']]
+    
+    @pytest.fixture
+    def doc_matrix(self, tmp_path):
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        texts = [' '.join(theme[(i + j) % 4] for j in range(3)) for i in range(12) for theme in self.THEMES]
+        matrix.append(list(range(1, len(texts) + 1)), texts)
+        return matrix
+    
+    @pytest.fixture
+    def conn(self):
+        return vocabulary_conn(' '.join(theme) for theme in self.THEMES)
+    
+    def test_umass_prefers_co_occurring_words(self):
+        """Test that words appearing together score as more coherent than words that never do."""
+        from scipy.sparse import csr_matrix
+        import numpy as np
+        counts = csr_matrix(np.array([[1, 1, 0, 0], [1, 1, 0, 0], [0, 0, 1, 1], [0, 0, 1, 1]]))
+        coherent = umass_coherence(counts, np.array([[0.5, 0.5, 0.0, 0.0]]), top_n=2)
+        mixed = umass_coherence(counts, np.array([[0.5, 0.0, 0.5, 0.0]]), top_n=2)
+        
+        assert coherent == pytest.approx(np.log(3 / 2))
+        assert mixed == pytest.approx(np.log(1 / 2))
+    
+    def test_sweep_selects_and_persists_model(self, doc_matrix, conn, api_client):
+        """Test that the most coherent candidate is saved with its topic-term matrix and served."""
+        import numpy as np
+        modeler = TopicModeler()
+        result = modeler.sweep(doc_matrix, conn, candidates=[2, 3, 5], workers=2, sweep_workers=2)
+        
+        assert result['sweep_workers'] == 2
+        assert sorted(result['coherence']) == [2, 3, 5]
+        assert result['coherence'][result['num_topics']] == max(result['coherence'].values())
+        assert result['documents'] == 36
+        
+        modeler.save(result)
+        saved = np.load(os.path.join(Config.LDA_MODEL_DIR, 'topic_term.npz'))
+        assert saved['topic_term'].shape == (result['num_topics'], len(saved['terms']))
+        assert set(saved['terms'].tolist()) == {word for theme in self.THEMES for word in theme}
+        assert modeler.load_model().num_topics == result['num_topics']
+        
+        body = api_client.get('/api/topics').get_json()
+        assert body['num_topics'] == result['num_topics']
+        assert len(body['topics']) == result['num_topics']
+        assert len(body['topics'][0]['keywords']) == 5
+    
+    def test_sweep_leaves_each_candidate_two_workers(self, doc_matrix, conn, monkeypatch):
+        """Test that the default sweep width never drops candidates to one LDA worker."""
+        monkeypatch.setattr(Config, 'LDA_SWEEP_WORKERS', 8)
+        result = TopicModeler().sweep(doc_matrix, conn, candidates=[2, 3], workers=4)
+        assert result['sweep_workers'] == 2
+        assert result['model'].num_topics == result['num_topics']
+
+
+class TestSearchEndpoint:
+    """Test cases for FTS5-backed /api/search."""
+    
+    @pytest.fixture
+    def seeded_client(self, db_path, api_client):
+        insert_processed_posts(db_path, [
+            ('twitter', 'Python release brings faster startup', '2024-01-01T10:00:00', 10),
+            ('reddit', 'Python python python tips thread', '2024-01-02T10:00:00', 20),
+            ('twitter', 'Database outage postmortem', '2024-01-03T10:00:00', 30),
+            ('reddit', 'New Python packaging guide', '2024-01-04T10:00:00', 40),
+        ])
+        return api_client
+    
+    def test_bm25_ranking_and_filters(self, seeded_client):
+        """Test ranked matches and platform/time filters."""
+        data = seeded_client.get('/api/search?q=python').get_json()
+        assert data['count'] == 3
+        assert data['results'][0]['text'].startswith('Python python')
+        
+        data = seeded_client.get('/api/search?q=python&platform=reddit&since=2024-01-03').get_json()
+        assert [r['text'] for r in data['results']] == ['New Python packaging guide']
+    
+    def test_keyset_pagination(self, seeded_client):
+        """Test that cursors walk every match exactly once."""
+        seen = []
+        url = '/api/search?q=python&limit=2'
+        while url:
+            data = seeded_client.get(url).get_json()
+            seen.extend(r['id'] for r in data['results'])
+            url = f"/api/search?q=python&limit=2&cursor={data['next_cursor']}" if data['next_cursor'] else None
+        assert sorted(seen) == [1, 2, 4]
+    
+    def test_index_follows_updates(self, db_path, seeded_client):
+        """Test that triggers keep the index in sync with posts_processed."""
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE posts_processed SET text = 'Rust rewrite', cleaned_text = 'rust rewrite' WHERE id = 3")
+        conn.commit()
+        conn.close()
+        
+        assert seeded_client.get('/api/search?q=outage').get_json()['count'] == 0
+        assert seeded_client.get('/api/search?q=rust').get_json()['count'] == 1
+    
+    def test_invalid_query(self, seeded_client):
+        """Test that bad input is rejected with 400."""
+        assert seeded_client.get('/api/search').status_code == 400
+        assert seeded_client.get('/api/search?q=%22unterminated').status_code == 400
+        assert seeded_client.get('/api/search?q=python%20AND').status_code == 400
+    
+    def test_column_filters_are_literal(self, seeded_client):
+        """Test that user terms cannot address FTS5 columns."""
+        response = seeded_client.get('/api/search?q=foo:bar')
+        assert response.status_code == 200
+        assert response.get_json()['count'] == 0
+        assert app_enhanced.fts_query('text:python AND "new model" pack*') == \
+            '"text:python" AND "new model" "pack"*'
+        assert seeded_client.get('/api/search?q=pack*').get_json()['count'] == 1
+        assert seeded_client.get('/api/search?q=(outage%20OR%20guide)%20NOT%20python').get_json()['count'] == 1
+
+
+class TestVectorIndex:
+    """Test cases for the approximate nearest-neighbor index."""
+    
+    def test_incremental_sync_and_query(self, tmp_path):
+        """Test that synced chunks are queryable and ranked by cosine."""
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        index = VectorIndex(str(tmp_path / 'ann'))
+        matrix.append([1, 2], ['python release notes today', 'database outage story'])
+        assert index.sync(matrix) == 2
+        matrix.append([3], ['python release notes tomorrow'])
+        assert index.sync(matrix) == 1
+        assert index.sync(matrix) == 0
+        
+        reader = VectorIndex(str(tmp_path / 'ann')).load()
+        results = reader.query(reader.vector_for(1), k=1, exclude_id=1)
+        assert results[0][0] == 3
+        assert results[0][1] > 0.5
+    
+    def test_compaction_and_cheap_reloads(self, tmp_path, monkeypatch):
+        """Test that unchanged directories are not re-listed and compaction reloads cleanly."""
+        monkeypatch.setattr(Config, 'VECTOR_INDEX_MAX_CHUNKS', 100)
+        directory = str(tmp_path / 'ann')
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        writer = VectorIndex(directory)
+        for doc_id in range(1, 5):
+            matrix.append([doc_id], [f'python release number{doc_id}'])
+            writer.sync(matrix)
+        reader = VectorIndex(directory).load()
+        assert reader.ids.tolist() == [1, 2, 3, 4]
+        
+        listings = []
+        monkeypatch.setattr(reader, 'chunk_paths', lambda: listings.append(1) or VectorIndex.chunk_paths(reader))
+        reader.load()
+        assert listings == []
+        
+        # A merged chunk briefly coexists with the chunks it absorbed
+        writer.load()
+        writer.save_chunk(writer.ids, writer.vectors)
+        assert VectorIndex(directory).load().ids.tolist() == [1, 2, 3, 4]
+        writer.save_chunk(writer.ids[:1], writer.vectors[:1])
+        
+        assert writer.compact(max_chunks=2) == 3
+        assert len(writer.chunk_paths()) == 1
+        stat = os.stat(directory)
+        # Coarse filesystem timestamps may not have ticked since the last load
+        os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        reader.load()
+        assert reader.ids.tolist() == [1, 2, 3, 4]
+        assert (reader.vector_for(3) == writer.vector_for(3)).all()
+        assert reader.vector_for(99) is None
+    
+    def test_lsh_tables_are_merged_on_load(self, tmp_path, monkeypatch):
+        """Test that loads hash only new chunks and queries reuse the tables."""
+        monkeypatch.setattr(Config, 'VECTOR_INDEX_MAX_CHUNKS', 100)
+        directory = str(tmp_path / 'ann')
+        matrix = DocumentMatrix(str(tmp_path / 'dtm'))
+        writer = VectorIndex(directory)
+        reader = VectorIndex(directory, exact_below=0)
+        hashed = []
+        keys = reader._keys
+        monkeypatch.setattr(reader, '_keys', lambda vectors: hashed.append(len(vectors)) or keys(vectors))
+        for batch in range(3):
+            ids = list(range(batch * 4 + 1, batch * 4 + 5))
+            matrix.append(ids, [f'python release notes part{doc_id}' for doc_id in ids])
+            writer.sync(matrix)
+            stat = os.stat(directory)
+            os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + batch + 1))
+            reader.load()
+        assert hashed == [4, 4, 4]
+        
+        full = VectorIndex(directory)
+        full.load()
+        for mine, theirs in zip(reader._state[3], full._state[3]):
+            assert (mine == theirs).all()
+        
+        results = reader.query(reader.vector_for(1), k=3, exclude_id=1)
+        # One hash for the query vector, none for the indexed ones
+        assert hashed == [4, 4, 4, 1]
+        assert len(results) == 3
+        assert all(doc_id != 1 for doc_id, _ in results)
+    
+    def test_similar_endpoint(self, db_path, text_processor, api_client):
+        """Test /api/trends/<id>/similar end to end."""
+        insert_raw_posts(db_path, [
+            ('twitter', 'Python release notes are out', 10, 0, 0, 0),
+            ('reddit', 'Database outage hits region', 0, 0, 10, 0),
+            ('reddit', 'Python release notes explained', 0, 0, 20, 0),
+        ])
+        text_processor.process_batch()
+        conn = sqlite3.connect(db_path)
+        # Keyed by the lifecycle entity, not the per-run trends row
+        conn.execute("INSERT INTO trends (post_id, anomaly_score, run_id) VALUES (1, -0.1, 1)")
+        conn.execute("INSERT INTO trend_entities (id, post_id, state) VALUES (5, 1, 'emerging')")
+        conn.commit()
+        conn.close()
+        
+        data = api_client.get('/api/trends/5/similar?k=1').get_json()
+        assert data['post_id'] == 1
+        assert [post['id'] for post in data['similar']] == [3]
+        assert api_client.get('/api/trends/1/similar').status_code == 404
+
+
+class TestTrendLifecycle:
+    """Test cases for trend entities tracked across detection runs."""
+    
+    def run_detection(self, db_path, run_id, engagement, detected, hour):
+        """Set post 1's engagement, then fold one detection run into the tracker."""
+        conn = sqlite3.connect(db_path)
+        conn.execute('UPDATE posts_processed SET engagement_score = ? WHERE id = 1', (engagement,))
+        counts = TrendTracker(conn).update(
+            run_id, [(1, -0.2, 'twitter:python', run_id)] if detected else [],
+            now=datetime(2024, 1, 1, hour)
+        )
+        conn.commit()
+        conn.close()
+        return counts
+    
+    def test_emergence_peak_decay_and_expiry(self, db_path, monkeypatch):
+        """Test state transitions and velocity from successive runs."""
+        monkeypatch.setattr(Config, 'TREND_EXPIRY_RUNS', 2)
+        insert_processed_posts(db_path, [('twitter', 'python release', '2024-01-01T00:00:00', 0)])
+        
+        states = [
+            self.run_detection(db_path, 1, 100, True, 2),   # 50/h since creation
+            self.run_detection(db_path, 2, 300, True, 3),   # 200/h, a new high
+            self.run_detection(db_path, 3, 350, True, 4),   # 50/h, slowing
+            self.run_detection(db_path, 4, 350, False, 5),
+            self.run_detection(db_path, 5, 350, False, 6),
+            self.run_detection(db_path, 6, 350, False, 7),
+        ]
+        assert states == [{'emerging': 1}, {'growing': 1}, {'peaked': 1},
+                          {'decaying': 1}, {'expired': 1}, {}]
+        
+        conn = sqlite3.connect(db_path)
+        trend = TrendTracker(conn).history(1)
+        conn.close()
+        assert trend['peak_velocity'] == pytest.approx(200.0)
+        assert trend['peak_at'] == '2024-01-01T03:00:00'
+        assert trend['runs_seen'] == 3
+        # Expired entities are left alone by later runs
+        assert [h['state'] for h in trend['history']] == ['emerging', 'growing', 'peaked', 'decaying', 'expired']
+        assert [h['velocity'] for h in trend['history'][:3]] == pytest.approx([50.0, 200.0, 50.0])
+    
+    def test_history_endpoint(self, db_path, api_client):
+        """Test the per-trend history API and the trend id exposed on trends_view."""
+        insert_processed_posts(db_path, [('twitter', 'python release', '2024-01-01T00:00:00', 10)])
+        self.run_detection(db_path, 1, 10, True, 1)
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO trends (post_id, anomaly_score, partition_label, run_id) VALUES (1, -0.2, 'twitter:python', 1)")
+        conn.commit()
+        assert conn.execute('SELECT trend_id, state FROM trends_view').fetchone() == (1, 'emerging')
+        conn.close()
+        
+        data = api_client.get('/api/trends/1/history').get_json()
+        assert data['state'] == 'emerging'
+        assert data['history'][0]['run_id'] == 1
+        assert api_client.get('/api/trends/99/history').status_code == 404
+
+
+class TestSharding:
+    """Test cases for hash-partitioned shards and mergeable partial results."""
+    
+    def test_partials_merge_and_collapse_cross_shard_duplicates(self):
+        """Test that partials sum, and duplicate candidates from two shards collapse."""
+        candidate = {'post_id': 1, 'platform': 'twitter', 'text': 'Python 4 released with a new JIT today',
+                     'engagement_score': 50.0, 'anomaly_score': -0.2, 'sentiment_label': 'neutral',
+                     'sentiment_score': 0.0, 'partition_label': 'twitter:python', 'state': 'emerging',
+                     'velocity': 5.0}
+        a = ShardPartial([0], {('day', '2024-01-01', 'twitter'): [2, 10.0, 7.0, 0.5]},
+                         {5: [3.0, 'python']}, {('twitter', 'neutral'): [2, 0.0]},
+                         [dict(candidate, shard=0)])
+        b = ShardPartial([1], {('day', '2024-01-01', 'twitter'): [1, 9.0, 9.0, -0.5]},
+                         {5: [1.0, 'python'], 6: [2.0, 'release']}, {('twitter', 'neutral'): [1, 0.0]},
+                         [dict(candidate, shard=1, post_id=8, anomaly_score=-0.3)])
+        merged = a.merge(b)
+        
+        assert merged.shards == [0, 1]
+        assert merged.rollups[('day', '2024-01-01', 'twitter')] == [3, 19.0, 9.0, 0.0]
+        assert merged.terms == {5: [4.0, 'python'], 6: [2.0, 'release']}
+        assert merged.sentiment[('twitter', 'neutral')] == [3, 0.0]
+        top = merged.top_candidates()
+        assert [(t['shard'], t['post_id'], t['duplicates']) for t in top] == [(1, 8, 2)]
+        # Inputs are left untouched
+        assert a.rollups[('day', '2024-01-01', 'twitter')] == [2, 10.0, 7.0, 0.5]
+    
+    def test_route_process_and_merge(self, db_path, tmp_path, text_processor, api_client, monkeypatch):
+        """Test routing by hash, per-shard processing and the merged global view."""
+        monkeypatch.setattr(Config, 'SHARD_DIR', str(tmp_path / 'shards'))
+        monkeypatch.setattr(Config, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+        # Processed single-node before sharding was turned on
+        insert_raw_posts(db_path, [('reddit', 'python packaging guide', 0, 0, 5, 1),
+                                   ('twitter', 'rust release notes', 3, 1, 0, 0)])
+        text_processor.process_batch()
+        topics = ['python release', 'data science course', 'tech layoffs', 'AI model launch']
+        insert_raw_posts(db_path, [
+            ('twitter' if i % 2 else 'reddit', f'{topics[i % 4]} number {i} {"x" * i}', i, 1, i, 2)
+            for i in range(24)
+        ])
+        
+        coordinator = ShardCoordinator(db_path, num_shards=3)
+        assert coordinator.route() == 24
+        assert coordinator.route() == 0
+        for shard in range(3):
+            conn = sqlite3.connect(str(tmp_path / 'shards' / f'shard-{shard:02d}' / 'trends.db'))
+            ids = [row[0] for row in conn.execute('SELECT id FROM posts_raw')]
+            conn.close()
+            assert ids and all(shard_of(post_id, 3) == shard for post_id in ids)
+        
+        settings = {name: getattr(Config, name) for name in ('DOC_MATRIX_DIR', 'VECTOR_INDEX_DIR', 'DETECT_WORKERS')}
+        merged = coordinator.merge(coordinator.process(workers=1, detect=False, retain=False))
+        view = coordinator.global_view(limit=50)
+        # Shard paths are passed explicitly; the global Config is never patched
+        assert {name: getattr(Config, name) for name in settings} == settings
+        assert DocumentMatrix().load()[0].tolist() == [1, 2]
+        shard_matrix = DocumentMatrix(str(tmp_path / 'shards' / 'shard-00' / 'models' / 'doc_matrix'))
+        assert len(shard_matrix.load()[0]) > 0
+        day_posts = {table: coordinator.conn.execute(f'SELECT SUM(post_count) FROM {table}').fetchone()[0]
+                     for table in ('rollup_day', 'global_rollup_day')}
+        
+        assert merged.shards == [0, 1, 2]
+        assert day_posts == {'rollup_day': 2, 'global_rollup_day': 26}
+        assert sum(row['post_count'] for row in view['sentiment']) == 26
+        terms = {row['term']: row['count'] for row in view['terms']}
+        assert terms['python'] == 7
+        assert terms['science'] == 6
+        assert view['trends'] == []
+        assert api_client.get('/api/global').get_json()['merge']['input_count'] == 3
+        series = api_client.get('/api/timeseries?granularity=day&scope=global').get_json()['series']
+        assert sum(bucket['post_count'] for bucket in series) == 26
+        
+        # Shard workers archive their own expired posts; rollups survive
+        coordinator.merge(coordinator.process(workers=1, detect=False))
+        assert len(os.listdir(tmp_path / 'archive' / 'shard-00' / 'posts_processed')) == 1
+        conn = sqlite3.connect(str(tmp_path / 'shards' / 'shard-00' / 'trends.db'))
+        assert conn.execute('SELECT COUNT(*) FROM posts_processed').fetchone()[0] == 0
+        conn.close()
+        assert coordinator.conn.execute('SELECT SUM(post_count) FROM global_rollup_day').fetchone()[0] == 26
+        coordinator.close()
+
+
+class TestLoadTest:
+    """Test cases for the latency load-test helpers."""
+    
+    def test_summarize_percentiles_and_error_rates(self):
+        """Test nearest-rank percentiles and 4xx/5xx/transport error accounting."""
+        samples = [('trends', i / 1000, 200) for i in range(1, 101)]
+        samples += [('search', 0.005, 200), ('search', 0.010, 400), ('search', 0.020, 500), ('search', 0.030, None)]
+        summary = load_test.summarize(samples, elapsed=2.0)
+        
+        assert summary['trends']['requests'] == 100
+        assert summary['trends']['rps'] == 50.0
+        assert summary['trends']['p50_ms'] == pytest.approx(50.0)
+        assert summary['trends']['p95_ms'] == pytest.approx(95.0)
+        assert summary['trends']['p99_ms'] == pytest.approx(99.0)
+        assert summary['trends']['error_rate'] == 0.0
+        assert summary['search']['client_error_rate'] == 0.25
+        assert summary['search']['error_rate'] == 0.5
+        assert load_test.percentile([], 99) == 0.0
+    
+    def test_seed_and_profile_endpoints(self, tmp_path, text_processor):
+        """Test that a seeded workspace serves every endpoint and yields one profile each."""
+        db_path = load_test.seed_database(str(tmp_path / 'workspace'), 300)
+        conn = sqlite3.connect(db_path)
+        counts = [conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('posts_raw', 'posts_processed', 'trends', 'trend_entities')]
+        conn.close()
+        assert counts[:2] == [300, 300]
+        assert counts[2] > 0 and counts[2] == counts[3]
+        
+        endpoints = load_test.endpoint_paths(db_path, 'enhanced', ['health', 'trend_similar', 'trend_history', 'search'])
+        assert [name for name, *_ in endpoints] == ['health', 'trend_similar', 'trend_history', 'search']
+        assert '{' not in ''.join(path for _, _, path, _ in endpoints)
+        
+        paths = load_test.profile_endpoints('enhanced', db_path, endpoints, str(tmp_path / 'profiles'), requests=2)
+        assert sorted(paths) == sorted(name for name, *_ in endpoints)
+        assert all(os.path.getsize(path) > 0 for path in paths.values())
+
+
+class TestProfiling:
+    """Test cases for opt-in per-stage profiling."""
+    
+    def test_disabled_by_default(self, db_path, text_processor, tmp_path, monkeypatch):
+        """Test that stages run unprofiled and write nothing when PROFILE is unset."""
+        monkeypatch.setattr(Config, 'PROFILE_MODES', frozenset())
+        monkeypatch.setattr(Config, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+        insert_raw_posts(db_path, [('twitter', 'Python release is great', 10, 1, 0, 0)])
+        
+        with profiling.profile_session() as profiled:
+            assert text_processor.process_batch() == 1
+        assert profiled == []
+        assert not (tmp_path / 'profiles').exists()
+        with pytest.raises(ValueError):
+            profiling.configure('cpu,gpu')
+        assert Config.PROFILE_MODES == frozenset()
+    
+    def test_cpu_and_memory_profiles_per_stage_run(self, db_path, text_processor, tmp_path, monkeypatch, capsys):
+        """Test that a profiled stage writes .prof and .snapshot files named by its ledger run."""
+        import pstats
+        import tracemalloc
+        monkeypatch.setattr(Config, 'PROFILE', Config.PROFILE)
+        monkeypatch.setattr(Config, 'PROFILE_MODES', Config.PROFILE_MODES)
+        assert profiling.configure('cpu,memory') == {'cpu', 'memory'}
+        monkeypatch.setattr(Config, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+        monkeypatch.setattr(Config, 'PROFILE_TOP', 3)
+        insert_raw_posts(db_path, [
+            ('twitter', f'Python release number {i} is great', i, 1, 0, 0) for i in range(20)
+        ])
+        
+        with profiling.profile_session() as profiled:
+            assert text_processor.process_batch() == 20
+        
+        run_id = text_processor.ledger.last_run_id('process')
+        assert [(result['stage'], result['run_id']) for result in profiled] == [('process', run_id)]
+        result = profiled[0]
+        assert result['cpu_path'].endswith(f'process-run{run_id}.prof')
+        assert result['memory_path'].endswith(f'process-run{run_id}.snapshot')
+        assert result['peak_mib'] > 0
+        assert pstats.Stats(result['cpu_path']).total_calls > 0
+        assert tracemalloc.Snapshot.load(result['memory_path']).traces
+        assert not tracemalloc.is_tracing()
+        assert f'Profiled process (run {run_id})' in capsys.readouterr().out
+
+
+class TestBulkIngest:
+    """Test cases for bulk JSONL/CSV ingestion and POST /api/ingest."""
+    
+    def test_gzipped_jsonl_validates_and_records_runs(self, db_path, monkeypatch):
+        """Test aliases, rejected records and one ledger run per transaction."""
+        import gzip
+        import io
+        import json
+        monkeypatch.setattr(Config, 'BULK_TRANSACTION_ROWS', 2)
+        lines = [json.dumps(record) for record in [
+            {'text': 'Python 4 released', 'platform': 'Twitter', 'likes': 5, 'created_at': '2024-01-01T10:00:00'},
+            {'content': 'Reddit thread', 'source': 'reddit', 'score': '12', 'comments': 3},
+            {'text': '', 'platform': 'twitter'},
+            {'text': 'bad likes', 'platform': 'twitter', 'likes': -1},
+            {'text': 'no platform given'},
+        ]] + ['{not json']
+        body = io.BytesIO(gzip.compress('\n'.join(lines).encode()))
+        
+        conn = sqlite3.connect(db_path)
+        stats = BulkIngestor(conn).load(open_records(body), default_platform='hn')
+        rows = conn.execute('SELECT platform, text, created_at, likes, score, num_comments, processed '
+                            'FROM posts_raw ORDER BY id').fetchall()
+        runs = conn.execute("SELECT input_count, output_count, watermark_end FROM pipeline_runs "
+                            "WHERE stage = 'ingest' AND status = 'completed' ORDER BY id").fetchall()
+        conn.close()
+        
+        assert (stats['read'], stats['inserted'], stats['rejected']) == (6, 3, 3)
+        assert [error['line'] for error in stats['errors']] == [3, 4, 6]
+        assert rows[0] == ('twitter', 'Python 4 released', '2024-01-01T10:00:00', 5, 0, 0, 0)
+        assert rows[1][:2] == ('reddit', 'Reddit thread') and rows[1][4:6] == (12, 3)
+        assert rows[2][:2] == ('hn', 'no platform given')
+        assert runs == [(2, 2, 2), (4, 1, 3)]
+    
+    def test_ingest_endpoint_csv_and_strict(self, db_path, api_client, monkeypatch):
+        """Test CSV and JSON request bodies, and that strict loads report committed transactions."""
+        monkeypatch.setattr(Config, 'INGEST_API_TOKEN', 'secret')
+        monkeypatch.setattr(Config, 'INGEST_TRANSACTION_ROWS', 1)
+        auth = {'Authorization': 'Bearer secret'}
+        response = api_client.post('/api/ingest?platform=reddit', headers=auth,
+                                   data=b'text,likes\nfirst post,1\nsecond post,2\n', content_type='text/csv')
+        assert response.status_code == 200
+        assert response.get_json()['inserted'] == 2
+        assert len(response.get_json()['run_ids']) == 2
+        
+        response = api_client.post('/api/ingest', headers=auth, json={'data': 'Social media content', 'source': 'twitter'})
+        assert response.get_json()['inserted'] == 1
+        
+        response = api_client.post('/api/ingest?strict=1', headers=auth,
+                                   json=[{'text': 'ok', 'platform': 'twitter'}, {'likes': 1}])
+        assert response.status_code == 400
+        data = response.get_json()
+        assert 'line 2' in data['error']
+        assert data['inserted'] == 1 and len(data['run_ids']) == 1
+        
+        conn = sqlite3.connect(db_path)
+        count = conn.execute('SELECT COUNT(*) FROM posts_raw').fetchone()[0]
+        conn.close()
+        assert count == 4
+    
+    def test_ingest_endpoint_requires_token_and_caps_body(self, db_path, api_client, monkeypatch):
+        """Test the disabled, unauthorized and oversized-body responses."""
+        body = [{'text': 'ok', 'platform': 'twitter'}]
+        monkeypatch.setattr(Config, 'INGEST_API_TOKEN', None)
+        assert api_client.post('/api/ingest', json=body).status_code == 403
+        
+        monkeypatch.setattr(Config, 'INGEST_API_TOKEN', 'secret')
+        assert api_client.post('/api/ingest', json=body).status_code == 401
+        assert api_client.post('/api/ingest', json=body, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        
+        monkeypatch.setitem(app_enhanced.app.config, 'MAX_CONTENT_LENGTH', 10)
+        response = api_client.post('/api/ingest', json=body, headers={'Authorization': 'Bearer secret'})
+        assert response.status_code == 413
+        
+        conn = sqlite3.connect(db_path)
+        count = conn.execute('SELECT COUNT(*) FROM posts_raw').fetchone()[0]
+        conn.close()
+        assert count == 0
+    
+    def test_ingest_endpoint_rejects_bad_headers_and_corrupt_gzip(self, db_path, api_client, monkeypatch):
+        """Test that a non-ASCII token is a 401 and a truncated gzip body a 400."""
+        import gzip
+        import json
+        monkeypatch.setattr(Config, 'INGEST_API_TOKEN', 'secret')
+        body = gzip.compress('\n'.join(json.dumps({'text': f'post {i}', 'platform': 'twitter'})
+                                        for i in range(50)).encode())
+        response = api_client.post('/api/ingest', data=body, content_type='application/x-ndjson',
+                                   headers={'Authorization': 'Bearer s\u00e9cret'})
+        assert response.status_code == 401
+        
+        auth = {'Authorization': 'Bearer secret'}
+        response = api_client.post('/api/ingest', data=body[:len(body) // 2],
+                                   content_type='application/x-ndjson', headers=auth)
+        assert response.status_code == 400
+        assert 'gzip' in response.get_json()['error']
+        response = api_client.post('/api/ingest', data=body[:10] + b'\xff' * 40,
+                                   content_type='application/x-ndjson', headers=auth)
+        assert response.status_code == 400
+
+
+class TestRollups:
+    """Test cases for time-series rollups and /api/timeseries."""
+    
+    @pytest.fixture
+    def processed_db(self, db_path, text_processor):
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            '''INSERT INTO posts_raw
+            (platform, text, created_at, timestamp, likes, retweets, score, num_comments, processed)
+            VALUES (?, ?, ?, '', ?, 0, ?, 0, 0)''',
+            [
+                ('twitter', 'Python release is great', '2024-01-01T10:05:00', 10, 0),
+                ('twitter', 'RT @a: Python release is great', '2024-01-01T10:40:00', 30, 0),
+                ('reddit', 'Database outage postmortem', '2024-01-01T11:15:00', 0, 100),
+            ]
+        )
+        conn.commit()
+        conn.close()
+        text_processor.process_batch()
+        return db_path
+    
+    def test_hourly_buckets(self, processed_db, api_client):
+        """Test that every raw post lands in its bucket, duplicates included."""
+        data = api_client.get('/api/timeseries?granularity=hour').get_json()
+        by_bucket = {(row['bucket'], row['platform']): row for row in data['series']}
+        
+        twitter = by_bucket[('2024-01-01T10', 'twitter')]
+        assert twitter['post_count'] == 2
+        assert twitter['engagement_sum'] == 40
+        assert twitter['engagement_max'] == 30
+        assert by_bucket[('2024-01-01T11', 'reddit')]['post_count'] == 1
+    
+    def test_range_and_platform_filters(self, processed_db, api_client):
+        """Test range queries at minute and day granularity."""
+        data = api_client.get(
+            '/api/timeseries?granularity=minute&since=2024-01-01T10:30&until=2024-01-01T12:00'
+        ).get_json()
+        assert [row['bucket'] for row in data['series']] == ['2024-01-01T10:40', '2024-01-01T11:15']
+        
+        data = api_client.get('/api/timeseries?granularity=day&platform=reddit').get_json()
+        assert [(row['bucket'], row['post_count']) for row in data['series']] == [('2024-01-01', 1)]
+        
+        assert api_client.get('/api/timeseries?granularity=week').status_code == 400
+    
+    def test_rebuild_matches_incremental(self, processed_db, text_processor):
+        """Test that a full rebuild reproduces the incrementally maintained rollups."""
+        before = text_processor.cursor.execute('SELECT * FROM rollup_minute ORDER BY bucket').fetchall()
+        assert text_processor.rebuild_rollups() == 3
+        after = text_processor.cursor.execute('SELECT * FROM rollup_minute ORDER BY bucket').fetchall()
+        assert before == after
+    
+    def test_rebuild_buckets_missing_created_at_by_timestamp(self, processed_db, text_processor):
+        """Test that rebuilds fall back to the ingest timestamp like incremental updates."""
+        text_processor.cursor.execute(
+            '''INSERT INTO posts_raw
+            (platform, text, created_at, timestamp, likes, retweets, score, num_comments, processed)
+            VALUES ('reddit', 'Undated cloud launch', NULL, '2024-01-01T12:30:00', 0, 0, 5, 0, 0)'''
+        )
+        text_processor.conn.commit()
+        text_processor.process_batch()
+        before = text_processor.cursor.execute('SELECT * FROM rollup_minute ORDER BY bucket').fetchall()
+        assert '2024-01-01T12:30' in [row[0] for row in before]
+        assert text_processor.rebuild_rollups() == 4
+        after = text_processor.cursor.execute('SELECT * FROM rollup_minute ORDER BY bucket').fetchall()
+        assert before == after
+
+
+
+class TestNormalizedStorage:
+    """Test cases for single-copy text and token-id storage."""
+    
+    def test_vocabulary_round_trip(self, db_path):
+        """Test that token BLOBs decode to the original cleaned text."""
+        conn = sqlite3.connect(db_path)
+        vocabulary = Vocabulary(conn)
+        blob = vocabulary.encode('python release python')
+        assert len(blob) == 12
+        assert Vocabulary(conn).decode(blob) == 'python release python'
+        assert vocabulary.encode('') == b''
+        conn.close()
+    
+    def test_text_stored_once(self, db_path, text_processor, api_client):
+        """Test that processed rows and trends read their text from posts_raw."""
+        insert_raw_posts(db_path, [
+            ('twitter', 'Python release notes are out', 10, 0, 0, 0),
+            ('reddit', 'Database outage hits region', 0, 0, 10, 0),
+        ])
+        text_processor.process_batch()
+        
+        conn = sqlite3.connect(db_path)
+        row = conn.execute('SELECT text, cleaned_text, tokens FROM posts_processed WHERE id = 1').fetchone()
+        assert row[0] is None and row[1] is None
+        assert Vocabulary(conn).decode(row[2]) == 'python release notes are out'
+        conn.execute("INSERT INTO trends (post_id, anomaly_score, run_id) VALUES (2, -0.2, 1)")
+        conn.commit()
+        assert conn.execute('SELECT platform, text FROM trends_view').fetchall() == [
+            ('reddit', 'Database outage hits region')
+        ]
+        conn.close()
+        
+        # Porter stemming matches other word forms through the raw text
+        results = api_client.get('/api/search?q=release').get_json()['results']
+        assert [r['text'] for r in results] == ['Python release notes are out']
+        assert api_client.get('/api/search?q=outages').get_json()['count'] == 1
+    
+    def test_dashboard_endpoints_read_views(self, db_path, text_processor, api_client, monkeypatch):
+        """Test that trends, anomalies and sentiment stats serve posts through the views."""
+        monkeypatch.setattr(app_enhanced, '_sentiment_analyzer', SentimentAnalyzer(backend='textblob'))
+        insert_raw_posts(db_path, [
+            ('twitter', 'I love this amazing release', 10, 0, 0, 0),
+            ('reddit', 'Terrible awful database outage', 0, 0, 50, 0),
+        ])
+        text_processor.process_batch()
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO trends (post_id, anomaly_score, run_id) VALUES (2, -0.2, 1)")
+        conn.commit()
+        conn.close()
+        
+        data = api_client.get('/api/trends?per_page=1').get_json()
+        assert data['pagination'] == {'page': 1, 'per_page': 1, 'total': 2, 'pages': 2}
+        assert [(t['content'], t['sentiment']) for t in data['trends']] == [
+            ('Terrible awful database outage', 'negative')
+        ]
+        assert api_client.get('/api/trends?platform=twitter').get_json()['trends'][0]['sentiment'] == 'positive'
+        
+        anomalies = api_client.get('/api/anomalies').get_json()
+        assert anomalies['count'] == 1
+        assert anomalies['anomalies'][0]['id'] == 2
+        
+        stats = api_client.get('/api/sentiment/stats').get_json()
+        assert stats['total_analyzed'] == 2
+    
+    def test_backlog_query_uses_partial_index(self, db_path, text_processor):
+        """Test that the unprocessed backlog is read through its partial index."""
+        insert_raw_posts(db_path, [('twitter', 'Python release notes', 10, 0, 0, 0)])
+        conn = sqlite3.connect(db_path)
+        plan = conn.execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM posts_raw WHERE processed = 0 ORDER BY id LIMIT 10'
+        ).fetchall()
+        assert 'idx_raw_unprocessed' in plan[0][-1]
+        text_processor.process_batch()
+        # Processed rows leave the index, so it only holds the backlog
+        indexed = conn.execute('SELECT COUNT(*) FROM posts_raw INDEXED BY idx_raw_unprocessed WHERE processed = 0')
+        assert indexed.fetchone()[0] == 0
+        conn.close()
+
+
+class TestRunLedger:
+    """Test cases for checkpointed, transactional stage runs."""
+    
+    def test_failed_batch_rolls_back_and_resumes(self, db_path, text_processor, monkeypatch):
+        """Test that a crash mid-batch leaves nothing half-done and a rerun finishes it."""
+        insert_raw_posts(db_path, [
+            ('twitter', 'Python release notes are out', 10, 0, 0, 0),
+            ('reddit', 'Database outage hits region', 0, 0, 10, 0),
+        ])
+        def crash(cursor, posts):
+            raise RuntimeError('disk full')
+        monkeypatch.setattr(processor, 'update_rollups', crash)
+        with pytest.raises(RuntimeError):
+            text_processor.process_batch()
+        
+        conn = sqlite3.connect(db_path)
+        assert conn.execute('SELECT COUNT(*) FROM posts_raw WHERE processed = 1').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM posts_processed').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM vocabulary').fetchone()[0] == 0
+        
+        monkeypatch.undo()
+        assert text_processor.process_batch() == 2
+        runs = RunLedger(conn).history('process')
+        assert [run['status'] for run in runs] == ['completed', 'failed']
+        assert runs[1]['error'] == 'disk full'
+        assert runs[0]['watermark_end'] == 2
+        assert runs[0]['input_count'] == 2 and runs[0]['output_count'] == 2
+        conn.close()
+    
+    def test_detect_skips_seen_runs_and_swaps_atomically(self, db_path, text_processor, monkeypatch):
+        """Test that detection reruns only on new input and failures keep old trends."""
+        monkeypatch.setattr(Config, 'DETECT_WORKERS', 1)
+        monkeypatch.setattr(Config, 'ANOMALY_N_JOBS', 1)
+        insert_raw_posts(db_path, [
+            ('twitter', f'python topic number {word}', likes, 0, 0, 0)
+            for word, likes in zip('abcdefghij', [10, 12, 11, 9, 10, 13, 11, 10, 12, 5000])
+        ])
+        text_processor.process_batch()
+        
+        detector = TrendDetector(db_path)
+        first = detector.detect_anomalies()
+        assert first
+        assert detector.detect_anomalies() == []
+        
+        def crash(tasks):
+            raise RuntimeError('worker died')
+        monkeypatch.setattr(detector, '_run_partitions', crash)
+        with pytest.raises(RuntimeError):
+            detector.detect_anomalies(refit=True)
+        
+        trends = detector.cursor.execute('SELECT post_id, run_id FROM trends').fetchall()
+        assert sorted(trends) == sorted((post[0], post[3]) for post in first)
+        assert [run['status'] for run in detector.ledger.history('detect')] == ['failed', 'completed']
+        detector.close()
+
+
+class TestRetention:
+    """Test cases for archival of expired rows."""
+    
+    @pytest.fixture
+    def aged_db(self, db_path, text_processor):
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            '''INSERT INTO posts_raw
+            (platform, text, created_at, timestamp, likes, retweets, score, num_comments, processed)
+            VALUES (?, ?, ?, '', 5, 0, 0, 0, 0)''',
+            [
+                ('twitter', 'Old python news', '2024-01-01T10:00:00'),
+                ('twitter', 'Older database news', '2023-12-31T09:00:00'),
+                ('reddit', 'Fresh cloud launch', '2024-03-01T12:00:00'),
+            ]
+        )
+        conn.commit()
+        conn.close()
+        text_processor.process_batch()
+        return db_path
+    
+    def test_archives_expired_rows_by_day(self, aged_db, tmp_path, monkeypatch):
+        """Test that expired rows move to day files and rollups are kept."""
+        monkeypatch.setattr(Config, 'RETENTION_POSTS_RAW_DAYS', 30)
+        monkeypatch.setattr(Config, 'RETENTION_POSTS_PROCESSED_DAYS', 30)
+        manager = RetentionManager(aged_db, archive_dir=str(tmp_path / 'archive'))
+        assert not manager.incremental_vacuum_enabled()
+        assert manager.enable_incremental_vacuum()
+        results = manager.run(now=datetime(2024, 3, 2))
+        
+        assert results['posts_raw'] == 2
+        assert results['posts_processed'] == 2
+        assert manager.conn.execute('SELECT COUNT(*) FROM posts_raw').fetchone()[0] == 1
+        assert manager.conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        assert manager.conn.execute('SELECT COUNT(*) FROM rollup_day').fetchone()[0] == 3
+        
+        day_files = sorted(os.listdir(tmp_path / 'archive' / 'posts_raw'))
+        assert [name[:10] for name in day_files] == ['2023-12-31', '2024-01-01']
+        rows = list(read_archive(str(tmp_path / 'archive' / 'posts_raw' / day_files[1])))
+        assert [row['text'] for row in rows] == ['Old python news']
+        manager.close()
+    
+    def test_prunes_archived_documents(self, aged_db, tmp_path, monkeypatch):
+        """Test that archived posts leave the document matrix and vector index."""
+        monkeypatch.setattr(Config, 'RETENTION_POSTS_PROCESSED_DAYS', 30)
+        assert DocumentMatrix().load()[0].tolist() == [1, 2, 3]
+        manager = RetentionManager(aged_db, archive_dir=str(tmp_path / 'archive'))
+        results = manager.run(now=datetime(2024, 3, 2))
+        
+        assert results['documents_pruned'] == 2
+        assert DocumentMatrix().load()[0].tolist() == [3]
+        assert VectorIndex().load().ids.tolist() == [3]
+        assert [os.path.basename(path) for path in DocumentMatrix().segment_paths()] == ['segment_000000000003.npz']
+        
+        # Once every post is archived, the sequence still marks the watermark
+        results = manager.run(now=datetime(2024, 6, 1))
+        assert results['documents_pruned'] == 1
+        assert DocumentMatrix().segment_paths() == []
+        assert VectorIndex().chunk_paths() == []
+        manager.close()
+    
+    def test_prunes_backfilled_posts_and_their_detections(self, db_path, text_processor, tmp_path, monkeypatch):
+        """Test that an old post archived above surviving ids is pruned with its trend rows."""
+        monkeypatch.setattr(Config, 'RETENTION_POSTS_PROCESSED_DAYS', 30)
+        insert_raw_posts(db_path, [
+            ('twitter', 'Fresh python release', 5, 0, 0, 0),
+            ('reddit', 'Backfilled database outage', 0, 0, 5, 0),
+            ('reddit', 'Fresh cloud launch', 0, 0, 5, 0),
+        ])
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE posts_raw SET created_at = '2024-03-01T12:00:00'")
+        conn.execute("UPDATE posts_raw SET created_at = '2023-12-31T09:00:00' WHERE id = 2")
+        conn.commit()
+        conn.close()
+        text_processor.process_batch()
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO trends (post_id, anomaly_score, run_id) VALUES (2, -0.1, 1), (3, -0.2, 1)")
+        conn.execute("INSERT INTO trend_entities (id, post_id, state) VALUES (7, 2, 'decaying')")
+        conn.commit()
+        conn.close()
+        reader = VectorIndex().load()
+        assert reader.ids.tolist() == [1, 2, 3]
+        
+        manager = RetentionManager(db_path, archive_dir=str(tmp_path / 'archive'))
+        results = manager.run(now=datetime(2024, 3, 2))
+        assert results['posts_processed'] == 1
+        assert results['documents_pruned'] == 1
+        assert DocumentMatrix().load()[0].tolist() == [1, 3]
+        # The segment kept its first id, so it was rewritten in place
+        assert [os.path.basename(path) for path in DocumentMatrix().segment_paths()] == ['segment_000000000001.npz']
+        stat = os.stat(Config.VECTOR_INDEX_DIR)
+        os.utime(Config.VECTOR_INDEX_DIR, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert reader.load().ids.tolist() == [1, 3]
+        
+        assert [row[0] for row in manager.conn.execute('SELECT post_id FROM trends')] == [3]
+        assert manager.conn.execute('SELECT post_id FROM trend_entities WHERE id = 7').fetchone()[0] is None
+        archived = list(read_archive(str(tmp_path / 'archive' / 'trends' / ('2023-12-31' + archive_extension()))))
+        assert [(row['post_id'], row['anomaly_score']) for row in archived] == [(2, -0.1)]
+        manager.close()
+    
+    def test_keeps_unprocessed_rows(self, db_path, tmp_path):
+        """Test that rows not yet processed are never archived."""
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            '''INSERT INTO posts_raw (platform, text, created_at, processed)
+            VALUES ('twitter', 'Backlog', '2020-01-01T00:00:00', 0)'''
+        )
+        conn.commit()
+        conn.close()
+        
+        manager = RetentionManager(db_path, archive_dir=str(tmp_path / 'archive'))
+        assert manager.archive_table('posts_raw', 1) == 0
+        manager.close()
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v', '--tb=short'])
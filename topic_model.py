@@ -0,0 +1,233 @@
+"""Topic Modeling Engine for Social Trend Detector
+
+LDA over the shared document-term matrix, trained with gensim's
+LdaMulticore, or with LdaModel when a model gets a single worker. The topic
+count is chosen by a coherence sweep. Each entry of
+``Config.LDA_TOPIC_CANDIDATES`` is trained as a candidate model,
+concurrently in a spawn process pool, and scored by UMass coherence on the
+same documents. UMass is biased towards few topics (see umass_coherence),
+so the candidate list bounds how coarse the selected model can get. Each candidate reloads the memory-mapped matrix itself and
+saves its model to a scratch directory, so neither the corpus nor the
+models are pickled between processes; only the winner is loaded back.
+
+The selected model is saved under ``Config.LDA_MODEL_DIR``:
+
+- ``lda.model*``: the gensim model (``LdaModel.load``)
+- ``topic_term.npz``: the topic-term matrix with its hash columns and terms
+- ``topics.json``: top terms per topic and the sweep's coherence scores,
+  written last and read by ``/api/topics``
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+from doc_matrix import DocumentMatrix
+
+# Fewer documents than this make coherence (and LDA) meaningless
+MIN_DOCUMENTS = 10
+
+
+def load_corpus(doc_matrix: DocumentMatrix, max_doc_id: Optional[int] = None, columns=None) -> Tuple:
+    """Non-empty documents of the matrix, restricted to the columns in use.
+
+    Args:
+        doc_matrix: Matrix to read (memory-mapped)
+        max_doc_id: Ignore documents appended after this id
+        columns: Hash columns to keep (default: every column any document uses)
+
+    Returns:
+        (ids, counts CSR matrix over ``columns``, columns)
+    """
+    import numpy as np
+
+    ids, counts = doc_matrix.load()
+    if max_doc_id is not None:
+        keep = ids <= max_doc_id
+        ids, counts = ids[keep], counts[keep]
+    nonempty = counts.getnnz(axis=1) > 0
+    ids, counts = ids[nonempty], counts[nonempty]
+    if columns is None:
+        columns = np.unique(counts.indices)
+    return ids, counts[:, columns].tocsr(), columns
+
+
+def umass_coherence(counts, topic_term, top_n: int = 10) -> float:
+    """Mean UMass coherence of the topics over the given documents.
+
+    For each topic's top words w1..wn (by weight), averages
+    log((D(wi, wj) + 1) / D(wj)) over pairs j < i, where D counts the
+    documents containing the words. Higher (closer to 0) is better.
+
+    The score is not normalized for the topic count. With fewer topics,
+    each topic's top words are the corpus's most frequent ones, which
+    co-occur more, so the maximum favours the smallest candidate unless
+    larger ones separate clearly better.
+    """
+    import numpy as np
+
+    present = (counts > 0).astype(np.float64).tocsc()
+    scores = []
+    for weights in topic_term:
+        top = np.argsort(weights)[::-1][:top_n]
+        occurrences = present[:, top]
+        together = (occurrences.T @ occurrences).toarray()
+        singles = np.diag(together)
+        i, j = np.tril_indices(len(top), k=-1)
+        scores.append(np.mean(np.log((together[i, j] + 1) / np.maximum(singles[j], 1))))
+    return float(np.mean(scores))
+
+
+def train_candidate(num_topics: int, directory: str, n_features: int, max_doc_id: int, columns,
+                    id2word: Dict[int, str], workers: int, passes: int, chunksize: int,
+                    save_dir: Optional[str] = None, seed: int = 42) -> Tuple:
+    """Train and score one candidate; runs inside sweep pool workers.
+
+    The model is saved as ``save_dir/lda-<num_topics>.model`` when
+    ``save_dir`` is given, and discarded otherwise.
+
+    Returns:
+        (num_topics, coherence, training seconds)
+    """
+    from gensim.matutils import Sparse2Corpus
+    from gensim.models import LdaModel, LdaMulticore
+
+    _, counts, _ = load_corpus(DocumentMatrix(directory, n_features), max_doc_id, columns)
+    corpus = Sparse2Corpus(counts, documents_columns=False)
+    options = dict(num_topics=num_topics, id2word=id2word, chunksize=chunksize, passes=passes, random_state=seed)
+    started = time.perf_counter()
+    if workers > 1:
+        model = LdaMulticore(corpus, workers=workers, **options)
+    else:
+        # One LdaMulticore worker only adds inter-process overhead (~3x slower)
+        model = LdaModel(corpus, **options)
+    elapsed = time.perf_counter() - started
+    if save_dir:
+        model.save(candidate_path(save_dir, num_topics))
+    return num_topics, umass_coherence(counts, model.get_topics()), elapsed
+
+
+def candidate_path(save_dir: str, num_topics: int) -> str:
+    return os.path.join(save_dir, f'lda-{num_topics}.model')
+
+
+class TopicModeler:
+    """Selects the topic count by coherence, trains and persists the LDA model."""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or Config.LDA_MODEL_DIR
+
+    def sweep(self, doc_matrix: DocumentMatrix, conn, candidates: Sequence[int] = None,
+              workers: int = None, sweep_workers: int = None) -> Optional[Dict]:
+        """Train every candidate topic count and keep the most coherent model.
+
+        Candidates run concurrently, ``sweep_workers`` at a time. The
+        ``workers`` LDA worker processes are split between them; by default
+        no more candidates run at once than leaves each one two workers,
+        since a single worker falls back to the serial LdaModel.
+
+        Args:
+            doc_matrix: Source documents
+            conn: Database whose vocabulary table names the matrix's features
+            candidates: Topic counts to try (default: Config.LDA_TOPIC_CANDIDATES)
+            workers: LdaMulticore workers in total (default: Config.LDA_WORKERS)
+            sweep_workers: Candidates trained at once (default: Config.LDA_SWEEP_WORKERS,
+                capped at ``workers // 2``)
+
+        Returns:
+            Dictionary with the selected model, its topic count, coherence
+            per candidate, terms, document count, timings and the number of
+            candidates trained at once; None when there are fewer than
+            MIN_DOCUMENTS documents
+        """
+        from gensim.models import LdaModel
+
+        ids, counts, columns = load_corpus(doc_matrix)
+        if len(ids) < MIN_DOCUMENTS:
+            return None
+        candidates = sorted({k for k in (candidates or Config.LDA_TOPIC_CANDIDATES) if 1 < k < len(ids)}) or [2]
+        workers = workers or Config.LDA_WORKERS
+        parallel = sweep_workers or min(Config.LDA_SWEEP_WORKERS, workers // 2)
+        parallel = max(min(parallel, len(candidates)), 1)
+
+        lookup = doc_matrix.feature_terms(conn)
+        terms = [lookup.get(int(column), f'#{column}') for column in columns]
+        args = (doc_matrix.directory, doc_matrix.n_features, int(ids.max()), columns, dict(enumerate(terms)),
+                max(workers // parallel, 1), Config.LDA_PASSES, Config.LDA_CHUNKSIZE)
+
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix='lda-sweep-') as scratch:
+            # spawn: LdaMulticore forks its own pool, which is only safe from a
+            # single-threaded process (the daemon calls this from a stage thread)
+            with ProcessPoolExecutor(max_workers=parallel, mp_context=multiprocessing.get_context('spawn')) as pool:
+                results = list(pool.map(train_candidate, candidates,
+                                        *([arg] * len(candidates) for arg in args + (scratch,))))
+            num_topics = max(results, key=lambda result: result[1])[0]
+            model = LdaModel.load(candidate_path(scratch, num_topics))
+
+        return {
+            'model': model,
+            'num_topics': num_topics,
+            'coherence': {k: coherence for k, coherence, _ in results},
+            'train_seconds': {k: seconds for k, _, seconds in results},
+            'sweep_seconds': time.perf_counter() - started,
+            'sweep_workers': parallel,
+            'columns': columns,
+            'terms': terms,
+            'documents': len(ids),
+        }
+
+    def top_terms(self, model, n: int = None) -> List[Dict]:
+        n = n or Config.LDA_TOP_TERMS
+        return [
+            {'topic_id': topic_id,
+             'terms': [{'term': term, 'weight': round(float(weight), 6)} for term, weight in model.show_topic(topic_id, n)]}
+            for topic_id in range(model.num_topics)
+        ]
+
+    def save(self, result: Dict) -> str:
+        """Persist a sweep result; topics.json is replaced last so readers never see a partial save."""
+        import numpy as np
+
+        os.makedirs(self.directory, exist_ok=True)
+        model = result['model']
+        model.save(os.path.join(self.directory, 'lda.model'))
+
+        path = os.path.join(self.directory, 'topic_term.npz')
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, topic_term=model.get_topics(), columns=np.asarray(result['columns'], dtype=np.int64),
+                     terms=np.array(result['terms'], dtype=str))
+        os.replace(path + '.tmp', path)
+
+        path = os.path.join(self.directory, 'topics.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({
+                'num_topics': result['num_topics'],
+                'coherence': {str(k): round(v, 6) for k, v in result['coherence'].items()},
+                'documents': result['documents'],
+                'trained_at': datetime.now().isoformat(),
+                'topics': self.top_terms(model),
+            }, f)
+        os.replace(path + '.tmp', path)
+        return path
+
+    def load_topics(self) -> Optional[Dict]:
+        """The saved topics.json, or None if no model has been saved."""
+        try:
+            with open(os.path.join(self.directory, 'topics.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load_model(self):
+        """The saved gensim model, or None if no model has been saved."""
+        from gensim.models import LdaModel
+
+        path = os.path.join(self.directory, 'lda.model')
+        return LdaModel.load(path) if os.path.exists(path) else None
@@ -0,0 +1,199 @@
+"""Trend Lifecycle Tracking for Social Trend Detector
+
+Detection runs only say which posts are anomalous right now. This module
+keeps a persistent entity per trending cluster (its processed post, which
+all near-duplicates merge into) and folds each run's detections into it:
+
+- ``emerging``: first detected in this run
+- ``growing``: engagement velocity at a new high
+- ``peaked``: still gaining engagement, but slower than at its peak
+- ``decaying``: no longer gaining, or not detected in this run
+- ``expired``: missed ``Config.TREND_EXPIRY_RUNS`` runs in a row
+
+Velocity is engagement gained per hour since the entity was last seen (for
+a new entity, since the post was created). Each run writes only the
+entities it detected plus the still-active ones it missed, and appends one
+``trend_history`` row per changed entity.
+"""
+
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+
+STATES = ('emerging', 'growing', 'peaked', 'decaying', 'expired')
+
+# Runs can be seconds apart; floor the elapsed time so velocity stays finite
+_MIN_ELAPSED_HOURS = 1 / 60
+
+
+def create_lifecycle_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS trend_entities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER UNIQUE,
+        partition_label TEXT,
+        state TEXT,
+        first_run_id INTEGER,
+        last_run_id INTEGER,
+        first_seen_at TEXT,
+        last_seen_at TEXT,
+        engagement REAL,
+        velocity REAL,
+        peak_velocity REAL,
+        peak_at TEXT,
+        anomaly_score REAL,
+        runs_seen INTEGER DEFAULT 0,
+        missed_runs INTEGER DEFAULT 0
+    )''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_trend_entities_state ON trend_entities (state)')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS trend_history (
+        entity_id INTEGER,
+        run_id INTEGER,
+        recorded_at TEXT,
+        state TEXT,
+        engagement REAL,
+        velocity REAL,
+        anomaly_score REAL,
+        PRIMARY KEY (entity_id, run_id)
+    ) WITHOUT ROWID''')
+
+
+def _hours_between(start: Optional[str], end: datetime) -> float:
+    """Hours from an ISO timestamp to ``end``, floored (unknown start counts as 1h)."""
+    if not start:
+        return 1.0
+    try:
+        elapsed = (end - datetime.fromisoformat(start)).total_seconds() / 3600
+    except ValueError:
+        return 1.0
+    return max(elapsed, _MIN_ELAPSED_HOURS)
+
+
+def next_state(velocity: float, peak_velocity: Optional[float]) -> str:
+    """Lifecycle state of an entity detected again in this run."""
+    if velocity <= 0:
+        return 'decaying'
+    if peak_velocity is None or velocity >= peak_velocity:
+        return 'growing'
+    return 'peaked'
+
+
+class TrendTracker:
+    """Maintains trend_entities/trend_history from successive detection runs."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def update(self, run_id: int, detections: Sequence[Tuple], now: datetime = None) -> Dict[str, int]:
+        """Fold one detection run into the trend entities (caller commits).
+
+        Args:
+            run_id: Ledger id of the detection run
+            detections: (post_id, anomaly_score, partition_label, ...) per viral post
+            now: Observation time (default: current time)
+
+        Returns:
+            Number of entities per state after this run, for entities it touched
+        """
+        now = now or datetime.now()
+        seen_at = now.isoformat()
+        scores = {post_id: (anomaly_score, label) for post_id, anomaly_score, label, *_ in detections}
+        ids = json.dumps(list(scores))
+
+        posts = self.conn.execute(
+            'SELECT id, engagement_score, created_at FROM posts_view WHERE id IN (SELECT value FROM json_each(?))',
+            (ids,)
+        ).fetchall()
+        entities = {
+            row[0]: row[1:] for row in self.conn.execute(
+                '''SELECT post_id, engagement, last_seen_at, peak_velocity, peak_at
+                FROM trend_entities WHERE post_id IN (SELECT value FROM json_each(?))''',
+                (ids,)
+            )
+        }
+
+        counts = {}
+        inserts, updates = [], []
+        for post_id, engagement, created_at in posts:
+            engagement = engagement or 0.0
+            anomaly_score, label = scores[post_id]
+            if post_id not in entities:
+                velocity = engagement / max(_hours_between(created_at, now), 1.0)
+                state = 'emerging'
+                inserts.append((post_id, label, state, run_id, run_id, seen_at, seen_at,
+                                engagement, velocity, velocity, seen_at, anomaly_score))
+            else:
+                previous, last_seen_at, peak_velocity, peak_at = entities[post_id]
+                velocity = (engagement - (previous or 0.0)) / _hours_between(last_seen_at, now)
+                state = next_state(velocity, peak_velocity)
+                if state == 'growing':
+                    peak_velocity, peak_at = velocity, seen_at
+                updates.append((label, state, run_id, seen_at, engagement, velocity,
+                                peak_velocity, peak_at, anomaly_score, post_id))
+            counts[state] = counts.get(state, 0) + 1
+
+        self.conn.executemany(
+            '''INSERT INTO trend_entities (post_id, partition_label, state, first_run_id, last_run_id,
+            first_seen_at, last_seen_at, engagement, velocity, peak_velocity, peak_at, anomaly_score,
+            runs_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)''',
+            inserts
+        )
+        self.conn.executemany(
+            '''UPDATE trend_entities SET partition_label = ?, state = ?, last_run_id = ?,
+            last_seen_at = ?, engagement = ?, velocity = ?, peak_velocity = ?, peak_at = ?,
+            anomaly_score = ?, runs_seen = runs_seen + 1, missed_runs = 0 WHERE post_id = ?''',
+            updates
+        )
+
+        # Active entities this run did not detect lose momentum, then expire
+        missed = [row[0] for row in self.conn.execute(
+            "SELECT id FROM trend_entities WHERE state != 'expired' AND last_run_id != ?", (run_id,)
+        )]
+        if missed:
+            self.conn.execute(
+                '''UPDATE trend_entities SET missed_runs = missed_runs + 1, velocity = 0,
+                state = CASE WHEN missed_runs + 1 >= ? THEN 'expired' ELSE 'decaying' END
+                WHERE id IN (SELECT value FROM json_each(?))''',
+                (Config.TREND_EXPIRY_RUNS, json.dumps(missed))
+            )
+            for state, count in self.conn.execute(
+                'SELECT state, COUNT(*) FROM trend_entities WHERE id IN (SELECT value FROM json_each(?)) GROUP BY state',
+                (json.dumps(missed),)
+            ):
+                counts[state] = counts.get(state, 0) + count
+
+        self.conn.execute(
+            '''INSERT OR REPLACE INTO trend_history
+            (entity_id, run_id, recorded_at, state, engagement, velocity, anomaly_score)
+            SELECT id, ?, ?, state, engagement, velocity,
+                   CASE WHEN last_run_id = ? THEN anomaly_score END
+            FROM trend_entities
+            WHERE post_id IN (SELECT value FROM json_each(?)) OR id IN (SELECT value FROM json_each(?))''',
+            (run_id, seen_at, run_id, ids, json.dumps(missed))
+        )
+        return counts
+
+    def active(self, limit: int = 50) -> List[Dict]:
+        """Entities that have not expired, fastest-moving first."""
+        cursor = self.conn.execute(
+            "SELECT * FROM trend_entities WHERE state != 'expired' ORDER BY velocity DESC LIMIT ?", (limit,)
+        )
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def history(self, entity_id: int, limit: int = 500) -> Optional[Dict]:
+        """An entity and its per-run history (oldest first), or None if unknown."""
+        cursor = self.conn.execute('SELECT * FROM trend_entities WHERE id = ?', (entity_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        entity = dict(zip([column[0] for column in cursor.description], row))
+        cursor = self.conn.execute(
+            '''SELECT * FROM (SELECT run_id, recorded_at, state, engagement, velocity, anomaly_score
+            FROM trend_history WHERE entity_id = ? ORDER BY run_id DESC LIMIT ?) ORDER BY run_id''',
+            (entity_id, limit)
+        )
+        columns = [column[0] for column in cursor.description]
+        entity['history'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return entity
@@ -0,0 +1,377 @@
+"""Approximate Nearest-Neighbor Index for Social Trend Detector
+
+Embeds posts by sparse random projection of their hashed term counts (from
+the shared document-term matrix) and indexes the dense vectors with
+random-hyperplane LSH. Everything is plain NumPy: vectors are appended to
+disk as ``.npz`` chunks, bucket tables are sorted key arrays into which
+only newly added vectors are hashed and merged, and queries re-rank LSH
+candidates by exact cosine similarity. Small indexes are scanned exactly, since a full dot product is
+cheaper than the lookup and never misses a neighbour.
+
+One index object is shared by the API's request threads. Its arrays are
+never modified in place. Loads and additions build new arrays and swap
+them in under a lock, so a query always sees one consistent snapshot.
+Chunks are compacted like document-matrix segments once there are more
+than ``VECTOR_INDEX_MAX_CHUNKS``, and pruned with them by retention.
+Loaded chunks are tracked by inode as well as name, so a chunk rewritten
+in place by compaction or pruning triggers a reload.
+"""
+
+import glob
+import os
+import threading
+from typing import List, Tuple
+
+from config import Config
+from doc_matrix import directory_lock, survivors_between, tiered_merge_start
+
+
+class VectorIndex:
+    """Incrementally updated cosine ANN index keyed by posts_processed id."""
+
+    def __init__(self, directory: str = None, dim: int = None,
+                 n_tables: int = None, n_bits: int = None, seed: int = 7,
+                 exact_below: int = 20000):
+        import numpy as np
+
+        self.directory = directory or Config.VECTOR_INDEX_DIR
+        self.dim = dim or Config.VECTOR_DIM
+        self.n_tables = n_tables or Config.VECTOR_TABLES
+        self.n_bits = n_bits or Config.VECTOR_BITS
+        self.seed = seed
+        self.exact_below = exact_below
+
+        rng = np.random.RandomState(seed)
+        self.hyperplanes = rng.standard_normal(
+            (self.n_tables, self.n_bits, self.dim)
+        ).astype(np.float32)
+        self._bit_weights = (1 << np.arange(self.n_bits)).astype(np.int64)
+        self._projection = None
+
+        # (ids, vectors, row of each id, LSH tables), replaced as a whole
+        self._state = self._empty_state()
+        self._lock = threading.Lock()
+        self._chunks = set()
+        self._loaded_mtime = None
+
+    @property
+    def ids(self):
+        return self._state[0]
+
+    @property
+    def vectors(self):
+        return self._state[1]
+
+    def _projection_for(self, n_features: int):
+        """Sparse random projection from hashed term space to ``dim``."""
+        if self._projection is None or self._projection.n_features_in_ != n_features:
+            import numpy as np
+            from scipy.sparse import csr_matrix
+            from sklearn.random_projection import SparseRandomProjection
+
+            # The 'auto' density (1/sqrt(n_features)) leaves most hashed terms
+            # with no component at all; ~8 components per term keeps short
+            # posts from embedding to zero
+            projection = SparseRandomProjection(
+                n_components=self.dim, density=min(1.0, 8 / self.dim),
+                dense_output=True, random_state=self.seed
+            )
+            # Fitting only draws the random matrix; it needs the input width, not data
+            projection.fit(csr_matrix((1, n_features), dtype=np.float32))
+            self._projection = projection
+        return self._projection
+
+    def embed(self, counts):
+        """Embed sparse term-count rows as L2-normalized dense vectors."""
+        import numpy as np
+
+        weighted = counts.astype(np.float32, copy=True)
+        weighted.data = np.log1p(weighted.data)
+        vectors = self._projection_for(counts.shape[1]).transform(weighted)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _keys(self, vectors):
+        """LSH bucket key of each vector in every table, shape (n_tables, n)."""
+        import numpy as np
+
+        keys = np.empty((self.n_tables, len(vectors)), dtype=np.int64)
+        for table in range(self.n_tables):
+            bits = (vectors @ self.hyperplanes[table].T) > 0
+            keys[table] = bits.astype(np.int64) @ self._bit_weights
+        return keys
+
+    def _empty_state(self):
+        import numpy as np
+
+        tables = (np.empty((self.n_tables, 0), dtype=np.int64), np.empty((self.n_tables, 0), dtype=np.int64))
+        return (np.empty(0, dtype=np.int64), np.empty((0, self.dim), dtype=np.float32), {}, tables)
+
+    def _merge_tables(self, tables, keys, offset: int):
+        """Merge the keys of vectors at rows ``offset...`` into sorted tables.
+
+        Args:
+            tables: (sorted keys, row order), each of shape (n_tables, n)
+            keys: Keys of the new vectors, shape (n_tables, m)
+            offset: Row of the first new vector
+
+        Returns:
+            New (sorted keys, row order) tables of shape (n_tables, n + m)
+        """
+        import numpy as np
+
+        sorted_keys, order = tables
+        new_order = np.argsort(keys, axis=1, kind='stable')
+        new_keys = np.take_along_axis(keys, new_order, axis=1)
+        merged_keys = np.empty((self.n_tables, sorted_keys.shape[1] + keys.shape[1]), dtype=np.int64)
+        merged_order = np.empty_like(merged_keys)
+        for table in range(self.n_tables):
+            # Equal keys go after the existing rows, keeping each bucket in row order
+            at = np.searchsorted(sorted_keys[table], new_keys[table], side='right')
+            merged_keys[table] = np.insert(sorted_keys[table], at, new_keys[table])
+            merged_order[table] = np.insert(order[table], at, new_order[table] + offset)
+        return merged_keys, merged_order
+
+    def _append(self, ids, vectors):
+        """Publish a snapshot with the vectors appended; callers hold the lock.
+
+        Only the new vectors are hashed; their keys are merged into the
+        current tables, so queries never rebuild them.
+        """
+        import numpy as np
+
+        current_ids, current_vectors, rows, tables = self._state
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = dict(rows)
+        rows.update((doc_id, len(current_ids) + i) for i, doc_id in enumerate(ids.tolist()))
+        tables = self._merge_tables(tables, self._keys(vectors), len(current_ids))
+        self._state = (np.concatenate([current_ids, ids]), np.vstack([current_vectors, vectors]), rows, tables)
+
+    def add(self, ids, vectors):
+        """Add embedded vectors in memory; save_chunk() persists them."""
+        if not len(ids):
+            return
+        with self._lock:
+            self._append(ids, vectors)
+
+    def chunk_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, 'chunk_*.npz')))
+
+    def _chunk_files(self):
+        """(path, inode) of every chunk; a rewritten chunk gets a new inode."""
+        return {(path, os.stat(path).st_ino) for path in self.chunk_paths()}
+
+    def max_indexed_id(self) -> int:
+        """Highest post id persisted so far (the sync watermark)."""
+        import numpy as np
+
+        paths = self.chunk_paths()
+        if not paths:
+            return 0
+        with np.load(paths[-1]) as chunk:
+            return int(chunk['ids'].max())
+
+    def load(self) -> 'VectorIndex':
+        """Load persisted chunks not yet in memory.
+
+        Free while the chunk directory's mtime is unchanged. New chunks are
+        appended; if loaded chunks were compacted or pruned away, the index
+        is reloaded from scratch.
+        """
+        import numpy as np
+
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return self
+        if mtime == self._loaded_mtime:
+            return self
+
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return self
+            ids, vectors = [], []
+            try:
+                files = self._chunk_files()
+                rebuild = not self._chunks <= files
+                watermark = 0 if rebuild else (int(self.ids[-1]) if len(self.ids) else 0)
+                for path, _ in sorted(files if rebuild else files - self._chunks):
+                    with np.load(path) as chunk:
+                        chunk_ids, chunk_vectors = chunk['ids'], chunk['vectors']
+                    # A merged chunk can briefly coexist with the chunks it absorbed
+                    fresh = chunk_ids > watermark
+                    if fresh.any():
+                        ids.append(chunk_ids[fresh])
+                        vectors.append(chunk_vectors[fresh])
+                        watermark = int(chunk_ids[-1])
+            except FileNotFoundError:
+                # Compacted while listing; keep the current snapshot, retry next time
+                return self
+
+            if rebuild:
+                self._state = self._empty_state()
+            if ids:
+                self._append(np.concatenate(ids), np.vstack(vectors))
+            self._chunks = files
+            # Taken before listing, so a later write changes it again (up to
+            # the filesystem's timestamp granularity)
+            self._loaded_mtime = mtime
+        return self
+
+    def save_chunk(self, ids, vectors) -> str:
+        import numpy as np
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'chunk_{int(ids[0]):012d}.npz')
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, ids=np.asarray(ids, dtype=np.int64), vectors=vectors)
+        os.replace(temp_path, path)
+        return path
+
+    def compact(self, max_chunks: int = None) -> int:
+        with directory_lock(self.directory):
+            return self._compact(max_chunks)
+
+    def _compact(self, max_chunks: int = None) -> int:
+        """Merge the newest chunks into one when there are too many.
+
+        The merged chunk replaces the first chunk it absorbed, then the
+        rest are deleted; load() skips ids it already has in between.
+
+        Args:
+            max_chunks: Chunk count that triggers a merge
+                (default: Config.VECTOR_INDEX_MAX_CHUNKS)
+
+        Returns:
+            Number of chunks merged away
+        """
+        import numpy as np
+
+        paths = self.chunk_paths()
+        if len(paths) <= (max_chunks or Config.VECTOR_INDEX_MAX_CHUNKS):
+            return 0
+        sizes = []
+        for path in paths:
+            with np.load(path) as chunk:
+                sizes.append(len(chunk['ids']))
+        merged = paths[tiered_merge_start(sizes):]
+
+        ids, vectors = [], []
+        for path in merged:
+            with np.load(path) as chunk:
+                ids.append(chunk['ids'])
+                vectors.append(chunk['vectors'])
+        self.save_chunk(np.concatenate(ids), np.vstack(vectors))
+        for path in merged[1:]:
+            os.remove(path)
+        return len(merged) - 1
+
+    def prune(self, keep_ids, up_to: int) -> int:
+        """Drop vectors of posts up to ``up_to`` that are not in ``keep_ids``.
+
+        Args:
+            keep_ids: Sorted ids of posts still in the database
+            up_to: Highest id ``keep_ids`` accounts for
+
+        Returns:
+            Number of vectors dropped
+        """
+        import numpy as np
+
+        keep_ids = np.asarray(keep_ids, dtype=np.int64)
+        dropped = 0
+        with directory_lock(self.directory):
+            for path in self.chunk_paths():
+                with np.load(path) as chunk:
+                    ids, vectors = chunk['ids'], chunk['vectors']
+                if not len(ids) or ids[0] > up_to:
+                    break
+                keep = (ids > up_to) | np.isin(ids, survivors_between(keep_ids, ids[0], ids[-1]))
+                if keep.all():
+                    continue
+                written = None
+                if keep.any():
+                    written = self.save_chunk(ids[keep], vectors[keep])
+                if written != path:
+                    os.remove(path)
+                dropped += int((~keep).sum())
+        return dropped
+
+    def sync(self, doc_matrix) -> int:
+        """Embed and persist documents newer than the highest indexed id.
+
+        Only writes new chunks, then compacts; readers pick them up with load().
+
+        Args:
+            doc_matrix: DocumentMatrix holding the hashed term counts
+
+        Returns:
+            Number of posts added
+        """
+        added = 0
+        with directory_lock(self.directory):
+            watermark = self.max_indexed_id()
+            for ids, counts in doc_matrix.iter_segments():
+                if not len(ids) or ids[-1] <= watermark:
+                    continue
+                fresh = ids > watermark
+                new_ids = ids[fresh]
+                self.save_chunk(new_ids, self.embed(counts[fresh]))
+                added += len(new_ids)
+            if added:
+                self._compact()
+        return added
+
+    def vector_for(self, doc_id: int):
+        _, vectors, rows, _ = self._state
+        row = rows.get(int(doc_id))
+        return vectors[row] if row is not None else None
+
+    def _candidates(self, state, vector):
+        """Positions sharing an LSH bucket with the vector in any table."""
+        import numpy as np
+
+        sorted_keys, order = state[3]
+
+        query_keys = self._keys(vector[np.newaxis, :])[:, 0]
+        candidates = []
+        for table, key in enumerate(query_keys):
+            lo = np.searchsorted(sorted_keys[table], key, side='left')
+            hi = np.searchsorted(sorted_keys[table], key, side='right')
+            candidates.append(order[table, lo:hi])
+        return np.unique(np.concatenate(candidates))
+
+    def query(self, vector, k: int = 10, exclude_id: int = None) -> List[Tuple[int, float]]:
+        """Approximate k nearest neighbours of a vector by cosine similarity.
+
+        Args:
+            vector: Normalized query vector of length ``dim``
+            k: Number of results
+            exclude_id: Post id to leave out (typically the query post)
+
+        Returns:
+            List of (post_id, similarity), most similar first
+        """
+        import numpy as np
+
+        state = self._state
+        ids, vectors = state[0], state[1]
+        if not len(ids):
+            return []
+        if len(ids) < self.exact_below:
+            candidates = np.arange(len(ids))
+        else:
+            candidates = self._candidates(state, vector)
+
+        scores = vectors[candidates] @ vector
+        if exclude_id is not None:
+            scores[ids[candidates] == exclude_id] = -np.inf
+        top = np.argsort(scores)[::-1][:k]
+        return [
+            (int(ids[candidates[i]]), float(scores[i]))
+            for i in top if np.isfinite(scores[i])
+        ]
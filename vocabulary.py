@@ -0,0 +1,89 @@
+"""Shared Token Vocabulary for Social Trend Detector
+
+Cleaned text is stored as a BLOB of little-endian uint32 token ids instead
+of a second copy of the words. The ``vocabulary`` table maps ids to terms;
+ids are assigned with INSERT OR IGNORE, so several writers can grow it
+concurrently and always agree on the mapping.
+"""
+
+import json
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+
+def create_vocabulary_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS vocabulary (
+        id INTEGER PRIMARY KEY,
+        term TEXT UNIQUE NOT NULL
+    )''')
+
+
+def _pack(ids: List[int]) -> bytes:
+    packed = array('I', ids)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(blob: bytes) -> array:
+    ids = array('I')
+    ids.frombytes(blob)
+    if sys.byteorder != 'little':
+        ids.byteswap()
+    return ids
+
+
+class Vocabulary:
+    """Term <-> id mapping backed by the vocabulary table, cached in memory."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.term_ids: Dict[str, int] = {}
+        self.terms: Dict[int, str] = {}
+
+    def reset(self):
+        """Forget cached ids, e.g. after the transaction that added them rolled back."""
+        self.term_ids.clear()
+        self.terms.clear()
+
+    def _remember(self, rows):
+        for term_id, term in rows:
+            self.term_ids[term] = term_id
+            self.terms[term_id] = term
+
+    def ids_for(self, terms) -> List[int]:
+        """Token ids for terms, registering unseen ones (caller commits)."""
+        term_ids = self.term_ids
+        try:
+            return [term_ids[term] for term in terms]
+        except KeyError:
+            pass
+        missing = sorted({term for term in terms if term not in term_ids})
+        if missing:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO vocabulary (term) VALUES (?)',
+                [(term,) for term in missing]
+            )
+            self._remember(self.conn.execute(
+                'SELECT id, term FROM vocabulary WHERE term IN (SELECT value FROM json_each(?))',
+                (json.dumps(missing),)
+            ).fetchall())
+        return [self.term_ids[term] for term in terms]
+
+    def encode(self, cleaned_text: Optional[str]) -> bytes:
+        """Pack space-separated cleaned text into a token-id BLOB."""
+        return _pack(self.ids_for(cleaned_text.split() if cleaned_text else []))
+
+    def decode(self, blob: Optional[bytes]) -> str:
+        """Turn a token-id BLOB back into space-separated cleaned text."""
+        if not blob:
+            return ''
+        ids = _unpack(blob)
+        missing = sorted({term_id for term_id in ids if term_id not in self.terms})
+        if missing:
+            self._remember(self.conn.execute(
+                'SELECT id, term FROM vocabulary WHERE id IN (SELECT value FROM json_each(?))',
+                (json.dumps(missing),)
+            ).fetchall())
+        return ' '.join(self.terms[term_id] for term_id in ids)
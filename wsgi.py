@@ -0,0 +1,17 @@
+"""WSGI entry point for production serving.
+
+Run with: gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app enabled this module is imported once in the gunicorn
+master, so the VADER lexicon, NLTK corpora and the sentiment analyzer are
+built before workers fork and shared copy-on-write between them.
+"""
+
+import os
+
+from app_enhanced import app, get_sentiment_analyzer
+from nlp_resources import preload
+
+if os.getenv('PRELOAD_MODELS', '1') == '1':
+    get_sentiment_analyzer()
+    preload(models=False)